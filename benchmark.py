@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""Benchmarks for the codebase visualizer analysis pipeline."""
+import os
+import sys
+import gzip
+import json
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import contextlib
+import http.client
+import time
+
+import visualizer
+
+def generate_tree(root, file_count, seed=0, imports_per_file=6, ignored_share=0.2):
+    """Generate a synthetic project of file_count .py, .js, .ts and .json files importing each other.
+
+    Files sit in nested packages of about 15 files below src/. Most imports
+    point into the same or the parent package, some anywhere, and about one in
+    four at third-party modules that do not resolve. Another ignored_share *
+    file_count files go to node_modules, build and a directory listed in
+    .gitignore, which scan_directory skips.
+    """
+    rnd = random.Random(seed)
+    packages = ['src']
+    while len(packages) < max(1, file_count // 15):
+        parent = rnd.choice(packages)
+        if parent.count('/') < 4:
+            packages.append(f'{parent}/pkg{len(packages)}')
+
+    files = [f'{rnd.choice(packages)}/module{i}{rnd.choices([".py", ".js", ".ts", ".json"], [40, 25, 25, 10])[0]}'
+             for i in range(file_count)]
+    # Python imports Python files, the others import scripts and JSON files
+    by_package = {}
+    for rel_path in files:
+        by_package.setdefault((os.path.dirname(rel_path), rel_path.endswith('.py')), []).append(rel_path)
+    everywhere = {python: [rel_path for rel_path in files if rel_path.endswith('.py') == python] for python in (True, False)}
+
+    def pick_target(rel_path):
+        python = rel_path.endswith('.py')
+        draw = rnd.random()
+        package = os.path.dirname(rel_path) if draw < 0.5 else os.path.dirname(os.path.dirname(rel_path)) if draw < 0.8 else None
+        return rnd.choice(by_package.get((package, python)) or everywhere[python])
+
+    filler = '\n'.join(f'value{n} = compute(value{n - 1}, "literal {n}")' for n in range(1, 40))
+    for rel_path in files:
+        source_dir = os.path.dirname(rel_path)
+        targets = {pick_target(rel_path) for _ in range(imports_per_file)} - {rel_path}
+        if rel_path.endswith('.json'):
+            refs = ', '.join(f'"./{os.path.relpath(target, source_dir)}"' for target in sorted(targets)[:2])
+            content = f'{{"name": "{os.path.basename(rel_path)}", "files": [{refs}]}}\n'
+        elif rel_path.endswith('.py'):
+            lines = ['import os', 'from typing import Any']
+            for target in sorted(targets):
+                module = target[:-3]
+                if os.path.dirname(target) == source_dir:
+                    lines.append(f'from .{os.path.basename(module)} import name')
+                else:
+                    lines.append(f"from {module.replace('/', '.')} import name")
+            content = '\n'.join(lines) + '\n' + filler + '\n'
+        else:
+            lines = ["import React from 'react'", "import { debounce } from 'lodash'"]
+            for target in sorted(targets):
+                module = target if target.endswith('.json') else target.rsplit('.', 1)[0]
+                if rnd.random() < 0.2:
+                    lines.append(f"import {{ name }} from '@/{module[len('src/'):]}'")
+                else:
+                    rel_import = os.path.relpath(module, source_dir)
+                    lines.append(f"import {{ name }} from '{rel_import if rel_import.startswith('.') else './' + rel_import}'")
+            content = '\n'.join(lines) + '\n' + '\n'.join('const ' + line for line in filler.split('\n')) + '\n'
+        write_file(os.path.join(root, rel_path), content)
+
+    for i in range(int(file_count * ignored_share)):
+        ignored_dir = ('node_modules/lib{}', 'build/chunk{}', 'generated/part{}')[i % 3].format(i // 300)
+        write_file(os.path.join(root, ignored_dir, f'file{i}.js'), "const dep = require('./other')\n" + filler + '\n')
+    write_file(os.path.join(root, '.gitignore'), '*.log\n/generated/\n')
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def bench_build_graph(sizes):
+    """Time build_graph on synthetic trees of increasing size."""
+    visualizer.update_progress = lambda *args, **kwargs: None
+    previous = None
+    print(f"{'files':>8} {'edges':>9} {'seconds':>9} {'ms/file':>8} {'scaling':>8}")
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix='cv-bench-')
+        try:
+            generate_tree(root, size)
+            files = list(visualizer.scan_directory(root))
+            start = time.perf_counter()
+            graph = visualizer.build_graph(files, root)
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        # Ratio of per-file cost against the previous size; ~1.0 means linear
+        per_file = elapsed / size
+        scaling = f'{per_file / previous:.2f}' if previous else '-'
+        previous = per_file
+        print(f"{size:>8} {len(graph['edges']):>9} {elapsed:>9.2f} {per_file * 1000:>8.3f} {scaling:>8}")
+
+def generate_vendored_tree(root, entry_count, source_count=10000):
+    """Generate source_count files plus a vendor directory, ignored by .gitignore, of entry_count files."""
+    for i in range(source_count):
+        dir_path = os.path.join(root, 'src', f'pkg{i // 50}')
+        os.makedirs(dir_path, exist_ok=True)
+        open(os.path.join(dir_path, f'module{i}.py'), 'w').close()
+    for i in range(max(0, entry_count - source_count)):
+        dir_path = os.path.join(root, 'third_party', 'vendor', f'lib{i // 400}')
+        os.makedirs(dir_path, exist_ok=True)
+        open(os.path.join(dir_path, f'file{i}.js'), 'w').close()
+    with open(os.path.join(root, '.gitignore'), 'w') as f:
+        f.write('*.log\nbuild/\n/third_party/vendor/\n')
+
+def bench_scan_directory(entry_count):
+    """Time scan_directory on a tree whose entries are mostly in an ignored vendor directory."""
+    root = tempfile.mkdtemp(prefix='cv-bench-')
+    try:
+        generate_vendored_tree(root, entry_count)
+        start = time.perf_counter()
+        file_count = sum(1 for _ in visualizer.scan_directory(root))
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print(f"scanned {entry_count} entries, kept {file_count} files in {elapsed:.2f}s")
+
+def synthetic_graph(node_count, edge_count, seed=0):
+    """Build a graph of node_count files with edge_count random connections."""
+    rnd = random.Random(seed)
+    paths = [f'src/pkg{i // 50}/sub{i % 7}/module{i}.{rnd.choice(["py", "js", "ts"])}' for i in range(node_count)]
+    edges = {(rnd.randrange(node_count), rnd.randrange(node_count)) for _ in range(edge_count)}
+    return {
+        'metadata': {'project_path': '/tmp/synthetic', 'project_name': 'synthetic', 'file_count': node_count,
+                     'connection_count': len(edges)},
+        'nodes': [visualizer.make_node(path, index) for index, path in enumerate(paths)],
+        'edges': [{'from': paths[source], 'to': paths[target]} for source, target in sorted(edges)]
+    }
+
+def bench_graph_payload(node_count, edge_count):
+    """Compare size and parse time of the JSON and binary graph formats."""
+    graph = synthetic_graph(node_count, edge_count)
+    payloads = [
+        ('json (indent=2)', json.dumps(graph, indent=2).encode('utf-8'), lambda data: json.loads(data)),
+        ('json (compact)', json.dumps(graph, separators=(',', ':')).encode('utf-8'), lambda data: json.loads(data)),
+        ('binary', visualizer.encode_graph(graph), visualizer.decode_graph),
+    ]
+    print(f"{node_count} nodes, {len(graph['edges'])} edges")
+    print(f"{'format':>16} {'raw MB':>8} {'gzip MB':>8} {'br MB':>8} {'parse s':>8}")
+    for name, data, parse in payloads:
+        gzipped = len(gzip.compress(data, compresslevel=6))
+        brotli_size = f'{len(visualizer.brotli.compress(data, quality=5)) / 1e6:>8.2f}' if visualizer.brotli else f'{"-":>8}'
+        start = time.perf_counter()
+        parse(data)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>16} {len(data) / 1e6:>8.2f} {gzipped / 1e6:>8.2f} {brotli_size} {elapsed:>8.3f}")
+
+def bench_progress_clients(client_count=100, file_count=4000):
+    """Time build_graph with progress subscribers, half of them never reading."""
+    root = tempfile.mkdtemp(prefix='cv-bench-')
+    try:
+        generate_tree(root, file_count)
+        files = list(visualizer.scan_directory(root))
+        broadcaster = visualizer.BROADCASTER
+        print(f"{'clients':>8} {'seconds':>8} {'msgs/reader':>12} {'max buffered':>13}")
+        for count in (0, client_count):
+            subscriptions = [broadcaster.subscribe() for _ in range(count)]
+            readers = subscriptions[:count // 2]
+            received = [0] * len(readers)
+            stop = threading.Event()
+
+            def read(index):
+                while not stop.is_set():
+                    received[index] += len(broadcaster.wait(readers[index], timeout=0.5))
+
+            threads = [threading.Thread(target=read, args=(index,)) for index in range(len(readers))]
+            for thread in threads:
+                thread.start()
+            start = time.perf_counter()
+            visualizer.build_graph(files, root)
+            # Graph patches for everyone, more than a stalled client may buffer
+            for version in range(1000):
+                visualizer.broadcast_event({'status': 'graph_patch', 'version': version})
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            buffered = max((len(subscription.events) for subscription in subscriptions), default=0)
+            per_reader = f'{sum(received) / len(readers):.0f}' if readers else '-'
+            print(f"{count:>8} {elapsed:>8.2f} {per_reader:>12} {buffered:>13}")
+            for subscription in subscriptions:
+                broadcaster.unsubscribe(subscription)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def bench_layout(node_count, edge_count):
+    """Time every layout algorithm and report the canvas size and mean edge length."""
+    graph = synthetic_graph(node_count, edge_count)
+    node_ids = [node['id'] for node in graph['nodes']]
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    print(f"{node_count} nodes, {len(graph['edges'])} edges")
+    print(f"{'layout':>10} {'seconds':>8} {'width':>9} {'height':>9} {'mean edge':>10}")
+    for algorithm in visualizer.LAYOUT_ALGORITHMS:
+        start = time.perf_counter()
+        positions, used = visualizer.layout_positions(node_ids, graph['edges'], algorithm)
+        elapsed = time.perf_counter() - start
+        xs, ys = [x for x, _ in positions], [y for _, y in positions]
+        lengths = [((positions[index[edge['from']]][0] - positions[index[edge['to']]][0]) ** 2 +
+                    (positions[index[edge['from']]][1] - positions[index[edge['to']]][1]) ** 2) ** 0.5 for edge in graph['edges']]
+        print(f"{used:>10} {elapsed:>8.2f} {max(xs) - min(xs):>9.0f} {max(ys) - min(ys):>9.0f} {sum(lengths) / len(lengths):>10.0f}")
+
+def bench_graph_queries(node_count, edge_count, samples=20):
+    """Time building a GraphIndex and answering queries on it."""
+    graph = synthetic_graph(node_count, edge_count)
+    start = time.perf_counter()
+    index = visualizer.GraphIndex(graph)
+    print(f"{node_count} nodes, {len(graph['edges'])} edges, index built in {time.perf_counter() - start:.2f}s")
+
+    rnd = random.Random(0)
+    nodes = [rnd.randrange(node_count) for _ in range(2 * samples)]
+    queries = [
+        ('dependents', lambda i: index.neighbours(nodes[i], index.DEPENDENTS)),
+        ('closure', lambda i: index.closure(nodes[i], index.DEPENDENTS)),
+        ('closure (cached)', lambda i: index.closure(nodes[i], index.DEPENDENTS)),
+        ('shortest path', lambda i: index.shortest_path(nodes[i], nodes[samples + i])),
+        ('cycles', lambda i: index.cycles()),
+    ]
+    print(f"{'query':>18} {'first ms':>9} {'mean ms':>8}")
+    for name, query in queries:
+        timings = []
+        for i in range(samples):
+            start = time.perf_counter()
+            query(i)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>18} {timings[0]:>9.3f} {sum(timings) / samples:>8.3f}")
+
+def bench_search(file_count, samples=20):
+    """Time building a SearchIndex and answering typical queries on it."""
+    paths = [node['id'] for node in synthetic_graph(file_count, 0)['nodes']]
+    start = time.perf_counter()
+    index = visualizer.SearchIndex(paths)
+    print(f"{file_count} files, index built in {time.perf_counter() - start:.2f}s")
+    print(f"{'query':>18} {'mean ms':>8} {'results':>8}")
+    for query in ('m', 'module1', 'module12345', 'pkg12/sub3', 'mdl99', 'sub3/module', 'xyz'):
+        start = time.perf_counter()
+        for _ in range(samples):
+            results = index.search(query)
+        print(f"{query:>18} {(time.perf_counter() - start) * 1000 / samples:>8.3f} {len(results):>8}")
+
+def percentile(sorted_values, share):
+    return sorted_values[min(int(len(sorted_values) * share), len(sorted_values) - 1)] if sorted_values else 0.0
+
+def server_metric(port, name):
+    """Return the value of metric name from the /metrics of the server on port, or None."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('GET', '/metrics')
+    for line in connection.getresponse().read().decode('utf-8').splitlines():
+        if line.startswith(f'codebase_visualizer_{name} '):
+            return float(line.split()[1])
+    return None
+
+def bench_load(viewer_count=200, file_count=10000, seconds=20):
+    """Serve a generated project with --production and measure throughput with viewer_count concurrent viewers.
+
+    Every viewer keeps a /progress stream open and, on a keep-alive connection
+    of its own, asks for what the page asks for as fast as it is answered: the
+    tree view, the binary graph (revalidated by ETag after the first download),
+    searches and dependents. Needs Flask, like the server.
+    """
+    root = tempfile.mkdtemp(prefix='cv-bench-')
+    server = None
+    try:
+        project = os.path.join(root, 'project')
+        generate_tree(project, file_count)
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        log = open(os.path.join(root, 'server.log'), 'w')
+        server = subprocess.Popen([sys.executable, os.path.abspath(visualizer.__file__), project, '--production',
+                                   '--host', '127.0.0.1', '--port', str(port), '--cache-dir', os.path.join(root, 'cache'),
+                                   '--spill-dir', os.path.join(root, 'spill')], stdout=log, stderr=subprocess.STDOUT)
+
+        # The graph is built at startup; requests arriving meanwhile wait for it
+        start = time.perf_counter()
+        while True:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+                connection.request('GET', '/graph.json')
+                response = connection.getresponse()
+                graph = json.loads(response.read())
+                break
+            except (ConnectionError, OSError):
+                if server.poll() is not None:
+                    sys.exit(f"The server exited, see {log.name}")
+                time.sleep(0.1)
+        files = [node['id'] for node in graph['nodes']]
+        print(f"{len(files)} files, graph ready after {time.perf_counter() - start:.2f}s")
+
+        latencies = {}
+        errors = []
+        lock = threading.Lock()
+        connected = threading.Barrier(viewer_count + 1)
+        go = threading.Event()
+        deadline = None
+
+        def view(index):
+            rnd = random.Random(index)
+            stream = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            stream.request('GET', '/progress')
+            events = stream.getresponse()
+            events.fp.readline()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            etag = None
+            connected.wait()
+            go.wait()
+            while time.perf_counter() < deadline:
+                file_id = rnd.choice(files)
+                requests = [('tree', '/api/tree?depth=1&max_edges=3000', {}),
+                            ('graph.bin', '/graph.bin', {'Accept-Encoding': 'gzip', **({'If-None-Match': etag} if etag else {})}),
+                            ('search', f'/api/search?q={os.path.basename(file_id)[:8]}', {}),
+                            ('dependents', f'/api/dependents?file={file_id}&transitive=true&limit=100', {})]
+                for kind, url, headers in requests:
+                    request_start = time.perf_counter()
+                    try:
+                        connection.request('GET', url, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                    except (ConnectionError, OSError) as e:
+                        with lock:
+                            errors.append(f'{kind}: {e}')
+                        connection.close()
+                        continue
+                    elapsed = time.perf_counter() - request_start
+                    if kind == 'graph.bin':
+                        etag = response.getheader('ETag')
+                    with lock:
+                        if response.status >= 400:
+                            errors.append(f'{kind}: HTTP {response.status}')
+                        latencies.setdefault(kind, []).append(elapsed)
+            connection.close()
+            stream.close()
+
+        threads = [threading.Thread(target=view, args=(index,), daemon=True) for index in range(viewer_count)]
+        for thread in threads:
+            thread.start()
+        connected.wait()
+        streams = server_metric(port, 'progress_subscribers')
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        go.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        memory = server_metric(port, 'resident_memory_bytes')
+
+        total = sum(len(values) for values in latencies.values())
+        print(f"{viewer_count} viewers, {streams:.0f} /progress streams open, {total} requests in {elapsed:.1f}s: "
+              f"{total / elapsed:.0f} requests/s, {len(errors)} errors, server memory {(memory or 0) / (1024 * 1024):.0f} MB")
+        print(f"{'request':>12} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for kind, values in latencies.items():
+            values.sort()
+            print(f"{kind:>12} {len(values):>7} {percentile(values, 0.5) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+                  f"{percentile(values, 0.99) * 1000:>8.1f}")
+        for error in errors[:5]:
+            print(f"  {error}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+def measure_analysis(root, mode='imports', jobs=1, cache_dir=None):
+    """Analyze root once and return the time of each phase, the peak memory and the graph sizes.
+
+    Meant to run in a process of its own (see 'benchmark.py measure'), so that
+    the peak memory is that of this analysis alone.
+    """
+    visualizer.update_progress = lambda *args, **kwargs: None
+    with contextlib.redirect_stdout(sys.stderr):
+        graph = visualizer.build_graph(visualizer.scan_directory(root), root, mode=mode, cache_dir=cache_dir, jobs=jobs)
+    # The phases as measured by build_graph (see AnalysisMetrics); cache and graph assembly count as other
+    metrics = graph['metadata']['metrics']
+    phases = {phase: metrics['phases'].get(phase, {}).get('wall_seconds', 0.0) for phase in ('scan', 'extract', 'resolve', 'layout')}
+    total = metrics['wall_seconds']
+    phases['other'] = max(total - sum(phases.values()), 0.0)
+
+    start = time.perf_counter()
+    graph_json = json.dumps(graph, separators=(',', ':')).encode('utf-8')
+    phases['serialize_json'] = time.perf_counter() - start
+    start = time.perf_counter()
+    graph_binary = visualizer.encode_graph(graph)
+    phases['serialize_binary'] = time.perf_counter() - start
+
+    memory = graph['metadata']['memory']
+    cache = graph['metadata']['cache']
+    return {
+        'files': metrics['files'],
+        'edges': len(graph['edges']),
+        'phases': {phase: round(seconds, 4) for phase, seconds in phases.items()},
+        'analysis_seconds': round(total, 4),
+        'files_per_second': metrics['files_per_second'],
+        'cpu_seconds': metrics['cpu_seconds'],
+        'worker_cpu_seconds': metrics['worker_cpu_seconds'],
+        'bytes_parsed': metrics['bytes_read'],
+        'peak_rss_mb': memory['peak_rss_mb'],
+        'worker_peak_rss_mb': memory['worker_peak_rss_mb'],
+        'graph_json_bytes': len(graph_json),
+        'graph_json_gzip_bytes': len(gzip.compress(graph_json, compresslevel=6)),
+        'graph_binary_bytes': len(graph_binary),
+        'cache_hits': cache['hits'] if cache else None
+    }
+
+def git_commit():
+    """Return the commit of this checkout, with '-dirty' for uncommitted changes, or None outside git."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty.strip() else '')
+
+def run_suite(sizes, output=None, mode='imports', jobs=1, imports_per_file=6, seed=0):
+    """Time each analysis phase on generated projects of each size, cold and with a warm cache.
+
+    Every analysis runs in a fresh process. The results, with the commit and
+    machine they were measured on, are written to output as JSON for
+    compare_results.
+    """
+    options = {'mode': mode, 'jobs': jobs, 'imports_per_file': imports_per_file, 'seed': seed}
+    results = []
+    print(f"{'files':>7} {'run':>5} {'edges':>8} {'scan':>6} {'extract':>8} {'resolve':>8} {'layout':>7} {'other':>6} "
+          f"{'total s':>8} {'files/s':>8} {'peak MB':>8} {'bin MB':>7} {'json MB':>8}")
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix='cv-bench-')
+        try:
+            project = os.path.join(root, 'project')
+            generate_tree(project, size, seed, imports_per_file)
+            for run in ('cold', 'warm'):
+                # The cold run fills the cache the warm run reads
+                measure_options = {'mode': mode, 'jobs': jobs, 'cache_dir': os.path.join(root, 'cache')}
+                process = subprocess.run([sys.executable, os.path.abspath(__file__), 'measure', project, json.dumps(measure_options)],
+                                         capture_output=True, text=True)
+                if process.returncode != 0:
+                    sys.exit(f"Measuring {size} files failed:\n{process.stderr}")
+                result = {'size': size, 'run': run, **json.loads(process.stdout)}
+                results.append(result)
+                phases = result['phases']
+                print(f"{result['files']:>7} {run:>5} {result['edges']:>8} {phases['scan']:>6.2f} {phases.get('extract', 0):>8.2f} "
+                      f"{phases.get('resolve', 0):>8.2f} {phases.get('layout', 0):>7.2f} {phases['other']:>6.2f} "
+                      f"{result['analysis_seconds']:>8.2f} {result['files_per_second']:>8.0f} {result['peak_rss_mb'] or 0:>8.0f} "
+                      f"{result['graph_binary_bytes'] / 1e6:>7.2f} {result['graph_json_bytes'] / 1e6:>8.2f}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        'format': 1,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'results': results
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    return report
+
+def compare_results(base_path, new_path, threshold=0.1, min_seconds=0.05):
+    """Compare two run_suite result files and return 1 if new is slower or larger anywhere, 0 otherwise.
+
+    A phase regresses when it takes more than threshold longer, and at least
+    min_seconds longer; memory and graph size when they grow by more than threshold.
+    """
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"base {base['commit']} ({base['created_at']}), new {new['commit']} ({new['created_at']})")
+    previous = {(result['size'], result['run']): result for result in base['results']}
+
+    regressions = 0
+    print(f"{'files':>7} {'run':>5} {'metric':>22} {'base':>10} {'new':>10} {'change':>8}")
+    for result in new['results']:
+        old = previous.get((result['size'], result['run']))
+        if old is None:
+            continue
+        metrics = [(phase, old['phases'].get(phase), seconds, True) for phase, seconds in result['phases'].items()]
+        metrics += [('analysis_seconds', old['analysis_seconds'], result['analysis_seconds'], True)]
+        metrics += [(name, old.get(name), result.get(name), False) for name in ('peak_rss_mb', 'graph_binary_bytes', 'graph_json_bytes')]
+        for name, before, after, is_time in metrics:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change > threshold and (not is_time or after - before >= min_seconds)
+            regressions += regressed
+            print(f"{result['size']:>7} {result['run']:>5} {name:>22} {before:>10.4g} {after:>10.4g} {change:>+8.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regressions")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['suite']:
+        parser = argparse.ArgumentParser(prog='benchmark.py suite',
+                                         description='Time each analysis phase on generated projects and save the results.')
+        parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000], help='file counts (default: 1000 10000 100000)')
+        parser.add_argument('-o', '--output', help='JSON file for the results, see compare')
+        parser.add_argument('--mode', choices=['imports', 'heuristic'], default='imports')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='worker processes for parsing (default: 1)')
+        parser.add_argument('--imports-per-file', type=int, default=6, help='imports in each generated file (default: 6)')
+        parser.add_argument('--seed', type=int, default=0)
+        args = parser.parse_args(sys.argv[2:])
+        run_suite(args.sizes, args.output, args.mode, args.jobs, args.imports_per_file, args.seed)
+    elif sys.argv[1:2] == ['measure']:
+        print(json.dumps(measure_analysis(sys.argv[2], **json.loads(sys.argv[3]))))
+    elif sys.argv[1:2] == ['compare']:
+        sys.exit(compare_results(sys.argv[2], sys.argv[3], *[float(arg) for arg in sys.argv[4:5]]))
+    elif sys.argv[1:2] == ['scan']:
+        bench_scan_directory(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+    elif sys.argv[1:2] == ['progress']:
+        bench_progress_clients(*[int(arg) for arg in sys.argv[2:4]])
+    elif sys.argv[1:2] == ['layout']:
+        counts = [int(arg) for arg in sys.argv[2:4]]
+        bench_layout(*(counts or [50000, 150000]))
+    elif sys.argv[1:2] == ['query']:
+        counts = [int(arg) for arg in sys.argv[2:4]]
+        bench_graph_queries(*(counts or [20000, 300000]))
+    elif sys.argv[1:2] == ['search']:
+        bench_search(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    elif sys.argv[1:2] == ['load']:
+        bench_load(*[int(arg) for arg in sys.argv[2:5]])
+    elif sys.argv[1:2] == ['payload']:
+        counts = [int(arg) for arg in sys.argv[2:4]]
+        bench_graph_payload(*(counts or [20000, 300000]))
+    else:
+        sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000, 8000]
+        bench_build_graph(sizes)
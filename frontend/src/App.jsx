@@ -1,4 +1,4 @@
-import { useState, useCallback } from 'react'
+import { useState, useCallback, useEffect } from 'react'
 import { applyNodeChanges, applyEdgeChanges } from 'reactflow'
 import './App.css'
 
@@ -18,12 +18,18 @@ function App() {
     projectMetadata,
     progress,
     reindexProject,
-    analyzePath
+    analyzePath,
+    toggleDirectory,
+    queryGraph,
+    searchFiles,
+    revealFile,
+    openInVSCode
   } = useGraphData()
 
   const [selectedNode, setSelectedNode] = useState(null)
   const [selectedNodeData, setSelectedNodeData] = useState(null)
   const [highlightedNodes, setHighlightedNodes] = useState(new Set())
+  const [searchSelection, setSearchSelection] = useState(null)
 
   const onNodesChange = useCallback(
     (changes) => applyNodeChanges(changes, graphData.nodes),
@@ -35,33 +41,68 @@ function App() {
     [graphData.edges]
   )
 
+  // Select a file and highlight the files connected to it
+  const selectNode = useCallback((node) => {
+    setSelectedNode(node.id)
+    setSelectedNodeData(node.data)
+    // Find all connected nodes
+    const connected = new Set([node.id])
+    graphData.edges.forEach(edge => {
+      if (edge.source === node.id) {
+        connected.add(edge.target)
+      }
+      if (edge.target === node.id) {
+        connected.add(edge.source)
+      }
+    })
+    setHighlightedNodes(connected)
+  }, [graphData.edges])
+
   const onNodeClick = useCallback((event, node) => {
+    if (node.data.type === 'directory') {
+      // Collapsed directory of the tree view: show its contents
+      toggleDirectory(node.id)
+      return
+    }
     if (selectedNode === node.id) {
       // Deselect if clicking the same node
       setSelectedNode(null)
       setSelectedNodeData(null)
       setHighlightedNodes(new Set())
     } else {
-      setSelectedNode(node.id)
-      setSelectedNodeData(node.data)
-      // Find all connected nodes
-      const connected = new Set([node.id])
-      graphData.edges.forEach(edge => {
-        if (edge.source === node.id) {
-          connected.add(edge.target)
-        }
-        if (edge.target === node.id) {
-          connected.add(edge.source)
-        }
-      })
-      setHighlightedNodes(connected)
+      selectNode(node)
     }
-  }, [selectedNode, graphData.edges])
+  }, [selectedNode, selectNode, toggleDirectory])
+
+  // Search results may be in a directory that is not open yet. The result is
+  // selected by the effect below, once the graph that reveals it has rendered.
+  const onSearchSelect = useCallback(async (event, node) => {
+    await revealFile(node.id)
+    setSearchSelection(node.id)
+  }, [revealFile])
+
+  useEffect(() => {
+    if (!searchSelection) {
+      return
+    }
+    setSearchSelection(null)
+    const node = graphData.nodes.find(node => node.id === searchSelection)
+    if (node) {
+      selectNode(node)
+    }
+  }, [searchSelection, graphData.nodes, selectNode])
+
+  // In the tree view, double-clicking a file closes its directory again
+  const onNodeDoubleClick = useCallback((event, node) => {
+    const directory = node.id.slice(0, node.id.lastIndexOf('/'))
+    if (projectMetadata?.view && directory && node.data.type !== 'directory') {
+      toggleDirectory(directory)
+    }
+  }, [projectMetadata, toggleDirectory])
 
   const handleOpenInVSCode = useCallback(async (filePath) => {
     try {
-      const response = await fetch(`/api/open-in-vscode/${encodeURIComponent(filePath)}`)
-      const data = await response.json()
+      const data = await openInVSCode(filePath)
       if (data.status === 'opened') {
         console.log(`Opened ${data.file} in VS Code`)
       } else {
@@ -70,7 +111,7 @@ function App() {
     } catch (err) {
       console.error('Error opening file in VS Code:', err)
     }
-  }, [])
+  }, [openInVSCode])
 
   if (loading) {
     return <LoadingScreen progress={progress} />
@@ -94,8 +135,8 @@ function App() {
         graphData={graphData}
       >
         <SearchBar
-          nodes={graphData.nodes}
-          onNodeSelect={onNodeClick}
+          searchFiles={searchFiles}
+          onNodeSelect={onSearchSelect}
         />
       </Header>
 
@@ -107,12 +148,13 @@ function App() {
         onNodesChange={onNodesChange}
         onEdgesChange={onEdgesChange}
         onNodeClick={onNodeClick}
+        onNodeDoubleClick={onNodeDoubleClick}
       />
 
       <NodeDetailsPanel
         selectedNodeData={selectedNodeData}
-        edges={graphData.edges}
         selectedNode={selectedNode}
+        queryGraph={queryGraph}
         onOpenInVSCode={handleOpenInVSCode}
       />
     </div>
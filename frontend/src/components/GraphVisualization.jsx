@@ -2,7 +2,7 @@ import ReactFlow, { Controls, Background } from 'reactflow'
 import 'reactflow/dist/style.css'
 import PropTypes from 'prop-types'
 
-function GraphVisualization({ nodes, edges, selectedNode, highlightedNodes, onNodesChange, onEdgesChange, onNodeClick }) {
+function GraphVisualization({ nodes, edges, selectedNode, highlightedNodes, onNodesChange, onEdgesChange, onNodeClick, onNodeDoubleClick }) {
   const styledNodes = nodes.map(node => ({
     ...node,
     className: node.id === selectedNode
@@ -19,6 +19,7 @@ function GraphVisualization({ nodes, edges, selectedNode, highlightedNodes, onNo
       onNodesChange={onNodesChange}
       onEdgesChange={onEdgesChange}
       onNodeClick={onNodeClick}
+      onNodeDoubleClick={onNodeDoubleClick}
       fitView
       minZoom={0.01}
       maxZoom={2}
@@ -37,7 +38,8 @@ GraphVisualization.propTypes = {
   highlightedNodes: PropTypes.instanceOf(Set).isRequired,
   onNodesChange: PropTypes.func.isRequired,
   onEdgesChange: PropTypes.func.isRequired,
-  onNodeClick: PropTypes.func.isRequired
+  onNodeClick: PropTypes.func.isRequired,
+  onNodeDoubleClick: PropTypes.func
 }
 
 export default GraphVisualization
@@ -1,14 +1,35 @@
+import { useState, useEffect } from 'react'
 import PropTypes from 'prop-types'
 
-function NodeDetailsPanel({ selectedNodeData, edges, selectedNode, onOpenInVSCode }) {
+function NodeDetailsPanel({ selectedNodeData, selectedNode, queryGraph, onOpenInVSCode }) {
+  // Counts from the server's graph index, which also covers files not loaded
+  const [counts, setCounts] = useState(null)
+
+  useEffect(() => {
+    setCounts(null)
+    if (!selectedNode) return
+
+    let cancelled = false
+    Promise.all([
+      queryGraph('dependencies', { file: selectedNode, limit: 1 }),
+      queryGraph('dependents', { file: selectedNode, limit: 1 }),
+      queryGraph('dependents', { file: selectedNode, transitive: true, limit: 1 })
+    ])
+      .then(([dependencies, dependents, allDependents]) => {
+        if (!cancelled && dependencies && dependents && allDependents) {
+          setCounts({ imports: dependencies.count, importedBy: dependents.count, affected: allDependents.count })
+        }
+      })
+      .catch(err => console.error('Error querying graph:', err))
+    return () => {
+      cancelled = true
+    }
+  }, [selectedNode, queryGraph])
+
   if (!selectedNodeData) {
     return null
   }
 
-  const connectionCount = edges.filter(edge =>
-    edge.source === selectedNode || edge.target === selectedNode
-  ).length
-
   return (
     <div className="node-details-panel">
       <h3>File Details</h3>
@@ -22,7 +43,13 @@ function NodeDetailsPanel({ selectedNodeData, edges, selectedNode, onOpenInVSCod
         <strong>Type:</strong> {selectedNodeData.type}
       </div>
       <div className="detail-item">
-        <strong>Connections:</strong> {connectionCount}
+        <strong>Imports:</strong> {counts ? counts.imports : '…'}
+      </div>
+      <div className="detail-item">
+        <strong>Imported by:</strong> {counts ? counts.importedBy : '…'}
+      </div>
+      <div className="detail-item">
+        <strong>Affected by changes:</strong> {counts ? `${counts.affected} files` : '…'}
       </div>
       <button
         onClick={() => onOpenInVSCode(selectedNodeData.path)}
@@ -40,8 +67,8 @@ NodeDetailsPanel.propTypes = {
     path: PropTypes.string.isRequired,
     type: PropTypes.string.isRequired
   }),
-  edges: PropTypes.array.isRequired,
   selectedNode: PropTypes.string,
+  queryGraph: PropTypes.func.isRequired,
   onOpenInVSCode: PropTypes.func.isRequired
 }
 
@@ -1,53 +1,62 @@
-import { useState, useCallback } from 'react'
+import { useState, useCallback, useRef } from 'react'
 import PropTypes from 'prop-types'
 
-function SearchBar({ nodes, onNodeSelect }) {
+// Search results as nodes for onNodeSelect, also for files not loaded in the tree view
+const toResultNode = (result) => ({
+  id: result.id,
+  data: { label: result.label, path: result.path, type: result.type }
+})
+
+function SearchBar({ searchFiles, onNodeSelect }) {
   const [searchTerm, setSearchTerm] = useState('')
   const [searchResults, setSearchResults] = useState([])
   const [showDropdown, setShowDropdown] = useState(false)
+  // Only the results of the latest search are shown
+  const searchCounterRef = useRef(0)
 
-  const handleSearchChange = useCallback((e) => {
-    const term = e.target.value.toLowerCase()
+  const handleSearchChange = useCallback(async (e) => {
+    const term = e.target.value
     setSearchTerm(term)
+    const searchId = ++searchCounterRef.current
 
-    if (term.length > 0) {
-      const results = nodes.filter(node =>
-        node.data.label.toLowerCase().includes(term) ||
-        node.data.path.toLowerCase().includes(term)
-      ).slice(0, 10) // Limit to 10 results
-      setSearchResults(results)
-      setShowDropdown(true)
+    if (term.trim().length > 0) {
+      try {
+        const results = await searchFiles(term, 10) // Limit to 10 results
+        if (searchId === searchCounterRef.current) {
+          setSearchResults(results.map(toResultNode))
+          setShowDropdown(true)
+        }
+      } catch (err) {
+        console.error('Error searching files:', err)
+      }
     } else {
       setSearchResults([])
       setShowDropdown(false)
     }
-  }, [nodes])
+  }, [searchFiles])
+
+  const clearSearch = useCallback(() => {
+    searchCounterRef.current++
+    setSearchTerm('')
+    setSearchResults([])
+    setShowDropdown(false)
+  }, [])
 
   const handleSearchKeyDown = useCallback((e) => {
     if (e.key === 'Enter' && searchResults.length > 0) {
       // Select the first result
       const firstResult = searchResults[0]
       onNodeSelect(null, firstResult)
-      setSearchTerm('')
-      setSearchResults([])
-      setShowDropdown(false)
+      clearSearch()
     } else if (e.key === 'Escape') {
-      setSearchTerm('')
-      setSearchResults([])
-      setShowDropdown(false)
+      clearSearch()
     }
-  }, [searchResults, onNodeSelect])
+  }, [searchResults, onNodeSelect, clearSearch])
 
   const handleResultClick = useCallback((node) => {
     onNodeSelect(null, node)
-    setSearchTerm('')
-    setSearchResults([])
-    setShowDropdown(false)
-  }, [onNodeSelect])
-
-  if (!nodes || nodes.length === 0) {
-    return null
-  }
+    clearSearch()
+  }, [onNodeSelect, clearSearch])
 
   return (
     <div className="search-container">
@@ -78,13 +87,7 @@ function SearchBar({ nodes, onNodeSelect }) {
 }
 
 SearchBar.propTypes = {
-  nodes: PropTypes.arrayOf(PropTypes.shape({
-    id: PropTypes.string.isRequired,
-    data: PropTypes.shape({
-      label: PropTypes.string.isRequired,
-      path: PropTypes.string.isRequired
-    }).isRequired
-  })),
+  searchFiles: PropTypes.func.isRequired,
   onNodeSelect: PropTypes.func.isRequired
 }
 
@@ -1,117 +1,391 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect, useCallback, useRef } from 'react'
+
+// Projects with at least this many files are shown as a directory tree
+// (see /api/tree) instead of loading every file at once
+const TREE_VIEW_MIN_FILES = 2000
+const TREE_VIEW_MAX_EDGES = 3000
+// Milliseconds between job status requests when a job's event stream failed
+const JOB_POLL_INTERVAL = 1000
+// Milliseconds before the progress stream is opened again after the server refused it
+const SSE_RETRY_INTERVAL = 5000
+
+// Convert backend nodes and edges to React Flow format (positions calculated in backend)
+const toFlowNode = (node) => ({
+  id: node.id,
+  position: node.position,
+  data: {
+    label: node.type === 'directory' ? `${node.label} (${node.file_count} files)` : node.label,
+    type: node.type,
+    path: node.path,
+    fileCount: node.file_count
+  },
+  type: 'default',
+  style: {}
+})
+
+// Edge ids are derived from their endpoints so graph patches can address them.
+// Edges between directories stand for count file-level connections
+const toFlowEdge = (edge) => ({
+  id: `${edge.from}->${edge.to}`,
+  source: edge.from,
+  target: edge.to,
+  type: 'default',
+  ...(edge.count > 1 && {
+    label: String(edge.count),
+    style: { strokeWidth: Math.min(1 + Math.log2(edge.count), 8) }
+  })
+})
+
+// Apply a graph_patch pushed by the file watcher
+const applyGraphPatch = (graph, patch) => {
+  const removedNodes = new Set(patch.removed_nodes)
+  const removedEdges = new Set(patch.removed_edges.map(edge => `${edge.from}->${edge.to}`))
+
+  const nodes = graph.nodes
+    .filter(node => !removedNodes.has(node.id))
+    .concat(patch.added_nodes.map(toFlowNode))
+  const edges = graph.edges
+    .filter(edge => !removedEdges.has(edge.id) && !removedNodes.has(edge.source) && !removedNodes.has(edge.target))
+    .concat(patch.added_edges.map(toFlowEdge))
+
+  return { nodes, edges }
+}
+
+// Decode the binary graph served as /graph.bin (see encode_graph in visualizer.py)
+// straight into React Flow nodes and edges
+const decodeGraph = (buffer) => {
+  const header = new DataView(buffer, 0, 20)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== 'CVG1') {
+    throw new Error('Unexpected graph format')
+  }
+  const metadataLength = header.getUint32(4, true)
+  const nodeCount = header.getUint32(8, true)
+  const edgeCount = header.getUint32(12, true)
+  const stringsLength = header.getUint32(16, true)
+  const padded = (length) => length + (-length & 3)
+
+  const decoder = new TextDecoder()
+  let offset = 20
+  const metadata = JSON.parse(decoder.decode(new Uint8Array(buffer, offset, metadataLength)))
+  offset += padded(metadataLength)
+  const ids = nodeCount ? decoder.decode(new Uint8Array(buffer, offset, stringsLength)).split('\0') : []
+  offset += padded(stringsLength)
+  const positions = new Float32Array(buffer, offset, nodeCount * 2)
+  offset += nodeCount * 8
+  const edgeIndices = new Uint32Array(buffer, offset, edgeCount * 2)
+
+  const nodes = ids.map((id, i) => {
+    const label = id.slice(id.lastIndexOf('/') + 1)
+    const dot = label.lastIndexOf('.')
+    return toFlowNode({
+      id,
+      label,
+      type: dot > 0 ? label.slice(dot).toLowerCase() : '',
+      path: id,
+      position: { x: positions[2 * i], y: positions[2 * i + 1] }
+    })
+  })
+  const edges = new Array(edgeCount)
+  for (let i = 0; i < edgeCount; i++) {
+    edges[i] = toFlowEdge({ from: ids[edgeIndices[2 * i]], to: ids[edgeIndices[2 * i + 1]] })
+  }
+
+  return { metadata, nodes, edges }
+}
+
+// Fetch the graph in React Flow format, or null if there is none. With a
+// projectId, the graph of that project is fetched instead of the default one.
+// Graphs of more than maxFiles files are not sent; then the result is
+// { tooLarge: true } instead
+const fetchGraph = async (projectId, maxFiles) => {
+  const params = new URLSearchParams()
+  if (projectId) {
+    params.set('project', projectId)
+  }
+  if (maxFiles !== undefined) {
+    params.set('max_files', maxFiles)
+  }
+  const response = await fetch(`/graph.bin?${params}`)
+  if (response.status === 413) {
+    return { tooLarge: true }
+  }
+  if (!response.ok) {
+    return null
+  }
+  return decodeGraph(await response.arrayBuffer())
+}
+
+// Fetch the directory tree view of the graph with the expanded directories open
+const fetchTree = async (projectId, expanded) => {
+  const params = new URLSearchParams({ depth: 1, max_edges: TREE_VIEW_MAX_EDGES })
+  if (projectId) {
+    params.set('project', projectId)
+  }
+  expanded.forEach(directory => params.append('expand', directory))
+  const response = await fetch(`/api/tree?${params}`)
+  if (!response.ok) {
+    return null
+  }
+  const data = await response.json()
+  return { metadata: data.metadata, nodes: data.nodes.map(toFlowNode), edges: data.edges.map(toFlowEdge) }
+}
+
+// Fetch the whole graph, or the tree view for large projects. Tree views
+// are recognizable by their metadata.view. The server tells from its file
+// count whether a graph is too large, so each view takes a single request
+// unless the project crossed the threshold since treeView was shown
+const fetchView = async (projectId, expanded, treeView) => {
+  if (treeView) {
+    const tree = await fetchTree(projectId, expanded)
+    if (!tree || tree.metadata.file_count >= TREE_VIEW_MIN_FILES) {
+      return tree
+    }
+  }
+  const graph = await fetchGraph(projectId, TREE_VIEW_MIN_FILES - 1)
+  return graph && graph.tooLarge ? fetchTree(projectId, expanded) : graph
+}
+
+// Poll the status of an analysis job until it finishes
+const pollJob = async (jobId, onProgress) => {
+  for (;;) {
+    const response = await fetch(`/api/jobs/${jobId}`)
+    const job = await response.json()
+    if (!response.ok) {
+      throw new Error(job.error || 'The analysis job was not found')
+    }
+    onProgress(job.progress)
+    if (job.status === 'complete') {
+      return
+    }
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || job.progress.message)
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL))
+  }
+}
+
+// Follow the progress of an analysis job until it finishes. If its event
+// stream fails (the job expired, the server restarted or the connection
+// dropped) the job status is polled instead
+const followJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+  const eventSource = new EventSource(`/progress?job=${jobId}`)
+
+  eventSource.onmessage = (event) => {
+    const data = JSON.parse(event.data)
+    if (data.status === 'keepalive') return
+    onProgress(data)
+
+    if (data.job_status === 'complete') {
+      eventSource.close()
+      resolve()
+    } else if (data.job_status === 'failed' || data.job_status === 'cancelled') {
+      eventSource.close()
+      reject(new Error(data.message))
+    }
+  }
+
+  eventSource.onerror = () => {
+    eventSource.close()
+    pollJob(jobId, onProgress).then(resolve, reject)
+  }
+})
 
 function useGraphData() {
   const [graphData, setGraphData] = useState({ nodes: [], edges: [] })
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [projectMetadata, setProjectMetadata] = useState(null)
-  const [sseConnected, setSseConnected] = useState(false)
+  // Set once the progress stream was opened or refused, the graph is loaded then
+  const [sseReady, setSseReady] = useState(false)
   const [progress, setProgress] = useState({ status: 'idle', message: '', percentage: 0 })
+  // Project whose graph is shown, if it was opened through analyzePath
+  const projectIdRef = useRef(null)
+  // Directories opened in the tree view, and whether it is shown
+  const expandedRef = useRef(new Set())
+  const treeViewRef = useRef(false)
+  // Version of the shown graph, which graph patches must follow on directly
+  const versionRef = useRef(null)
 
-  // Listen for progress updates via SSE
-  useEffect(() => {
-    const eventSource = new EventSource('/progress')
+  const showGraph = useCallback((data) => {
+    treeViewRef.current = Boolean(data.metadata.view)
+    versionRef.current = data.metadata.version ?? null
+    setProjectMetadata(data.metadata)
+    setGraphData({ nodes: data.nodes, edges: data.edges })
+  }, [])
 
-    eventSource.onopen = () => {
-      console.log('SSE connection established')
-      setSseConnected(true)
+  const loadGraphData = useCallback(async () => {
+    try {
+      const data = await fetchView(projectIdRef.current, expandedRef.current, treeViewRef.current)
+      if (data) {
+        showGraph(data)
+        return true
+      }
+    } catch (err) {
+      console.error('Error loading graph data:', err)
     }
+    return false
+  }, [showGraph])
 
-    eventSource.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-      setProgress(data)
-      console.log('Progress update:', data)
+  // Query the graph index of the shown graph, e.g. queryGraph('dependents', { file, transitive: true })
+  const queryGraph = useCallback(async (endpoint, params) => {
+    const query = new URLSearchParams(params)
+    if (projectIdRef.current) {
+      query.set('project', projectIdRef.current)
     }
+    const response = await fetch(`/api/${endpoint}?${query}`)
+    return response.ok ? response.json() : null
+  }, [])
+
+  // Open a file of the shown graph in VS Code
+  const openInVSCode = useCallback(async (filePath) => {
+    const query = projectIdRef.current ? `?project=${projectIdRef.current}` : ''
+    const response = await fetch(`/api/open-in-vscode/${encodeURIComponent(filePath)}${query}`)
+    return response.json()
+  }, [])
 
-    eventSource.onerror = (error) => {
-      console.error('SSE connection error:', error)
+  // Search the files of the shown graph on the server, best matches first
+  const searchFiles = useCallback(async (query, limit) => {
+    const data = await queryGraph('search', { q: query, limit })
+    return data ? data.results : []
+  }, [queryGraph])
+
+  // Make sure a file is loaded, opening its directory in the tree view
+  const revealFile = useCallback(async (fileId) => {
+    const directory = fileId.slice(0, fileId.lastIndexOf('/'))
+    if (treeViewRef.current && directory && !expandedRef.current.has(directory)) {
+      expandedRef.current.add(directory)
+      await loadGraphData()
+    }
+  }, [loadGraphData])
+
+  // Open a directory of the tree view, or close it and its subdirectories
+  const toggleDirectory = useCallback((directory) => {
+    const expanded = expandedRef.current
+    if (expanded.has(directory)) {
+      expanded.forEach(other => {
+        if (other === directory || other.startsWith(`${directory}/`)) {
+          expanded.delete(other)
+        }
+      })
+    } else {
+      expanded.add(directory)
+    }
+    return loadGraphData()
+  }, [loadGraphData])
+
+  // Listen for progress updates and graph patches via SSE
+  useEffect(() => {
+    let eventSource
+    let retryTimer
+    // Patches sent while reconnecting are lost, so the graph is fetched again
+    let reconnecting = false
+
+    const connect = () => {
+      eventSource = new EventSource('/progress')
+
+      eventSource.onopen = () => {
+        console.log('SSE connection established')
+        setSseReady(true)
+        if (reconnecting) {
+          reconnecting = false
+          loadGraphData()
+        }
+      }
+
+      eventSource.onmessage = (event) => {
+        const data = JSON.parse(event.data)
+
+        if ((data.status === 'graph_patch' || data.status === 'graph_reset') && projectIdRef.current) {
+          // Watch mode updates the graph of the default project only
+          return
+        }
+        if (data.status === 'graph_patch' && treeViewRef.current) {
+          // Directory counts may have changed, fetch the view again
+          loadGraphData()
+          return
+        }
+        if (data.status === 'graph_patch' && versionRef.current !== null && data.version <= versionRef.current) {
+          // Already part of the shown graph, which was fetched after the patch
+          return
+        }
+        if (data.status === 'graph_patch' && (versionRef.current === null || data.version !== versionRef.current + 1)) {
+          // Patches were missed, the shown graph would no longer match the server's
+          loadGraphData()
+          return
+        }
+        if (data.status === 'graph_patch') {
+          // Incremental update from watch mode
+          versionRef.current = data.version
+          setGraphData(graph => applyGraphPatch(graph, data.patch))
+          setProjectMetadata(metadata => metadata && { ...metadata, ...data.metadata, version: data.version })
+          return
+        }
+        if (data.status === 'graph_reset') {
+          loadGraphData()
+          return
+        }
+
+        setProgress(data)
+        console.log('Progress update:', data)
+      }
+
+      eventSource.onerror = (error) => {
+        console.error('SSE connection error:', error)
+        reconnecting = true
+        if (eventSource.readyState === EventSource.CLOSED) {
+          // The server refused the stream, e.g. because it serves too many
+          // viewers. EventSource gives up then, so try again later and show
+          // the graph meanwhile
+          setSseReady(true)
+          retryTimer = setTimeout(connect, SSE_RETRY_INTERVAL)
+        }
+      }
     }
+    connect()
 
     return () => {
+      clearTimeout(retryTimer)
       eventSource.close()
     }
-  }, [])
+  }, [loadGraphData])
 
   // Check for existing graph or show path selection
   useEffect(() => {
-    if (!sseConnected) return
-
-    fetch('/graph.json')
-      .then(response => {
-        if (response.ok) {
-          return response.json()
-        } else {
-          // No existing graph, show path selection
-          setLoading(false)
-          return null
-        }
-      })
+    if (!sseReady) return
+
+    fetchView(null, expandedRef.current, treeViewRef.current)
       .then(data => {
         if (data) {
           // Existing graph found
-          setProjectMetadata(data.metadata)
-
-          // Convert to React Flow format (positions calculated in backend)
-          const nodes = data.nodes.map((node) => ({
-            id: node.id,
-            position: node.position,
-            data: { label: node.label, type: node.type, path: node.path },
-            type: 'default',
-            style: {}
-          }))
-
-          const edges = data.edges.map((edge, index) => ({
-            id: `e${index}`,
-            source: edge.from,
-            target: edge.to,
-            type: 'default'
-          }))
-
-          setGraphData({ nodes, edges })
-          setLoading(false)
+          showGraph(data)
         }
+        // Otherwise no existing graph, show path selection
+        setLoading(false)
       })
       .catch(err => {
         // No graph exists, show path selection
         setLoading(false)
       })
-  }, [sseConnected])
+  }, [sseReady, showGraph])
 
-  const loadGraphData = useCallback(async () => {
-    try {
-      const response = await fetch('/graph.json')
-      if (response.ok) {
-        const data = await response.json()
-        setProjectMetadata(data.metadata)
-
-        const nodes = data.nodes.map((node) => ({
-          id: node.id,
-          position: node.position,
-          data: { label: node.label, type: node.type, path: node.path },
-          type: 'default',
-          style: {}
-        }))
-
-        const edges = data.edges.map((edge, index) => ({
-          id: `e${index}`,
-          source: edge.from,
-          target: edge.to,
-          type: 'default'
-        }))
-
-        setGraphData({ nodes, edges })
-        return true
-      }
-    } catch (err) {
-      console.error('Error loading graph data:', err)
-    }
-    return false
-  }, [])
-
-  const reindexProject = useCallback(async () => {
+  // Show the graph of the project at path, analyzing it unless the server still has its graph
+  const analyzePath = useCallback(async (path) => {
     setLoading(true)
+    setError(null)
     try {
-      await fetch('/api/reindex')
+      // Runs in the background; progress arrives on the job's own event stream
+      const response = await fetch(`/api/analyze?path=${encodeURIComponent(path)}`, { method: 'POST' })
+      const job = await response.json()
+      if (!response.ok) {
+        throw new Error(job.error || 'Analysis failed')
+      }
+      if (job.job_id) {
+        await followJob(job.job_id, setProgress)
+      }
+      projectIdRef.current = job.project_id
+      expandedRef.current = new Set()
+      treeViewRef.current = false
       await loadGraphData()
     } catch (err) {
       setError(err.message)
@@ -120,18 +394,21 @@ function useGraphData() {
     }
   }, [loadGraphData])
 
-  const analyzePath = useCallback(async (path) => {
+  const reindexProject = useCallback(async () => {
     setLoading(true)
-    setError(null)
     try {
-      // Note: This endpoint doesn't exist yet, but we can implement it later
-      const response = await fetch(`/api/analyze?path=${encodeURIComponent(path)}`)
+      // The server analyzes the project again in the background
+      const query = projectIdRef.current ? `?project=${projectIdRef.current}` : ''
+      const response = await fetch(`/api/reindex${query}`, { method: 'POST' })
+      const job = await response.json()
       if (!response.ok) {
-        throw new Error('Analysis failed')
+        throw new Error(job.error || 'Reindexing failed')
       }
+      await followJob(job.job_id, setProgress)
       await loadGraphData()
     } catch (err) {
       setError(err.message)
+    } finally {
       setLoading(false)
     }
   }, [loadGraphData])
@@ -144,7 +421,12 @@ function useGraphData() {
     progress,
     reindexProject,
     analyzePath,
-    loadGraphData
+    loadGraphData,
+    toggleDirectory,
+    queryGraph,
+    searchFiles,
+    revealFile,
+    openInVSCode
   }
 }
 
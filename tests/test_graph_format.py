@@ -0,0 +1,34 @@
+import pytest
+
+from visualizer import GRAPH_MAGIC, decode_graph, encode_graph, make_node
+
+def graph_of(ids, edges, metadata=None):
+    nodes = []
+    for i, node_id in enumerate(ids):
+        node = make_node(node_id, i)
+        # Positions that float32 represents exactly
+        node['position'] = {'x': i * 0.5, 'y': -i * 250.0}
+        nodes.append(node)
+    return {
+        'metadata': metadata if metadata is not None else {'file_count': len(ids)},
+        'nodes': nodes,
+        'edges': [{'from': source, 'to': target} for source, target in edges]
+    }
+
+@pytest.mark.parametrize('graph', [
+    graph_of([], []),
+    graph_of(['a.py'], [], {}),
+    graph_of(['src/a.js', 'src/b.ts', 'README.md'], [('src/a.js', 'src/b.ts'), ('src/b.ts', 'src/a.js')]),
+    # Multi-byte names shift the padding of the following sections
+    graph_of(['dé/ñ.py', '日本/語.js', 'x'], [('x', '日本/語.js')], {'project_name': 'prö', 'layout': {'a': [1, 2]}}),
+    graph_of([f'dir{i % 7}/file{i}.py' for i in range(500)], [(f'dir{i % 7}/file{i}.py', f'dir0/file{i // 2 * 0}.py') for i in range(1, 500)])
+])
+def test_round_trip(graph):
+    data = encode_graph(graph)
+    assert data.startswith(GRAPH_MAGIC)
+    assert len(data) % 4 == 0
+    assert decode_graph(data) == graph
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_graph(b'{"nodes": []}'.ljust(32))
@@ -0,0 +1,57 @@
+import os
+import random
+
+from visualizer import extract_file_references, match_references, reference_terms, relative_paths
+
+DIRS = ['', 'src', 'src/lib', 'src/lib/deep', 'src/.config', 'lib', 'lib/src', 'a b', 'pkg.v2']
+NAMES = ['index', 'utils', 'mod', 'mod4', 'mod45', '.hidden', 'noext', 'x(y)']
+EXTS = ['.js', '.py', '.ts', '.d.ts', '']
+
+def make_tree(root, seed):
+    """Write files that refer to each other through absolute and relative paths."""
+    rnd = random.Random(seed)
+    files = sorted({os.path.join(root, rnd.choice(DIRS), rnd.choice(NAMES) + rnd.choice(EXTS)) for _ in range(120)})
+    for path in files:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    for path in files:
+        refs = []
+        for _ in range(rnd.randint(0, 5)):
+            target = rnd.choice(files)
+            # Relative to this file or to some other file's directory
+            rel = os.path.relpath(target, os.path.dirname(rnd.choice([path, rnd.choice(files)])))
+            refs.append(rnd.choice(['', './', 'x', '../']) + rel.rsplit('.', 1)[0] + rnd.choice(['', '.js', 'z']))
+        refs.append(os.path.relpath(rnd.choice(files), root).replace('/', '.'))
+        with open(path, 'w') as f:
+            f.write(' '.join(refs) + '\n')
+    rnd.shuffle(files)
+    return files
+
+def original_edges(files, root_path):
+    """The original search over all pairs, whose relative terms accumulate per target."""
+    contents = {}
+    for path in files:
+        with open(path) as f:
+            contents[path] = f.read()
+    edges = set()
+    for target_path in files:
+        target_rel = os.path.relpath(target_path, root_path)
+        search_terms = reference_terms(target_rel)
+        for source_path in files:
+            if source_path != target_path:
+                rel_import = os.path.relpath(target_path, os.path.dirname(source_path))
+                if not rel_import.startswith('.'):
+                    rel_import = './' + rel_import
+                search_terms.append(rel_import)
+                search_terms.append(rel_import.rsplit('.', 1)[0] if '.' in rel_import else rel_import)
+                if any(term in contents[source_path] for term in search_terms):
+                    edges.add((os.path.relpath(source_path, root_path), target_rel))
+    return edges
+
+def test_matches_original_search(tmp_path):
+    for seed in range(4):
+        root = str(tmp_path / str(seed))
+        files = make_tree(root, seed)
+        rel_paths = relative_paths(files, root)
+        references = [extract_file_references(path, 'heuristic') for path in files]
+        matches = match_references(files, rel_paths, references)
+        assert {(rel_paths[source], rel_paths[target]) for target, source in matches} == original_edges(files, root)
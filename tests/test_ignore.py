@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import visualizer
+from visualizer import IgnoreMatcher, scan_directory
+
+GITIGNORES = {
+    '': ['*.log', '!keep.log', '/build/', 'docs/**/draft*', 'tmp', '# comment', '', r'\#literal', 'a?c.txt', '[xy]z.js'],
+    'src': ['generated/', '!generated/keep.js', '*.min.js', '/local.js'],
+    'src/lib': ['!*.log', 'vendor/**', '!vendor/ok.js'],
+    'docs': ['**/secret.md']
+}
+
+FILES = [
+    'app.log', 'keep.log', 'build/out.js', 'src/build/out.js', 'docs/a/b/draft1.md', 'docs/draft.md', 'docs/final.md',
+    'tmp', 'src/tmp/x.js', '#literal', 'abc.txt', 'ac.txt', 'a/c.txt', 'xz.js', 'zz.js',
+    'src/generated/a.js', 'src/generated/keep.js', 'src/app.min.js', 'src/local.js', 'src/sub/local.js',
+    'src/lib/debug.log', 'src/lib/vendor/x.js', 'src/lib/vendor/ok.js', 'src/lib/vendor/deep/y.js',
+    'docs/secret.md', 'docs/x/secret.md', 'secret.md', 'src/main.py'
+]
+
+def make_tree(root):
+    for rel_path in FILES:
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('')
+    for rel_dir, lines in GITIGNORES.items():
+        with open(os.path.join(root, rel_dir, '.gitignore'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+def git_ignored(root, paths):
+    """Return the paths that git check-ignore reports as ignored."""
+    subprocess.run(['git', 'init', '-q', root], check=True)
+    result = subprocess.run(['git', 'check-ignore', '--stdin'], cwd=root, input='\n'.join(paths),
+                            capture_output=True, text=True)
+    assert result.returncode in (0, 1), result.stderr
+    return set(result.stdout.split())
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='needs git')
+def test_matches_git_check_ignore(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+    matcher = IgnoreMatcher(root, default_patterns=[])
+    expected = git_ignored(root, FILES)
+    assert {path for path in FILES if matcher.excluded(path)} == expected
+
+def test_scan_directory_skips_ignored_files(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+    matcher = IgnoreMatcher(root, default_patterns=[])
+    scanned = {os.path.relpath(path, root).replace(os.sep, '/') for path in scan_directory(root, matcher)}
+    scanned_names = {path for path in FILES if path.endswith(('.js', '.py'))}
+    assert scanned == {path for path in scanned_names if not matcher.excluded(path)}
+
+def test_default_patterns_apply_first(tmp_path):
+    root = str(tmp_path)
+    with open(os.path.join(root, '.gitignore'), 'w') as f:
+        f.write('!node_modules/\n')
+    matcher = IgnoreMatcher(root)
+    assert not matcher.excluded('node_modules', is_dir=True)
+    assert matcher.excluded('sub/__pycache__/x.py')
+
+def test_size_budgets(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    for name, size in [('data.json', 300 * 1024), ('big.js', 1024 * 1024), ('small.js', 10)]:
+        with open(os.path.join(root, name), 'w') as f:
+            f.write(' ' * size)
+
+    def scanned():
+        return {os.path.basename(path) for path in scan_directory(root)}
+
+    assert scanned() == {'data.json', 'small.js'}
+    monkeypatch.setitem(visualizer.FILE_SIZE_BUDGETS, '.json', 256 * 1024)
+    monkeypatch.setitem(visualizer.FILE_SIZE_BUDGETS, 'default', 2 * 1024 * 1024)
+    assert scanned() == {'big.js', 'small.js'}
@@ -0,0 +1,90 @@
+import os
+import shutil
+
+from visualizer import IncrementalGraph, build_graph, scan_directory
+
+PROJECT = {
+    'src/index.js': "import App from './App'\nimport { api } from './lib/api'\n",
+    'src/App.jsx': "import Button from './components/Button'\nconst u = require('./utils')\n",
+    'src/components/Button.jsx': "import '../styles'\n",
+    'src/lib/api.ts': "import { get } from '@/lib/http'\n",
+    'src/lib/http.ts': '',
+    'pkg/__init__.py': '',
+    'pkg/core.py': 'from . import helpers\nfrom .models import User\n',
+    'pkg/helpers.py': 'import os\n',
+    'main.py': 'import pkg.core\n'
+}
+
+def write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+def remove(root, rel_path):
+    path = os.path.join(root, rel_path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+    return path
+
+def edge_set(graph):
+    return {(edge['from'], edge['to']) for edge in graph['edges']}
+
+def node_set(graph):
+    return {node['id'] for node in graph['nodes']}
+
+def assert_matches_full_build(root, incremental):
+    expected = build_graph(scan_directory(root), root)
+    assert node_set(incremental.graph) == node_set(expected)
+    # The same edges in the same order, so both serialize identically
+    assert incremental.graph['edges'] == expected['edges']
+
+def apply_patch(graph, patch):
+    """Apply a patch of apply_changes to the node and edge sets of a graph."""
+    nodes, edges = graph
+    nodes = (nodes - set(patch['removed_nodes'])) | {node['id'] for node in patch['added_nodes']}
+    edges = (edges - {(edge['from'], edge['to']) for edge in patch['removed_edges']}) \
+        | {(edge['from'], edge['to']) for edge in patch['added_edges']}
+    return nodes, edges
+
+def test_changes_match_full_build(tmp_path):
+    root = str(tmp_path)
+    for rel_path, content in PROJECT.items():
+        write(root, rel_path, content)
+    incremental = IncrementalGraph(root, {'mode': 'imports'})
+    assert_matches_full_build(root, incremental)
+    client = (node_set(incremental.graph), edge_set(incremental.graph))
+
+    steps = [
+        # New files that existing imports now resolve to
+        lambda: [write(root, 'src/utils.js', ''), write(root, 'src/styles.css', ''), write(root, 'pkg/models.py', '')],
+        # Changed imports
+        lambda: [write(root, 'src/index.js', "import './lib/http'\n"),
+                 write(root, 'pkg/helpers.py', 'from .core import x\n')],
+        # A removed file, and an import that now resolves to an index file
+        lambda: [remove(root, 'src/lib/http.ts'), write(root, 'src/lib/http/index.ts', "import { api } from '../api'\n")],
+        # A removed directory
+        lambda: [remove(root, 'src/components')],
+        # A new directory with files
+        lambda: [write(root, 'src/components/Button.jsx', "import App from '../App'\n"), os.path.join(root, 'src/components')]
+    ]
+    for step in steps:
+        patch = incremental.apply_changes(step())
+        assert 'reset' not in patch
+        assert_matches_full_build(root, incremental)
+        client = apply_patch(client, patch)
+        assert client == (node_set(incremental.graph), edge_set(incremental.graph))
+
+def test_gitignore_change_resets(tmp_path):
+    root = str(tmp_path)
+    for rel_path, content in PROJECT.items():
+        write(root, rel_path, content)
+    incremental = IncrementalGraph(root, {'mode': 'imports'})
+    version = incremental.version
+    assert incremental.apply_changes([write(root, '.gitignore', 'pkg/\n')]) == {'reset': True}
+    assert incremental.version > version
+    assert not any(node.startswith('pkg/') for node in node_set(incremental.graph))
+    assert_matches_full_build(root, incremental)
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from visualizer import looks_generated, parse_js_dependencies, scan_js_imports
+
+@pytest.mark.parametrize('source, expected', [
+    ("import a from './a'", ['./a']),
+    ("import {x,\n y} from \"../b\";", ['../b']),
+    ("import './c.css'", ['./c.css']),
+    ("import type { T } from './t'", ['./t']),
+    ("export * from './f'; export { g } from './g'", ['./f', './g']),
+    ("const x = require( './d' )", ['./d']),
+    ("await import('./e')", ['./e']),
+    ("import a from 'react'", ['react']),
+    # Imports inside comments, strings and templates
+    ("// import a from './no'\nimport b from './b'", ['./b']),
+    ("/* import './no' */ import './c'", ['./c']),
+    ("/* a */ /* import './no' */", []),
+    ("const s = \"import './no'\"", []),
+    ("const s = 'it\\'s import \"./no\"'; import './c'", ['./c']),
+    ("const t = `${a} import './no'`; import './c'", ['./c']),
+    ("const t = `line\nimport './no'\n`", []),
+    # Regular expression literals, including quotes and slashes in classes
+    ("const r = /from '.\\/no'/; import g from './g'", ['./g']),
+    ("f(/[/\"]/g); import h from './h'", ['./h']),
+    ("x = a ? /'/ : /\"/; import './i'", ['./i']),
+    # Regular expressions after keywords and other operators
+    ("return /\"/.test(s); import i from './i'", ['./i']),
+    ("function f(s){return/'/.test(s)}import i from './i'", ['./i']),
+    ("var a=function(s){return/\"/.test(s)},b=require(\"./b\")", ['./b']),
+    ("if (typeof /'/ === x) {} import './i'", ['./i']),
+    ("switch (x) { case /'/.source: } import './i'", ['./i']),
+    ("for (const m of /'/g.exec(s)) {} void /\"/; import './i'", ['./i']),
+    ("function* g() { yield /'/; } async () => { await /'/ }; import './i'", ['./i']),
+    ("throw /'/; delete /'/.x; import './i'", ['./i']),
+    ("x => /'/.test(x); a < /\"/.source; import './i'", ['./i']),
+    ("x = a + /'/.source; import './i'", ['./i']),
+    ("x = -/'/.source; import './i'", ['./i']),
+    # A regular expression that starts a line
+    ("x = a\n/'/.test(b); import './i'", ['./i']),
+    # Division is not a regular expression
+    ("let y = a / b; import h from './h' // c / d", ['./h']),
+    ("let y = (a) / 2 / (b); import './h'", ['./h']),
+    ("a++ / 2 / b; x[0] / 2 / y; import './h'", ['./h']),
+    ("a-- / 2 / b; c = a++ / 2 / b; import './h'", ['./h']),
+    ("returns / 2 / x; obj.return / 2 / y; import './h'", ['./h']),
+    ("`t` / 2 / y; import './h'", ['./h']),
+    # Template substitutions are code
+    ("const m = `${require('./a')}`", ['./a']),
+    ("html`<a>${await import('./a')}</a>${x}`; import './b'", ['./a', './b']),
+    ("`${a ? `${require('./a')}` : {x: 1}}` + require('./b')", ['./a', './b']),
+    ("`${ {a: '}'} }; import './no'`; import './c'", ['./c']),
+    ("`a ${'`'} import './no' ${ {b: /}/} } b`; import './c'", ['./c']),
+    ("`$x {import './no'} $${require('./a')}`", ['./a']),
+    ("`${require('./a')", ['./a']),
+    # Keywords that are only part of other names
+    ("a.import('./no'); x.from './no'; reimport('./no'); $require('./no')", []),
+    ("const from_ = './no'; importer './no'", []),
+    # Something between the keyword and the string
+    ("import a from b + './no'", []),
+    ("require(dir + './no')", []),
+    # Unterminated tokens end the scan without errors
+    ("import './a'; const s = 'unterminated", ['./a']),
+    ("import './a'; /* unterminated", ['./a']),
+    ("import './a'; `unterminated ${x}", ['./a']),
+    ("import '", []),
+])
+def test_scan_js_imports(source, expected):
+    assert scan_js_imports(source) == expected
+
+def test_minified_code_scans_in_linear_time():
+    # Quadratic for the former 'import\s+.*?\s+from' pattern
+    line = ';'.join(f'e.import x{i}.y("s{i}"),r=/[/"]{i}/g,q=a/b/c' for i in range(20000))
+    source = "import a from './a';" + line + ";import z from './z'"
+    start = time.perf_counter()
+    assert scan_js_imports(source) == ['./a', './z']
+    assert time.perf_counter() - start < 5
+
+def test_generated_files_are_sampled():
+    minified = "import a from './a';" + 'var x=1;' * 100000 + "import z from './z'"
+    assert looks_generated(minified)
+    assert parse_js_dependencies('bundle.js', minified) == ['./a']
+
+    handwritten = "import a from './a'\n" + 'const x = 1\n' * 100000 + "import z from './z'\n"
+    assert not looks_generated(handwritten)
+    assert parse_js_dependencies('app.js', handwritten) == ['./a', './z']
+
+    marked = '// @generated by protoc\n' + "import a from './a'\n" + 'const x = 1\n' * 100000 + "import z from './z'\n"
+    assert looks_generated(marked)
+    assert parse_js_dependencies('pb.js', marked) == ['./a']
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from visualizer import (build_graph, dependency_bases, lookup_file, parse_css_dependencies, parse_html_dependencies,
+                        parse_js_dependencies, parse_python_dependencies, resolve_imports, scan_directory)
+
+def test_python_imports():
+    source = 'import a.b\nfrom . import x\nfrom ..pkg import mod\nfrom .sub import *\nfrom c import d\n'
+    assert parse_python_dependencies('p/m.py', source) == [
+        'a/b.py', './x.py', '../pkg.py', '../pkg/mod.py', './sub.py', 'c.py', 'c/d.py']
+    # Syntax errors are reported, not raised
+    assert parse_python_dependencies('p/bad.py', 'import (') == []
+
+def test_js_imports_keep_relative_and_alias_paths():
+    source = "import React from 'react'\nimport a from './a'\nimport b from '../b'\nimport c from '@/c'\n"
+    assert parse_js_dependencies('src/x.js', source) == ['./a', '../b', '@/c']
+
+def test_asset_references():
+    html = '<link href="style.css"><script src="./app.js"></script><img src="https://x/y.png"><img src="//cdn/z.png">'
+    assert parse_html_dependencies('index.html', html) == ['style.css', './app.js']
+    css = "@import 'base.css'; a { background: url('../img/bg.png') } b { background: url('data:x') }"
+    assert parse_css_dependencies('css/site.css', css) == ['base.css', '../img/bg.png']
+
+@pytest.mark.parametrize('dep, expected', [
+    ('./a', ['src/app/a']),
+    ('../lib/b', ['src/lib/b']),
+    ('@/lib/c', ['src/lib/c']),
+    ('/static/d.css', ['src/app/static/d.css']),
+    ('pkg/e.py', ['src/app/pkg/e.py', 'pkg/e.py']),
+    ('', []),
+])
+def test_dependency_bases(dep, expected):
+    assert dependency_bases(dep, 'src/app/main.js') == [os.path.normpath(path) for path in expected]
+
+def test_lookup_file():
+    file_map = dict.fromkeys(['src/a.ts', 'src/b/index.jsx', 'pkg/__init__.py', 'c.py', 'c.json'])
+    assert lookup_file('c.py', file_map) == 'c.py'
+    assert lookup_file('src/a', file_map) == 'src/a.ts'
+    assert lookup_file('src/b', file_map) == 'src/b/index.jsx'
+    assert lookup_file('pkg.py', file_map) == 'pkg/__init__.py'
+    assert lookup_file('src/missing', file_map) is None
+
+def test_resolve_imports():
+    rel_paths = ['main.py', 'pkg/__init__.py', 'pkg/core.py', 'src/index.js', 'src/lib/api.ts']
+    references = [['pkg.py', 'pkg/core.py', 'os.py'], [], ['./__init__.py', './core.py'], ['./lib/api', 'react'], ['@/index']]
+    languages = ['python', 'python', 'python', 'javascript', 'typescript']
+    parse_timings = {language: {'references': 0, 'resolve_seconds': 0.0} for language in set(languages)}
+    edges = []
+    matches = resolve_imports(rel_paths, references, languages, parse_timings, on_edge=lambda source, target: edges.append((source, target)))
+    # Imports of a file itself are dropped
+    assert matches == {(1, 0), (2, 0), (1, 2), (4, 3), (3, 4)}
+    assert edges == [('main.py', 'pkg/__init__.py'), ('main.py', 'pkg/core.py'), ('pkg/core.py', 'pkg/__init__.py'),
+                     ('src/index.js', 'src/lib/api.ts'), ('src/lib/api.ts', 'src/index.js')]
+    assert parse_timings['python']['references'] == 3
+
+def test_build_graph_reports_timings_per_language(tmp_path):
+    root = str(tmp_path)
+    for rel_path, content in [('main.py', 'import util\n'), ('util.py', ''), ('web/app.js', "import '../data.json'\n"), ('data.json', '{"a": "./web/app.js"}')]:
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+    graph = build_graph(scan_directory(root), root)
+    assert {(edge['from'], edge['to']) for edge in graph['edges']} == {('main.py', 'util.py'), ('web/app.js', 'data.json'), ('data.json', 'web/app.js')}
+    timings = graph['metadata']['parse_timings']
+    assert timings['python']['files'] == 2 and timings['python']['references'] == 1
+    assert timings['javascript']['files'] == 1 and timings['json']['files'] == 1
@@ -0,0 +1,28 @@
+from visualizer import ProgressBroadcaster
+
+def test_events_are_queued_per_subscriber():
+    broadcaster = ProgressBroadcaster(max_events=2)
+    fast, slow = broadcaster.subscribe(), broadcaster.subscribe()
+    broadcaster.publish_event({'status': 'graph_patch', 'version': 1})
+    assert broadcaster.wait(fast, timeout=0) == [broadcaster.format({'status': 'graph_patch', 'version': 1})]
+    for version in range(2, 5):
+        broadcaster.publish_event({'status': 'graph_patch', 'version': version})
+    # The slow subscriber missed events and is told to reload instead
+    assert broadcaster.wait(slow, timeout=0)[0] == broadcaster.overflow_message
+
+def test_stale_subscriber_stream_ends():
+    broadcaster = ProgressBroadcaster(stale_after=0)
+    subscription = broadcaster.subscribe()
+    broadcaster.publish_event({'status': 'graph_patch', 'version': 1})
+    assert subscription not in broadcaster.subscribers
+    # Its stream ends rather than polling on without events
+    assert broadcaster.wait(subscription, timeout=0) is None
+
+def test_progress_is_coalesced():
+    broadcaster = ProgressBroadcaster(interval=60)
+    subscription = broadcaster.subscribe('job')
+    for percentage in range(10):
+        broadcaster.publish_progress({'status': 'analyzing', 'percentage': percentage}, 'job')
+    broadcaster.publish_progress({'status': 'complete', 'percentage': 100}, 'job')
+    assert broadcaster.wait(subscription, timeout=0) == [broadcaster.format({'status': 'complete', 'percentage': 100})]
+    broadcaster.close_channel('job')
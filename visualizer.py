@@ -1,569 +1,4579 @@
 #!/usr/bin/env python3
 import os
-import sys
+import argparse
+import hashlib
+import sqlite3
 import json
 import ast
 import re
 import webbrowser
 import threading
 import time
-from flask import Flask, jsonify, send_from_directory, Response
-from flask_cors import CORS
-from queue import Queue
+import select
+import struct
+import gzip
+import ctypes
+import ctypes.util
+import gc
+import math
+import bisect
+import heapq
+import sys
+import subprocess
+import contextlib
+import mimetypes
+import cProfile
+from array import array
+from collections import deque, Counter, OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is used otherwise
+    brotli = None
 
-app = Flask(__name__, static_folder='frontend/dist', static_url_path='')
-CORS(app)
+# Optional, the force layout falls back to the clustered one. Imported on
+# first use by load_numpy, as it takes longer to import than everything else
+np = None
 
-# Store the initial path for graph generation
-INITIAL_PATH = None
+# The Flask app and the Flask names used by the routes, set by create_app so
+# that the headless analyze command never imports Flask
+app = None
+jsonify = send_from_directory = Response = request = None
+
+# (rule, options, view) of every route, registered on the app by create_app
+ROUTES = []
+
+# Continuously updated graph of the default project in --watch mode
+LIVE_GRAPH = None
+
+# Keyword arguments passed to build_graph, set from the command line
+ANALYSIS_OPTIONS = {'mode': 'imports', 'cache_dir': None, 'hash_files': False, 'jobs': 1, 'low_memory': False, 'memory_budget': None,
+                    'layout': 'clustered'}
 
 # Global progress tracking
-progress_clients = []
 current_progress = {'status': 'idle', 'message': '', 'percentage': 0}
 
+# Set to the AnalysisJob running in the current thread, whose progress update_progress reports
+progress_context = threading.local()
+
 def load_gitignore_patterns(path):
-    """Load patterns from .gitignore file."""
+    """Load the pattern lines of the .gitignore file in path."""
     gitignore_path = os.path.join(path, '.gitignore')
     patterns = []
     if os.path.exists(gitignore_path):
         try:
             with open(gitignore_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        patterns.append(line.rstrip('/'))
+                patterns = gitignore_patterns(f)
         except Exception as e:
             print(f"Error reading .gitignore: {e}")
     return patterns
 
-def scan_directory(path, ignore_patterns=None):
-    """Scan directory for files, excluding ignored patterns and filtering by allowed extensions."""
-    if ignore_patterns is None:
-        # Default patterns plus from .gitignore
-        default_patterns = ['.git', 'node_modules', '__pycache__', '.vscode', 'dist', 'build', '.husky', 'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', '.npmrc', '.yarnrc', '.prettierrc', '.eslintrc', 'prettier.config.js', 'eslint.config.js', '.prettierignore', '.editorconfig']
-        gitignore_patterns = load_gitignore_patterns(path)
-        ignore_patterns = default_patterns + gitignore_patterns
-
-    # Only allow these file extensions
-    allowed_extensions = ['.js', '.json', '.jsx', '.tsx', '.jpg', '.ts', '.py', '.c']
-
-    files = []
-    for root, dirs, files_list in os.walk(path):
-        # Remove ignored directories
-        dirs[:] = [d for d in dirs if not any(d == pattern or d.startswith(pattern + '/') for pattern in ignore_patterns)]
-
-        for file in files_list:
-            # Skip files starting with .
-            if file.startswith('.'):
-                continue
-            # Only include files with allowed extensions
-            if not any(file.endswith(ext) for ext in allowed_extensions):
+def gitignore_patterns(lines):
+    """Return the pattern lines among the lines of a .gitignore file."""
+    return [line.rstrip('\n') for line in lines if line.strip() and not line.startswith('#')]
+
+def translate_glob(pattern):
+    """Translate a .gitignore glob into a regular expression over '/'-separated paths."""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/') and (i + 2 == n or pattern[i + 2] == '/'):
+                # '**' as a whole path component matches any number of directories
+                if i + 2 == n:
+                    parts.append('.*')
+                else:
+                    parts.append('(?:.*/)?')
+                i += 3
                 continue
-            if not any(pattern in os.path.join(root, file) for pattern in ignore_patterns):
-                full_path = os.path.join(root, file)
-                # Skip binary files or very large files (except for small images)
-                if os.path.getsize(full_path) < 1024 * 1024:  # 1MB limit
-                    files.append(full_path)
+            while i + 1 < n and pattern[i + 1] == '*':
+                i += 1
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 2) != -1:
+            end = pattern.find(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars[0] == '!':
+                chars = '^' + chars[1:]
+            parts.append('[' + chars.replace('\\', '\\\\') + ']')
+            i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+def compile_ignore_rule(line):
+    """Compile one .gitignore line into (regex, negated, dir_only), or None for blank lines."""
+    # Trailing spaces are ignored unless escaped
+    line = line.rstrip()
+    if line.endswith('\\'):
+        line += ' '
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated or line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # Patterns containing a slash are relative to the .gitignore, others match at any depth
+    if '/' in line:
+        regex = translate_glob(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + translate_glob(line)
+    return re.compile(regex + r'\Z'), negated, dir_only
+
+class IgnoreRules:
+    """The compiled rules of one .gitignore, matched against paths relative to its directory."""
+
+    def __init__(self, lines):
+        self.rules = [rule for rule in map(compile_ignore_rule, lines) if rule]
+        # Without negations the last-match-wins order does not matter, so the
+        # rules collapse into one regex for any path and one for directories only
+        self.ordered = any(negated for _, negated, _ in self.rules)
+        self.any_path = self.combine([regex for regex, _, dir_only in self.rules if not dir_only])
+        self.any_dir = self.combine([regex for regex, _, dir_only in self.rules if dir_only])
+
+    @staticmethod
+    def combine(regexes):
+        return re.compile('|'.join(f'(?:{regex.pattern})' for regex in regexes)) if regexes else None
+
+    def match(self, rel_path, is_dir):
+        """Return True (ignored), False (re-included) or None (no rule matches)."""
+        if self.ordered:
+            for regex, negated, dir_only in reversed(self.rules):
+                if (is_dir or not dir_only) and regex.match(rel_path):
+                    return not negated
+            return None
+        if self.any_path is not None and self.any_path.match(rel_path):
+            return True
+        if is_dir and self.any_dir is not None and self.any_dir.match(rel_path):
+            return True
+        return None
+
+# Directories and files that are never scanned, in addition to .gitignore entries
+DEFAULT_IGNORE_PATTERNS = ['.git', 'node_modules', '__pycache__', '.vscode', 'dist', 'build', '.husky', 'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', '.npmrc', '.yarnrc', '.prettierrc', '.eslintrc', 'prettier.config.js', 'eslint.config.js', '.prettierignore', '.editorconfig']
+
+# Only allow these file extensions
+ALLOWED_EXTENSIONS = ('.js', '.json', '.jsx', '.tsx', '.jpg', '.ts', '.py', '.c')
+
+# Files of at least this many bytes are not scanned, by extension with a
+# 'default' for the others; set with --max-file-size. Files over the budget
+# are left out of the graph, while large generated files within it are only
+# sampled for references (see generated_sample)
+FILE_SIZE_BUDGETS = {'default': 1024 * 1024}
+
+class IgnoreMatcher:
+    """Decides which paths under root_path are ignored, following .gitignore semantics.
+
+    The default patterns apply first, then the .gitignore files from the root
+    down to the path's directory, each relative to its own directory; the last
+    matching rule wins and '!' rules re-include. Nested .gitignore files are
+    loaded as their directories are first looked at. Paths are relative to
+    root_path and use '/' separators.
+    """
+
+    def __init__(self, root_path, default_patterns=DEFAULT_IGNORE_PATTERNS):
+        self.root_path = os.path.abspath(root_path)
+        self.default_rules = IgnoreRules(default_patterns)
+        self.reload()
+
+    def reload(self):
+        """Forget the loaded .gitignore files so that they are read again."""
+        self.chains = {}
+        self.gitignore_files = []
+        self.excluded_dirs = {}
+
+    def relative(self, full_path):
+        """Return full_path relative to the root, '' for the root itself."""
+        rel_path = os.path.relpath(full_path, self.root_path)
+        return '' if rel_path == os.curdir else rel_path.replace(os.sep, '/')
+
+    def chain(self, rel_dir):
+        """Return the (directory, rules) pairs that apply inside rel_dir, outermost first."""
+        chain = self.chains.get(rel_dir)
+        if chain is None:
+            chain = [('', self.default_rules)] if not rel_dir else list(self.chain(rel_dir.rpartition('/')[0]))
+            patterns = self.load_patterns(rel_dir)
+            if patterns:
+                chain.append((rel_dir, IgnoreRules(patterns)))
+                self.gitignore_files.append(os.path.join(self.root_path, rel_dir, '.gitignore'))
+            self.chains[rel_dir] = chain
+        return chain
+
+    def load_patterns(self, rel_dir):
+        """Return the pattern lines of the .gitignore file in rel_dir."""
+        return load_gitignore_patterns(os.path.join(self.root_path, rel_dir))
+
+    def ignored(self, rel_path, is_dir=False):
+        """Check whether the rules of rel_path's own directory chain ignore it."""
+        rel_dir = rel_path.rpartition('/')[0]
+        for base, rules in reversed(self.chain(rel_dir)):
+            result = rules.match(rel_path[len(base) + 1:] if base else rel_path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def excluded(self, rel_path, is_dir=False):
+        """Check whether rel_path or any directory containing it is ignored."""
+        rel_dir = rel_path.rpartition('/')[0]
+        return bool(rel_dir) and self.excluded_dir(rel_dir) or self.ignored(rel_path, is_dir)
+
+    def excluded_dir(self, rel_dir):
+        """excluded() for a directory, remembered until reload()."""
+        result = self.excluded_dirs.get(rel_dir)
+        if result is None:
+            result = self.excluded_dirs[rel_dir] = self.excluded(rel_dir, True)
+        return result
+
+def is_scanned_name(name):
+    """Check whether a file name has one of the scanned extensions and is not hidden."""
+    return not name.startswith('.') and name.endswith(ALLOWED_EXTENSIONS)
+
+def within_size_budget(name, size):
+    """Check whether a file of size bytes is small enough to be scanned (see FILE_SIZE_BUDGETS)."""
+    budget = FILE_SIZE_BUDGETS.get(os.path.splitext(name)[1].lower())
+    return size < (budget if budget is not None else FILE_SIZE_BUDGETS['default'])
+
+def parse_size_budget(text):
+    """Parse a --max-file-size value, SIZE or EXT=SIZE such as .json=256KB, into (extension or 'default', bytes)."""
+    extension, _, size = text.rpartition('=')
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*', size.lower())
+    if not match or (extension and not extension.startswith('.')):
+        raise argparse.ArgumentTypeError(f"expected SIZE or .EXT=SIZE, such as 2MB or .json=256KB, not {text!r}")
+    factor = 1024 ** ' kmg'.index(match.group(2) or ' ')
+    return extension.lower() or 'default', int(float(match.group(1)) * factor)
 
-    return files
+def is_scanned_path(full_path, matcher):
+    """Check whether full_path is one of the files scan_directory(matcher.root_path) yields."""
+    rel_path = matcher.relative(full_path)
+    if not rel_path or rel_path == os.pardir or rel_path.startswith(os.pardir + '/'):
+        return False
+    if not is_scanned_name(os.path.basename(full_path)) or matcher.excluded(rel_path):
+        return False
+    # Skip binary files or files over their size budget
+    try:
+        return os.path.isfile(full_path) and within_size_budget(full_path, os.path.getsize(full_path))
+    except OSError:
+        return False
+
+def scan_directory(path, matcher=None):
+    """Yield the files under path, excluding ignored paths and filtering by allowed extensions.
+
+    Files are yielded as they are found, in os.walk order. matcher defaults to the
+    rules for path; a matcher for a parent directory scans just this subtree.
+    """
+    if matcher is None:
+        matcher = IgnoreMatcher(path)
+
+    stack = [(path, matcher.relative(path))]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        prefix = rel_dir + '/' if rel_dir else ''
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not matcher.ignored(prefix + entry.name, True):
+                                subdirs.append((entry.path, prefix + entry.name))
+                        elif is_scanned_name(entry.name) and not matcher.ignored(prefix + entry.name) and entry.is_file():
+                            # Skip files over their size budget
+                            if within_size_budget(entry.name, entry.stat().st_size):
+                                yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        # Visit subdirectories depth-first in listing order
+        stack.extend(reversed(subdirs))
+
+def relative_paths(files, root_path):
+    """Return the path of every file relative to root_path."""
+    prefix = os.path.join(root_path, '')
+    return [file_path[len(prefix):] if file_path.startswith(prefix) else os.path.relpath(file_path, root_path)
+            for file_path in files]
 
-def parse_python_dependencies(file_path):
+def read_text(file_path):
+    """Read a file as UTF-8 text."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def parse_python_dependencies(file_path, content=None):
     """Parse Python file for import dependencies."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            tree = ast.parse(content, filename=file_path)
+        if content is None:
+            content = read_text(file_path)
+        tree = ast.parse(content, filename=file_path)
 
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    # Convert module name to potential file path
+                    dep = alias.name.replace('.', '/') + '.py'
+                    dependencies.append(dep)
+            elif isinstance(node, ast.ImportFrom):
+                # Relative imports become ./ or ../ paths
+                prefix = '../' * (node.level - 1) if node.level > 1 else './' if node.level else ''
+                if node.module:
+                    base = prefix + node.module.replace('.', '/')
+                    dependencies.append(base + '.py')
+                    # "from package import module" may name a submodule
+                    for alias in node.names:
+                        if alias.name != '*':
+                            dependencies.append(base + '/' + alias.name + '.py')
+                else:
                     for alias in node.names:
-                        # Convert module name to potential file path
-                        dep = alias.name.replace('.', '/') + '.py'
-                        dependencies.append(dep)
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module:
-                        dep = node.module.replace('.', '/') + '.py'
-                        dependencies.append(dep)
+                        dependencies.append(prefix + alias.name + '.py')
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_html_dependencies(file_path):
+def parse_html_dependencies(file_path, content=None):
     """Parse HTML file for link/script/img dependencies."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-            # Match href in link tags, src in script/img tags
-            patterns = [
-                r'<link[^>]*href=["\']([^"\']+)["\']',
-                r'<script[^>]*src=["\']([^"\']+)["\']',
-                r'<img[^>]*src=["\']([^"\']+)["\']',
-                r'<source[^>]*src=["\']([^"\']+)["\']',
-                r'<iframe[^>]*src=["\']([^"\']+)["\']'
-            ]
-
-            for pattern in patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
-                        dependencies.append(match)
+        if content is None:
+            content = read_text(file_path)
+
+        # Match href in link tags, src in script/img tags
+        patterns = [
+            r'<link[^>]*href=["\']([^"\']+)["\']',
+            r'<script[^>]*src=["\']([^"\']+)["\']',
+            r'<img[^>]*src=["\']([^"\']+)["\']',
+            r'<source[^>]*src=["\']([^"\']+)["\']',
+            r'<iframe[^>]*src=["\']([^"\']+)["\']'
+        ]
+
+        for pattern in patterns:
+            matches = re.findall(pattern, content, re.IGNORECASE)
+            for match in matches:
+                if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
+                    dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_css_dependencies(file_path):
+def parse_css_dependencies(file_path, content=None):
     """Parse CSS file for @import and url() dependencies."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-            # Match @import and url()
-            patterns = [
-                r'@import\s+["\']([^"\']+)["\']',
-                r'url\(["\']?([^"\']+)["\']?\)'
-            ]
-
-            for pattern in patterns:
-                matches = re.findall(pattern, content)
-                for match in matches:
-                    if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
-                        dependencies.append(match)
+        if content is None:
+            content = read_text(file_path)
+
+        # Match @import and url()
+        patterns = [
+            r'@import\s+["\']([^"\']+)["\']',
+            r'url\(["\']?([^"\']+)["\']?\)'
+        ]
+
+        for pattern in patterns:
+            matches = re.findall(pattern, content)
+            for match in matches:
+                if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
+                    dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_json_dependencies(file_path):
+def parse_json_dependencies(file_path, content=None):
     """Parse JSON file for relative path references."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Find all quoted strings that look like relative paths
-            matches = re.findall(r'["\']((?:\./|\.\./)[^"\']+)["\']', content)
-            for match in matches:
-                dependencies.append(match)
+        if content is None:
+            content = read_text(file_path)
+        # Find all quoted strings that look like relative paths
+        matches = re.findall(r'["\']((?:\./|\.\./)[^"\']+)["\']', generated_sample(content))
+        for match in matches:
+            dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_svg_dependencies(file_path):
+def parse_svg_dependencies(file_path, content=None):
     """Parse SVG file for image href references."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Match image href in SVG
-            matches = re.findall(r'<image[^>]*href=["\']([^"\']+)["\']', content, re.IGNORECASE)
-            for match in matches:
-                if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
-                    dependencies.append(match)
+        if content is None:
+            content = read_text(file_path)
+        # Match image href in SVG
+        matches = re.findall(r'<image[^>]*href=["\']([^"\']+)["\']', content, re.IGNORECASE)
+        for match in matches:
+            if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
+                dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_md_dependencies(file_path):
+def parse_md_dependencies(file_path, content=None):
     """Parse Markdown file for image references."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Match ![alt](path) and <img src="path">
-            patterns = [
-                r'!\[.*?\]\(([^)]+)\)',
-                r'<img[^>]*src=["\']([^"\']+)["\']'
-            ]
-            for pattern in patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
-                        dependencies.append(match)
+        if content is None:
+            content = read_text(file_path)
+        # Match ![alt](path) and <img src="path">
+        patterns = [
+            r'!\[.*?\]\(([^)]+)\)',
+            r'<img[^>]*src=["\']([^"\']+)["\']'
+        ]
+        for pattern in patterns:
+            matches = re.findall(pattern, content, re.IGNORECASE)
+            for match in matches:
+                if match.startswith('./') or match.startswith('../') or (not match.startswith('http') and not match.startswith('//') and not match.startswith('data:')):
+                    dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
-def parse_general_dependencies(file_path):
+# Marks that a file was generated, looked for in its first KB
+GENERATED_MARKER_RE = re.compile(r'@generated|do not edit|auto-?generated|code generated by', re.IGNORECASE)
+# Minified or generated files are only searched this far for references
+GENERATED_SAMPLE_CHARS = 64 * 1024
+
+def looks_generated(content):
+    """Guess from its start whether content was minified or generated.
+
+    Either a generated-file marker appears in the first KB, or the lines of
+    the first 8 KB average more than 300 characters.
+    """
+    if GENERATED_MARKER_RE.search(content, 0, 1024):
+        return True
+    head = content[:8192]
+    return len(head) >= 4096 and len(head) / (head.count('\n') + 1) > 300
+
+def generated_sample(content):
+    """Return content, cut to its start if it looks minified or generated.
+
+    References in such files sit near the top, and searching the rest is slow
+    and mostly finds noise.
+    """
+    if len(content) > GENERATED_SAMPLE_CHARS and looks_generated(content):
+        return content[:GENERATED_SAMPLE_CHARS]
+    return content
+
+# The tokens of JavaScript and TypeScript that scan_js_imports looks at.
+# Comments, strings, template literals and regular expression literals are
+# matched whole so that nothing inside them is taken for an import. A '/'
+# starts a regular expression after an operator, an opening bracket, a
+# keyword such as 'return' or at the start of a line, and is a division after
+# a name, a number, a closing bracket or a postfix '++' or '--'. Templates are matched up to their end or their first
+# substitution, whose code is scanned like any other until TEMPLATE_REST_RE
+# continues the template after it. Every repetition is possessive, which
+# keeps the scan linear in the length of the code.
+JS_REGEX_LITERAL = r'/(?![/*])(?:[^/\\\n\[]++|\\.|\[(?:[^\]\\\n]++|\\.)*+\]?)*+/?'
+JS_TOKEN_RE = re.compile(r'''
+    //[^\n]*+
+  | /\*(?:[^*]++|\*(?!/))*+(?:\*/)?
+  | (?P<string>"(?:[^"\\\n]++|\\.)*+"?|'(?:[^'\\\n]++|\\.)*+'?)
+  | `(?:[^`\\$]++|\\.|\$(?!\{))*+(?:`|(?P<substitution>\$\{))?
+  | \+\+|--
+  | (?P<operator>[(,=:\[!&|?{};<>*%^~+-])\s*+''' + JS_REGEX_LITERAL + r'''
+  | \n[ \t]*+''' + JS_REGEX_LITERAL + r'''
+  | (?<![\w$.])(?:return|typeof|instanceof|case|in|of|void|yield|await|delete|throw|new|else|do)\s*+''' + JS_REGEX_LITERAL + r'''
+  | (?<![\w$.])(?P<keyword>(?:import|require)\s*+\(|import|from)(?![\w$])
+  | (?P<brace>[{}])
+''', re.VERBOSE | re.DOTALL)
+TEMPLATE_REST_RE = re.compile(r'(?:[^`\\$]++|\\.|\$(?!\{))*+(?:`|(?P<substitution>\$\{))?', re.DOTALL)
+
+def scan_js_imports(content):
+    """Return the module specifiers imported, re-exported or required by JavaScript code.
+
+    A single pass over the tokens of JS_TOKEN_RE: a string is a specifier when
+    only whitespace separates it from a preceding 'from', 'import', 'import('
+    or 'require('. Imports in template substitutions are found too.
+    """
+    specifiers = []
+    keyword_end = None
+    # Braces opened in each enclosing template substitution, innermost last
+    substitutions = []
+    pos = 0
+    while True:
+        match = JS_TOKEN_RE.search(content, pos)
+        if match is None:
+            return specifiers
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'keyword':
+            keyword_end = pos
+        elif kind == 'string':
+            string = match.group('string')
+            gap = content[keyword_end:match.start()] if keyword_end is not None else None
+            if gap is not None and (not gap or gap.isspace()) and len(string) > 1 and string[-1] == string[0]:
+                specifiers.append(string[1:-1])
+            keyword_end = None
+        elif kind == 'substitution':
+            substitutions.append(0)
+        elif substitutions and kind in ('brace', 'operator') and match.group(kind) == '{':
+            substitutions[-1] += 1
+        elif substitutions and kind == 'brace':
+            if substitutions[-1]:
+                substitutions[-1] -= 1
+            else:
+                # The end of a substitution, the template goes on
+                substitutions.pop()
+                rest = TEMPLATE_REST_RE.match(content, pos)
+                pos = rest.end()
+                if rest.group('substitution'):
+                    substitutions.append(0)
+
+def parse_general_dependencies(file_path, content=None):
     """Parse any text file for relative path references."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Find all relative paths like ./path or ../path
-            matches = re.findall(r'["\']?((?:\./|\.\./)[^"\']*?)["\']?', content)
-            for match in matches:
-                # Clean up the match (remove quotes if present)
-                path = match.strip('"\'')
-                if path and not path.startswith('http') and not path.startswith('//') and not path.startswith('data:'):
-                    dependencies.append(path)
+        if content is None:
+            content = read_text(file_path)
+        # Find all relative paths like ./path or ../path
+        matches = re.findall(r'((?:\./|\.\./)[^\s"\'`()<>]+)', generated_sample(content))
+        for match in matches:
+            # Clean up the match (remove quotes if present)
+            path = match.strip('"\'')
+            if path and not path.startswith('http') and not path.startswith('//') and not path.startswith('data:'):
+                dependencies.append(path)
     except Exception as e:
         # Silently ignore binary files or encoding errors
         pass
 
     return dependencies
 
-def parse_js_dependencies(file_path):
+def parse_js_dependencies(file_path, content=None):
     """Parse JavaScript/TypeScript file for import dependencies."""
     dependencies = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-            # Match import statements
-            import_patterns = [
-                r'import\s+.*?\s+from\s+[\'"]([^\'"]+)[\'"]',
-                r'import\s+[\'"]([^\'"]+)[\'"]',
-                r'require\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)',
-                r'import\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)'  # Dynamic imports
-            ]
-
-            for pattern in import_patterns:
-                matches = re.findall(pattern, content)
-                for match in matches:
-                    # Convert relative imports to file paths
-                    if match.startswith('./') or match.startswith('../'):
-                        dep = match
-                        if '.' not in os.path.basename(dep):
-                            dep += '.js'  # Assume .js if no extension
-                        dependencies.append(dep)
+        if content is None:
+            content = read_text(file_path)
+
+        for match in scan_js_imports(generated_sample(content)):
+            # Keep relative and @ alias imports; extensions are resolved later
+            if match.startswith('./') or match.startswith('../') or match.startswith('@/'):
+                dependencies.append(match)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
 
     return dependencies
 
+# Dependency parser and language name for each file extension. Text files with
+# other extensions fall back to parse_general_dependencies.
+DEPENDENCY_PARSERS = {
+    '.py': ('python', parse_python_dependencies),
+    '.js': ('javascript', parse_js_dependencies),
+    '.jsx': ('javascript', parse_js_dependencies),
+    '.mjs': ('javascript', parse_js_dependencies),
+    '.cjs': ('javascript', parse_js_dependencies),
+    '.ts': ('typescript', parse_js_dependencies),
+    '.tsx': ('typescript', parse_js_dependencies),
+    '.json': ('json', parse_json_dependencies),
+    '.css': ('css', parse_css_dependencies),
+    '.html': ('html', parse_html_dependencies),
+    '.htm': ('html', parse_html_dependencies),
+    '.svg': ('svg', parse_svg_dependencies),
+    '.md': ('markdown', parse_md_dependencies),
+}
+
+# Files that are never parsed for references
+BINARY_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.ico', '.webp', '.bmp'}
+
+def dependency_parser(file_path):
+    """Return (language, parser) for a file; parser is None for binary files."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext in BINARY_EXTENSIONS:
+        return 'binary', None
+    return DEPENDENCY_PARSERS.get(file_ext, ('text', parse_general_dependencies))
+
+class Subscription:
+    """One SSE client of a ProgressBroadcaster channel."""
+
+    def __init__(self, channel, max_events):
+        self.channel = channel
+        self.wakeup = threading.Event()
+        self.events = deque()
+        self.max_events = max_events
+        self.overflowed = False
+        # Set when the subscription was dropped for not reading
+        self.closed = False
+        self.progress_seq = 0
+        self.last_drained = time.monotonic()
+
+class ProgressBroadcaster:
+    """Fans progress updates and events out to SSE clients on per-job channels.
+
+    Progress updates are coalesced: a channel only keeps its latest state,
+    serialized once, and subscribers are woken at most 1 / interval times per
+    second (final states right away, a trailing update by a timer). Other
+    events, such as graph patches, are queued per subscriber up to max_events;
+    a subscriber that falls further behind gets overflow_event instead, which
+    tells it to reload. Publishing never blocks on clients: subscribers are
+    kept in an immutable tuple that is replaced when clients come and go, and
+    clients that stopped reading are dropped: their wait() returns None, which
+    ends the stream so that they reconnect and fetch everything again.
+    """
+
+    FINAL_STATUSES = ('complete', 'error', 'failed', 'cancelled')
+
+    def __init__(self, interval=0.1, max_events=256, overflow_event=None, stale_after=90):
+        self.interval = interval
+        self.max_events = max_events
+        self.overflow_message = self.format(overflow_event or {'status': 'graph_reset'})
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.subscribers = ()
+        # channel -> [seq, event, message, last_notified, timer]
+        self.channels = {}
+
+    @staticmethod
+    def format(event):
+        return f"data: {json.dumps(event)}\n\n"
+
+    def subscribe(self, channel=None):
+        subscription = Subscription(channel, self.max_events)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers = tuple(other for other in self.subscribers if other is not subscription)
+
+    def latest(self, channel=None):
+        """Return the last progress published on channel, or None."""
+        state = self.channels.get(channel)
+        return state[1] if state else None
+
+    def publish_progress(self, event, channel=None):
+        """Make event the current progress of channel, notifying subscribers subject to throttling."""
+        now = time.monotonic()
+        with self.lock:
+            state = self.channels.get(channel)
+            if state is None:
+                state = self.channels[channel] = [0, None, None, 0.0, None]
+            state[0] += 1
+            state[1] = event
+            state[2] = None
+            due = now - state[3] >= self.interval or event.get('status') in self.FINAL_STATUSES
+            if due:
+                state[3] = now
+            elif state[4] is None:
+                # Deliver the trailing update once the interval is over
+                state[4] = threading.Timer(self.interval - (now - state[3]), self.flush, args=(channel,))
+                state[4].daemon = True
+                state[4].start()
+        if due:
+            self.notify(channel)
+
+    def flush(self, channel):
+        with self.lock:
+            state = self.channels.get(channel)
+            if state is None:
+                return
+            state[3] = time.monotonic()
+            state[4] = None
+        self.notify(channel)
+
+    def publish_event(self, event, channel=None):
+        """Queue event for every subscriber of channel."""
+        message = self.format(event)
+        for subscription in self.subscribers:
+            if subscription.channel != channel:
+                continue
+            if len(subscription.events) >= subscription.max_events:
+                subscription.events.clear()
+                subscription.overflowed = True
+            else:
+                subscription.events.append(message)
+        self.notify(channel)
+
+    def notify(self, channel):
+        now = time.monotonic()
+        stale = []
+        for subscription in self.subscribers:
+            if subscription.channel == channel:
+                if now - subscription.last_drained > self.stale_after:
+                    subscription.closed = True
+                    stale.append(subscription)
+                subscription.wakeup.set()
+        for subscription in stale:
+            self.unsubscribe(subscription)
+
+    def close_channel(self, channel):
+        """Forget the progress of a channel that will not be published to again."""
+        with self.lock:
+            state = self.channels.pop(channel, None)
+        if state and state[4] is not None:
+            state[4].cancel()
+
+    def wait(self, subscription, timeout):
+        """Wait up to timeout seconds and return the messages for subscription.
+
+        Returns None once the subscription has been dropped for not reading:
+        it no longer receives events, so its stream must end.
+        """
+        subscription.wakeup.wait(timeout)
+        subscription.wakeup.clear()
+        if subscription.closed:
+            return None
+        subscription.last_drained = time.monotonic()
+
+        messages = []
+        if subscription.overflowed:
+            subscription.overflowed = False
+            messages.append(self.overflow_message)
+        while subscription.events:
+            messages.append(subscription.events.popleft())
+
+        state = self.channels.get(subscription.channel)
+        if state is not None and state[0] != subscription.progress_seq:
+            with self.lock:
+                seq, event, message = state[0], state[1], state[2]
+                if message is None:
+                    message = state[2] = self.format(event)
+            subscription.progress_seq = seq
+            messages.append(message)
+        return messages
+
+BROADCASTER = ProgressBroadcaster()
+
+def broadcast_event(event, job_id=None):
+    """Send an event to the SSE clients following job_id (None for global events)."""
+    BROADCASTER.publish_event(event, job_id)
+
+class AnalysisCancelled(Exception):
+    """Raised inside an analysis whose job has been cancelled."""
+
 def update_progress(status, message, percentage=0):
-    """Update global progress and notify all SSE clients."""
+    """Update progress and notify SSE clients.
+
+    Inside a job this is the job's progress, sent to the clients following that
+    job, and also where a cancelled job stops. Otherwise it is the global progress.
+    """
+    job = getattr(progress_context, 'job', None)
+    if job is not None:
+        if job.cancel_requested.is_set():
+            raise AnalysisCancelled(job.id)
+        job.progress = {'status': status, 'message': message, 'percentage': percentage, 'job_id': job.id, 'job_status': job.status}
+        BROADCASTER.publish_progress(job.progress, job.id)
+        return
+
     global current_progress
     current_progress = {'status': status, 'message': message, 'percentage': percentage}
+    BROADCASTER.publish_progress(current_progress)
 
-    # Send update to all SSE clients
-    for client in progress_clients[:]:  # Copy list to avoid modification during iteration
-        try:
-            client.put(f"data: {json.dumps(current_progress)}\n\n")
-        except:
-            # Remove disconnected clients
-            if client in progress_clients:
-                progress_clients.remove(client)
-
-def build_graph(files, root_path):
-    """Build graph data by searching for file references across all files."""
-    nodes = []
-    edges = []
+# Characters that never occur inside a reference term. Any term made of other
+# characters lies within a single maximal run of them, i.e. within one token.
+REFERENCE_TOKEN_RE = re.compile(r'[^\s\'"`()\[\]{}<>,;:=|&!?*^%#]+')
+REFERENCE_DELIMITERS_RE = re.compile(r'[\s\'"`()\[\]{}<>,;:=|&!?*^%#]')
 
-    update_progress('scanning', 'Scanning directory for files...', 10)
+def reference_terms(target_rel):
+    """Return the strings whose presence in a file marks a reference to target_rel."""
+    target_name = os.path.basename(target_rel)
+    target_path_no_ext = target_rel.rsplit('.', 1)[0] if '.' in target_rel else target_rel
 
-    # Sort files by relative path for better layout grouping
-    sorted_files = sorted(files, key=lambda f: os.path.relpath(f, root_path))
+    # Also include dotted versions for Python-style imports
+    target_rel_dotted = target_rel.replace('/', '.')
+    target_path_no_ext_dotted = target_path_no_ext.replace('/', '.')
 
-    # Create nodes with calculated positions
-    for index, file_path in enumerate(sorted_files):
-        rel_path = os.path.relpath(file_path, root_path)
-        file_ext = os.path.splitext(file_path)[1].lower()
+    terms = [target_name, target_rel, target_path_no_ext, target_rel_dotted, target_path_no_ext_dotted]
 
-        # Calculate position with sufficient spacing (6 per row, larger gaps)
-        row = index // 6
-        col = index % 6
-        x = col * 280  # Increased horizontal spacing
-        y = row * 180  # Increased vertical spacing
+    # Also include @ alias versions (assuming @ points to src)
+    if target_rel.startswith('src/'):
+        terms.extend([target_rel.replace('src/', '@/', 1), target_path_no_ext.replace('src/', '@/', 1)])
 
-        node = {
-            'id': rel_path,
-            'label': os.path.basename(file_path),
-            'type': file_ext,
-            'path': rel_path,
-            'position': {'x': x, 'y': y}
-        }
-        nodes.append(node)
+    return terms
 
-    update_progress('reading', 'Reading file contents...', 30)
+def relative_import_terms(target_path, source_dir):
+    """Return the relative import forms of target_path as seen from source_dir."""
+    try:
+        rel_dir = relative_directory(os.path.dirname(target_path), source_dir)
+    except ValueError:
+        # Paths on different drives, skip
+        return []
+    target_name = os.path.basename(target_path)
+    rel_import = target_name if rel_dir == os.curdir else os.path.join(rel_dir, target_name)
+    # Normalize to use forward slashes
+    rel_import = rel_import.replace(os.sep, '/')
+    # For same directory, make it ./filename
+    if not rel_import.startswith('.'):
+        rel_import = './' + rel_import
+    # Also add without extension
+    rel_import_no_ext = rel_import.rsplit('.', 1)[0] if '.' in rel_import else rel_import
+    return [rel_import, rel_import_no_ext]
 
-    # Read all file contents
-    file_contents = {}
-    for file_path in files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_contents[file_path] = f.read()
-        except Exception:
-            # Skip binary files or encoding errors
-            file_contents[file_path] = ''
+@lru_cache(maxsize=65536)
+def relative_directory(target_dir, source_dir):
+    """Cached os.path.relpath between two directories."""
+    return os.path.relpath(target_dir, source_dir)
 
-    update_progress('analyzing', 'Analyzing file relationships...', 50)
+def reference_stem(target_rel):
+    """Return the substring shared by all reference terms of target_rel.
 
-    # For each target file, search all source files for references
-    total_files = len(files)
-    for i, target_path in enumerate(files):
-        if i % 5 == 0:  # Progress every 5 files for more frequent updates
-            progress_pct = 50 + int((i / total_files) * 40)  # 50-90% range
-            update_progress('analyzing', f'Processing file {i+1}/{total_files}: {os.path.basename(target_path)}', progress_pct)
-
-        target_rel = os.path.relpath(target_path, root_path)
-        target_name = os.path.basename(target_path)
-        target_path_no_ext = target_rel.rsplit('.', 1)[0] if '.' in target_rel else target_rel
-
-        # Also include dotted versions for Python-style imports
-        target_rel_dotted = target_rel.replace('/', '.')
-        target_path_no_ext_dotted = target_path_no_ext.replace('/', '.')
-
-        # Also include @ alias versions (assuming @ points to src)
-        target_rel_at = target_rel.replace('src/', '@/', 1) if target_rel.startswith('src/') else None
-        target_path_no_ext_at = target_path_no_ext.replace('src/', '@/', 1) if target_path_no_ext.startswith('src/') else None
-
-        search_terms = [target_name, target_rel, target_path_no_ext, target_rel_dotted, target_path_no_ext_dotted]
-        if target_rel_at:
-            search_terms.extend([target_rel_at, target_path_no_ext_at])
-
-        for source_path in files:
-            if source_path != target_path:
-                source_rel = os.path.relpath(source_path, root_path)
-                content = file_contents[source_path]
-
-                # Also compute relative path from source to target
-                source_dir = os.path.dirname(source_path)
-                try:
-                    rel_import = os.path.relpath(target_path, source_dir)
-                    # Normalize to use forward slashes
-                    rel_import = rel_import.replace(os.sep, '/')
-                    # For same directory, make it ./filename
-                    if not rel_import.startswith('.'):
-                        rel_import = './' + rel_import
-                    search_terms.append(rel_import)
-                    # Also add without extension
-                    rel_import_no_ext = rel_import.rsplit('.', 1)[0] if '.' in rel_import else rel_import
-                    search_terms.append(rel_import_no_ext)
-                except ValueError:
-                    # Paths on different drives, skip
-                    pass
-
-                # Check if any reference to the target file appears in source content
-                if any(term in content for term in search_terms):
-                    edges.append({
-                        'from': source_rel,
-                        'to': target_rel
-                    })
+    Returns None when the target has to be matched against whole file contents,
+    because it has no extension or its terms contain token delimiters.
+    """
+    target_name = os.path.basename(target_rel)
+    stem = target_name.rsplit('.', 1)[0] if '.' in target_name else ''
+    if not stem or REFERENCE_DELIMITERS_RE.search(target_rel):
+        return None
+    return stem
 
-    update_progress('complete', f'Analysis complete! Found {len(nodes)} files and {len(edges)} connections.', 100)
+def build_automaton(patterns):
+    """Build an Aho-Corasick automaton matching all patterns in one pass."""
+    goto = [{}]
+    fail = [0]
+    output = [()]
+    for pattern in patterns:
+        state = 0
+        for char in pattern:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto.append({})
+                fail.append(0)
+                output.append(())
+                goto[state][char] = next_state
+            state = next_state
+        output[state] += (pattern,)
 
-    return {
-        'metadata': {
-            'project_path': root_path,
-            'project_name': os.path.basename(os.path.abspath(root_path)),
-            'generated_at': time.time(),
-            'file_count': len(nodes),
-            'connection_count': len(edges)
-        },
-        'nodes': nodes,
-        'edges': edges
-    }
+    # Breadth-first pass to link every state to its longest proper suffix state
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            output[next_state] += output[fail[next_state]]
 
-def resolve_dependency(dep, current_file, file_map):
-    """Resolve a dependency path to an actual file in the map."""
-    current_dir = os.path.dirname(current_file)
+    return goto, fail, output
 
-    if dep.startswith('./') or dep.startswith('../'):
-        # Relative import
-        full_path = os.path.normpath(os.path.join(current_dir, dep))
-
-        # Try different extensions if no extension provided
-        if '.' not in os.path.basename(full_path):
-            for ext in ['.js', '.ts', '.jsx', '.tsx', '.py', '.html', '.css']:
-                test_path = full_path + ext
-                if test_path in file_map:
-                    return test_path
+def automaton_matches(automaton, text):
+    """Return the set of automaton patterns occurring in text."""
+    goto, fail, output = automaton
+    found = set()
+    state = 0
+    for char in text:
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        if output[state]:
+            found.update(output[state])
+    return found
+
+class MemoryBudgetExceeded(MemoryError):
+    """Raised when an analysis grows beyond its memory budget."""
+
+def peak_rss_mb(children=False):
+    """Return the peak resident set size of this process (or of its finished children) in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def current_rss_mb():
+    """Return the current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def enforce_memory_budget(memory_budget, cache=None, *memos):
+    """Raise MemoryBudgetExceeded if the process uses more than memory_budget MB.
+
+    Pending cache writes and the given memo dicts are dropped first, as they are
+    the only state that can be given up without changing the result.
+    """
+    if memory_budget is None:
+        return
+    rss = current_rss_mb()
+    if rss is None or rss <= memory_budget:
+        return
+    if cache:
+        cache.flush()
+    for memo in memos:
+        memo.clear()
+    gc.collect()
+    rss = current_rss_mb()
+    if rss > memory_budget:
+        raise MemoryBudgetExceeded(f'Analysis uses {rss:.0f} MB, more than the memory budget of {memory_budget} MB')
+
+# Bump when extraction output changes so that stale cache entries are ignored
+EXTRACTOR_VERSION = 4
+
+def default_cache_dir():
+    """Return the per-user directory holding analysis caches."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'codebase-visualizer')
+
+def read_hashed(file_path):
+    """Read a file, returning its UTF-8 text ('' if unreadable) and content hash."""
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return '', None
+    file_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+    try:
+        return data.decode('utf-8'), file_hash
+    except UnicodeDecodeError:
+        return '', file_hash
+
+class ReferenceCache:
+    """SQLite store of the extracted references of one project's files.
+
+    Entries are keyed by relative path and extraction mode, and stay valid while
+    the file's mtime_ns and size (and, when hashing, its content hash) match.
+    Each entry also keeps the files its references resolved to, which can be
+    reused as long as the set of scanned files is the same as last time.
+    Without preload, entries are queried one at a time instead of being loaded
+    into memory up front.
+    """
+
+    def __init__(self, cache_dir, root_path, mode, preload=True):
+        os.makedirs(cache_dir, exist_ok=True)
+        project_key = hashlib.sha1(os.path.abspath(root_path).encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f'{project_key}.sqlite3')
+        self.mode = mode
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS file_references (
+            path TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            hash TEXT,
+            refs TEXT NOT NULL,
+            targets TEXT,
+            PRIMARY KEY (path, mode)
+        )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS file_sets (
+            mode TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL
+        )''')
+
+        if preload:
+            rows = self.conn.execute(
+                'SELECT path, mtime_ns, size, hash, refs, targets FROM file_references WHERE mode = ? AND version = ?',
+                (mode, EXTRACTOR_VERSION))
+            self.entries = {row[0]: row[1:] for row in rows}
         else:
-            if full_path in file_map:
-                return full_path
-    elif dep.startswith('@/'):
-        # @ alias (commonly points to src directory)
-        rel_dep = dep[2:]  # Remove @/
-        # Assume @ points to src directory
-        src_path = os.path.join('src', rel_dep)
-        full_path = os.path.normpath(src_path)
-
-        # Try different extensions if no extension provided
-        if '.' not in os.path.basename(full_path):
-            for ext in ['.js', '.ts', '.jsx', '.tsx', '.py', '.html', '.css']:
-                test_path = full_path + ext
-                if test_path in file_map:
-                    return test_path
+            self.entries = None
+        row = self.conn.execute('SELECT fingerprint FROM file_sets WHERE mode = ? AND version = ?',
+                                (mode, EXTRACTOR_VERSION)).fetchone()
+        self.fingerprint = row[0] if row else None
+
+        self.updates = {}
+        self.changed = set()
+        self.targets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def entry(self, rel_path):
+        """Return the (mtime_ns, size, hash, refs, targets) row of a file, or None."""
+        if self.entries is not None:
+            return self.entries.get(rel_path)
+        return self.conn.execute(
+            'SELECT mtime_ns, size, hash, refs, targets FROM file_references WHERE path = ? AND mode = ? AND version = ?',
+            (rel_path, self.mode, EXTRACTOR_VERSION)).fetchone()
+
+    def lookup(self, rel_path, mtime_ns, size, file_hash=None):
+        """Return the cached references of a file, or None if it changed."""
+        entry = self.entry(rel_path)
+        if entry is None or entry[1] != size:
+            return None
+        if file_hash is None:
+            if entry[0] != mtime_ns:
+                return None
+        elif entry[2] != file_hash:
+            return None
+        elif entry[0] != mtime_ns:
+            # Touched but unchanged: keep the references, refresh the key
+            self.updates[rel_path] = (mtime_ns, size, file_hash, entry[3])
+            self.targets[rel_path] = entry[4]
+        self.hits += 1
+        return json.loads(entry[3])
+
+    def cached_hash(self, rel_path, size):
+        """Return the content hash stored for a file of this size, if any."""
+        entry = self.entry(rel_path)
+        return entry[2] if entry and entry[1] == size else None
+
+    def record(self, rel_path, mtime_ns, size, file_hash, refs):
+        """Queue freshly extracted references for writing."""
+        self.updates[rel_path] = (mtime_ns, size, file_hash, json.dumps(refs))
+        self.changed.add(rel_path)
+        self.misses += 1
+
+    def begin_resolution(self, rel_paths):
+        """Note the current file set; cached targets are only valid if it is unchanged."""
+        self.current_fingerprint = hashlib.sha1('\0'.join(sorted(rel_paths)).encode('utf-8')).hexdigest()
+
+    def cached_targets(self, rel_path):
+        """Return the resolved targets of an unchanged file, or None."""
+        if self.fingerprint != self.current_fingerprint or rel_path in self.changed:
+            return None
+        entry = self.entry(rel_path)
+        return json.loads(entry[4]) if entry and entry[4] is not None else None
+
+    def record_targets(self, rel_path, targets):
+        """Queue the resolved targets of a file for writing."""
+        self.targets[rel_path] = json.dumps(targets)
+
+    def flush(self):
+        """Write the queued entries now, to keep memory use down during long runs."""
+        with self.conn:
+            self.write_updates()
+
+    def write_updates(self):
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO file_references VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(path, self.mode, EXTRACTOR_VERSION, mtime_ns, size, file_hash, refs, self.targets.pop(path, None))
+             for path, (mtime_ns, size, file_hash, refs) in self.updates.items()])
+        self.updates = {}
+
+    def save(self, rel_paths):
+        """Write queued entries and drop those of files that no longer exist."""
+        current = set(rel_paths)
+        if self.entries is not None:
+            known = self.entries
         else:
-            if full_path in file_map:
-                return full_path
-    elif dep.startswith('/'):
-        # Absolute path (from HTML base)
-        rel_dep = dep[1:]
-        full_path = os.path.normpath(os.path.join(current_dir, rel_dep))
-        if full_path in file_map:
-            return full_path
+            known = [row[0] for row in self.conn.execute('SELECT path FROM file_references WHERE mode = ?', (self.mode,))]
+        removed = [(path, self.mode) for path in known if path not in current]
+        fingerprint_changed = bool(self.targets)
+        with self.conn:
+            self.write_updates()
+            self.conn.executemany(
+                'UPDATE file_references SET targets = ? WHERE path = ? AND mode = ?',
+                [(targets, path, self.mode) for path, targets in self.targets.items()])
+            self.conn.executemany('DELETE FROM file_references WHERE path = ? AND mode = ?', removed)
+            if fingerprint_changed:
+                self.conn.execute('INSERT OR REPLACE INTO file_sets VALUES (?, ?, ?)',
+                                  (self.mode, EXTRACTOR_VERSION, self.current_fingerprint))
 
-    return None
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'path': self.path}
 
-@app.route('/api/graph')
-def get_graph():
-    path = sys.argv[1] if len(sys.argv) > 1 else '.'
-    abs_path = os.path.abspath(path)
+    def close(self):
+        self.conn.close()
 
-    if not os.path.exists(abs_path):
-        return jsonify({'error': 'Directory not found'}), 404
+class BlobCache:
+    """Extracted references by git blob SHA, shared by all revisions and projects.
 
-    files = scan_directory(abs_path)
-    graph = build_graph(files, abs_path)
+    A blob's references only depend on its content and on the parser for its
+    file name, so entries are keyed by blob, language and mode. Without a
+    cache_dir, entries are only kept in memory for the lifetime of the object.
+    """
 
-    print(f"Generated graph with {len(graph['nodes'])} nodes and {len(graph['edges'])} edges")
+    def __init__(self, cache_dir, mode='imports'):
+        self.mode = mode
+        self.memory = {}
+        self.conn = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.path = os.path.join(cache_dir, 'blobs.sqlite3')
+            self.conn = sqlite3.connect(self.path, timeout=30)
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS blob_references (
+                blob TEXT NOT NULL,
+                language TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                refs TEXT NOT NULL,
+                PRIMARY KEY (blob, language, mode)
+            )''')
+        else:
+            self.path = None
+        self.updates = []
+        self.hits = 0
+        self.misses = 0
+        # Import resolutions by the sorted paths of the files they were made for, see resolve_imports
+        self.resolutions = {}
 
-    # Save graph data to JSON file in frontend public directory
-    graph_path = 'frontend/dist/graph.json'
-    with open(graph_path, 'w') as f:
-        json.dump(graph, f, indent=2)
-    print(f"Graph data saved to {graph_path}")
+    def lookup(self, blob, language):
+        """Return the cached references of a blob parsed as language, or None."""
+        refs = self.memory.get((blob, language))
+        if refs is None and self.conn is not None:
+            row = self.conn.execute(
+                'SELECT refs FROM blob_references WHERE blob = ? AND language = ? AND mode = ? AND version = ?',
+                (blob, language, self.mode, EXTRACTOR_VERSION)).fetchone()
+            if row:
+                refs = self.memory[(blob, language)] = json.loads(row[0])
+        if refs is not None:
+            self.hits += 1
+        return refs
 
-    return jsonify(graph)
+    def record(self, blob, language, refs):
+        """Keep freshly extracted references, written by save()."""
+        self.memory[(blob, language)] = refs
+        self.updates.append((blob, language, self.mode, EXTRACTOR_VERSION, json.dumps(refs)))
+        self.misses += 1
 
-@app.route('/')
-def index():
-    return send_from_directory('frontend/dist', 'index.html')
+    def save(self):
+        if self.conn is not None and self.updates:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO blob_references VALUES (?, ?, ?, ?, ?)', self.updates)
+        self.updates = []
 
-@app.route('/<path:path>')
-def static_files(path):
-    return send_from_directory('frontend/dist', path)
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'path': self.path}
 
-@app.route('/graph.json')
-def serve_graph_json():
-    """Serve the generated graph JSON file, regenerating if needed."""
-    # Regenerate graph for the specified directory
-    abs_path = os.path.abspath(INITIAL_PATH)
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
 
-    if not os.path.exists(abs_path):
-        return jsonify({'error': 'Directory not found'}), 404
+# Distance between neighbouring nodes, and between directory blocks
+NODE_SPACING_X = 280
+NODE_SPACING_Y = 180
+CLUSTER_GAP = 160
 
-    files = scan_directory(abs_path)
-    graph = build_graph(files, abs_path)
+LAYOUT_ALGORITHMS = ('grid', 'clustered', 'force')
 
-    # Save updated graph data
-    with open('graph.json', 'w') as f:
-        json.dump(graph, f, indent=2)
+def grid_position(index):
+    """Position of grid slot index, 6 nodes per row."""
+    return index % 6 * NODE_SPACING_X, index // 6 * NODE_SPACING_Y
 
-    try:
-        return send_from_directory('.', 'graph.json', mimetype='application/json')
-    except FileNotFoundError:
-        return jsonify({'error': 'Graph generation failed'}), 500
+def make_node(rel_path, index):
+    """Create the graph node of a file, placed at grid slot index."""
+    x, y = grid_position(index)
+    return {
+        'id': rel_path,
+        'label': os.path.basename(rel_path),
+        'type': os.path.splitext(rel_path)[1].lower(),
+        'path': rel_path,
+        'position': {'x': x, 'y': y}
+    }
 
-@app.route('/api/reindex')
-def reindex_codebase():
-    """Force regeneration of the graph for the current project."""
-    graph_path = 'frontend/dist/graph.json'
+def clustered_layout(node_ids):
+    """Return an (x, y) position per node, grouping files by directory.
 
-    if not os.path.exists(graph_path):
-        return jsonify({'error': 'No existing graph to reindex'}), 404
+    Every directory becomes a block holding a grid of its own files, about as
+    tall as it is wide, followed by the blocks of its subdirectories. Blocks
+    are packed row by row so that the whole canvas stays roughly square.
+    """
+    tree = {'files': [], 'dirs': {}}
+    for index, node_id in enumerate(node_ids):
+        directory = tree
+        for part in os.path.dirname(node_id).split(os.sep):
+            if part:
+                directory = directory['dirs'].setdefault(part, {'files': [], 'dirs': {}})
+        directory['files'].append(index)
 
-    # Load existing metadata to get the path
-    try:
-        with open(graph_path, 'r') as f:
-            existing_data = json.load(f)
-            project_path = existing_data.get('metadata', {}).get('project_path', '.')
-    except:
-        return jsonify({'error': 'Could not read existing graph'}), 500
+    def place(directory):
+        # Blocks of (width, height, [(index, x, y)]) relative to their corner
+        blocks = []
+        files = directory['files']
+        if files:
+            columns = math.ceil(math.sqrt(len(files) * NODE_SPACING_Y / NODE_SPACING_X))
+            rows = math.ceil(len(files) / columns)
+            blocks.append((columns * NODE_SPACING_X, rows * NODE_SPACING_Y,
+                           [(index, n % columns * NODE_SPACING_X, n // columns * NODE_SPACING_Y)
+                            for n, index in enumerate(files)]))
+        for name in sorted(directory['dirs']):
+            blocks.append(place(directory['dirs'][name]))
+        if len(blocks) == 1:
+            return blocks[0]
 
-    abs_path = os.path.abspath(project_path)
+        row_limit = max(max(block[0] for block in blocks), math.sqrt(sum(block[0] * block[1] for block in blocks)))
+        placements = []
+        x = y = width = row_height = 0
+        for block_width, block_height, block_placements in blocks:
+            if x and x + block_width > row_limit:
+                x, y, row_height = 0, y + row_height + CLUSTER_GAP, 0
+            placements.extend((index, x + bx, y + by) for index, bx, by in block_placements)
+            width = max(width, x + block_width)
+            row_height = max(row_height, block_height)
+            x += block_width + CLUSTER_GAP
+        return width, y + row_height, placements
 
-    if not os.path.exists(abs_path):
-        return jsonify({'error': 'Project directory no longer exists'}), 404
+    positions = [(0, 0)] * len(node_ids)
+    if node_ids:
+        for index, x, y in place(tree)[2]:
+            positions[index] = (x, y)
+    return positions
 
-    files = scan_directory(abs_path)
-    graph = build_graph(files, abs_path)
+def barnes_hut_repulsion(positions, k):
+    """Approximate the repulsion k^2/d between all pairs of positions.
 
-    # Save updated graph data
-    with open(graph_path, 'w') as f:
-        json.dump(graph, f, indent=2)
+    positions is an (n, 2) array. Space is divided into a quadtree of grid
+    levels, the finest of which has cells of about k across (but not more
+    cells than nodes). At each level, every cell is pushed away by the centres
+    of mass of the cells that are children of its parent cell's neighbours but
+    not neighbours of itself, so that distant groups of nodes act as a single
+    mass and the cost depends on the number of cells rather than of nodes.
+    Nodes in neighbouring cells of the finest level repel each other
+    individually.
+    """
+    count = len(positions)
+    low = positions.min(axis=0)
+    span = max(float((positions.max(axis=0) - low).max()), 1.0)
+    levels = max(2, min(math.floor(math.log2(max(span / k, 1))), math.ceil(math.log(count, 4))))
+    # Cell coordinates at the finest level
+    finest = ((positions - low) * ((1 << levels) / span)).astype(np.int64)
+    np.minimum(finest, (1 << levels) - 1, out=finest)
+    force = np.zeros_like(positions)
 
-    return jsonify({'status': 'reindexed', 'nodes': len(graph['nodes']), 'edges': len(graph['edges'])})
+    for level in range(2, levels + 1):
+        size = 1 << level
+        cells = finest >> (levels - level)
+        flat = cells[:, 0] * size + cells[:, 1]
+        mass = np.bincount(flat, minlength=size * size).astype(positions.dtype)
+        centre_x = np.bincount(flat, positions[:, 0], minlength=size * size) / np.maximum(mass, 1)
+        centre_y = np.bincount(flat, positions[:, 1], minlength=size * size) / np.maximum(mass, 1)
 
-@app.route('/api/open-in-vscode/<path:file_path>')
-def open_in_vscode(file_path):
-    """Open a file in VS Code editor."""
-    try:
-        # Get the project path from the graph.json file (same one the frontend uses)
-        graph_path = 'graph.json'
-        if os.path.exists(graph_path):
-            with open(graph_path, 'r') as f:
-                existing_data = json.load(f)
-                project_path = existing_data.get('metadata', {}).get('project_path', '.')
-        else:
-            # Fallback to INITIAL_PATH if graph.json doesn't exist
-            global INITIAL_PATH
-            project_path = INITIAL_PATH if INITIAL_PATH else '.'
+        # Far field, cell to cell. Grids are padded by two empty cells on each
+        # side, and which cells interact only depends on a cell's parity.
+        padded = [np.pad(grid.reshape(size, size), 2) for grid in (mass, centre_x, centre_y)]
+        cell_force = np.zeros((2, size, size))
+        for parity_x in (0, 1):
+            for parity_y in (0, 1):
+                _, receiver_x, receiver_y = (grid[2 + parity_x:size + 2:2, 2 + parity_y:size + 2:2] for grid in padded)
+                for dx in range(-2 - parity_x, 4 - parity_x):
+                    for dy in range(-2 - parity_y, 4 - parity_y):
+                        if abs(dx) <= 1 and abs(dy) <= 1:
+                            continue
+                        start_x, start_y = 2 + parity_x + dx, 2 + parity_y + dy
+                        source_mass, source_x, source_y = (grid[start_x:start_x + size:2, start_y:start_y + size:2]
+                                                           for grid in padded)
+                        delta_x = receiver_x - source_x
+                        delta_y = receiver_y - source_y
+                        weight = source_mass / (delta_x * delta_x + delta_y * delta_y + 1.0)
+                        cell_force[0, parity_x::2, parity_y::2] += delta_x * weight
+                        cell_force[1, parity_x::2, parity_y::2] += delta_y * weight
+        force[:, 0] += cell_force[0, cells[:, 0], cells[:, 1]]
+        force[:, 1] += cell_force[1, cells[:, 0], cells[:, 1]]
 
-        abs_project_path = os.path.abspath(project_path)
-        abs_file_path = os.path.join(abs_project_path, file_path)
+    # Near field, node to node within neighbouring cells
+    order = np.argsort(flat, kind='stable')
+    counts = mass.astype(np.int64)
+    starts = np.cumsum(counts) - counts
+    for dx in (-1, 0, 1):
+        column = cells[:, 0] + dx
+        for dy in (-1, 0, 1):
+            row = cells[:, 1] + dy
+            valid = (column >= 0) & (column < size) & (row >= 0) & (row < size)
+            target = np.where(valid, column * size + row, 0)
+            pair_counts = np.where(valid, counts[target], 0)
+            # One (node, other) pair for every node of the target cell
+            nodes = np.repeat(np.arange(count), pair_counts)
+            rank = np.arange(len(nodes)) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+            others = order[starts[target[nodes]] + rank]
+            delta = positions[nodes] - positions[others]
+            weight = (others != nodes) / (np.einsum('ij,ij->i', delta, delta) + 1.0)
+            force[:, 0] += np.bincount(nodes, delta[:, 0] * weight, minlength=count)
+            force[:, 1] += np.bincount(nodes, delta[:, 1] * weight, minlength=count)
+    return force * (k * k)
 
-        # Verify the file exists and is within the project directory
-        if not os.path.exists(abs_file_path):
-            return jsonify({'error': f'File not found: {abs_file_path}'}), 404
+def force_layout(node_ids, edges, iterations=30):
+    """Return an (x, y) position per node from a force-directed layout.
 
-        # Ensure the file is within the project directory for security
-        if not os.path.abspath(abs_file_path).startswith(os.path.abspath(abs_project_path)):
-            return jsonify({'error': 'Access denied'}), 403
+    Fruchterman-Reingold, starting from clustered_layout: nodes repel each other
+    (see barnes_hut_repulsion) while edges pull their ends together, and every
+    step moves a node at most as far as the current temperature, which cools
+    down to zero. Requires NumPy.
+    """
+    count = len(node_ids)
+    positions = np.array(clustered_layout(node_ids), dtype=np.float64).reshape(count, 2)
+    if count < 2:
+        return [tuple(position) for position in positions.tolist()]
 
-        # Open the file in VS Code
-        import subprocess
-        result = subprocess.run(['code', abs_file_path], capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"VS Code command failed: {result.stderr}")
-            return jsonify({'error': f'Failed to open in VS Code: {result.stderr}'}), 500
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    pairs = np.array([(index[edge['from']], index[edge['to']]) for edge in edges
+                      if edge['from'] in index and edge['to'] in index and edge['from'] != edge['to']],
+                     dtype=np.int64).reshape(-1, 2)
+    # Ideal distance between connected nodes
+    k = NODE_SPACING_X
+    start_temperature = 2 * k
+    # Spread nodes sharing a position, deterministically
+    positions += np.random.default_rng(0).uniform(-1, 1, positions.shape)
 
-        return jsonify({'status': 'opened', 'file': file_path, 'project_path': project_path})
+    for step in range(iterations):
+        displacement = barnes_hut_repulsion(positions, k)
+        if len(pairs):
+            delta = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+            pull = delta * (np.sqrt(np.einsum('ij,ij->i', delta, delta)) / k)[:, None]
+            for axis in (0, 1):
+                displacement[:, axis] -= np.bincount(pairs[:, 0], pull[:, axis], minlength=count)
+                displacement[:, axis] += np.bincount(pairs[:, 1], pull[:, axis], minlength=count)
+        # Weak pull towards the centre keeps unconnected parts from drifting away
+        displacement -= (positions - positions.mean(axis=0)) * 0.01
 
-    except Exception as e:
-        print(f"Error opening file in VS Code: {e}")
-        return jsonify({'error': str(e)}), 500
+        temperature = start_temperature * (1 - step / iterations)
+        length = np.sqrt(np.einsum('ij,ij->i', displacement, displacement))
+        positions += displacement * (np.minimum(length, temperature) / np.maximum(length, 1e-9))[:, None]
 
-@app.route('/progress')
-def progress():
-    """Server-Sent Events endpoint for progress updates."""
-    def generate():
-        q = Queue()
-        progress_clients.append(q)
+    positions -= positions.min(axis=0)
+    return [tuple(position) for position in positions.tolist()]
 
+def load_numpy():
+    """Import NumPy as np if it is not yet imported, returning whether it is installed."""
+    global np
+    if np is None:
         try:
-            # Send current progress immediately
-            yield f"data: {json.dumps(current_progress)}\n\n"
+            import numpy as np
+        except ImportError:
+            return False
+    return True
 
-            # Keep connection alive and send updates
-            while True:
-                try:
-                    message = q.get(timeout=30)  # 30 second timeout
-                    yield message
-                except:
-                    # Send keepalive
-                    yield f"data: {json.dumps({'status': 'keepalive'})}\n\n"
-        except GeneratorExit:
-            # Client disconnected
-            if q in progress_clients:
-                progress_clients.remove(q)
+def layout_positions(node_ids, edges, algorithm='clustered'):
+    """Return an (x, y) position per node and the algorithm actually used."""
+    if algorithm == 'grid':
+        return [grid_position(index) for index in range(len(node_ids))], algorithm
+    if algorithm == 'force':
+        if load_numpy():
+            return force_layout(node_ids, edges), algorithm
+        print("NumPy is not installed, using the clustered layout instead of the force layout")
+    return clustered_layout(node_ids), 'clustered'
 
-    return Response(generate(), mimetype='text/event-stream')
+def layout_graph(graph, algorithm='clustered'):
+    """Place the nodes of graph with a layout algorithm (see LAYOUT_ALGORITHMS)."""
+    nodes = graph['nodes']
+    start = time.perf_counter()
+    positions, algorithm = layout_positions([node['id'] for node in nodes], graph['edges'], algorithm)
+    for node, (x, y) in zip(nodes, positions):
+        node['position'] = {'x': round(x), 'y': round(y)}
+    graph['metadata']['layout'] = algorithm
+    print(f"  layout: {algorithm} in {time.perf_counter() - start:.2f}s")
+    return graph
 
-def open_browser():
-    time.sleep(1)  # Wait for server to start
-    webbrowser.open('http://localhost:5000')
+def children_cpu_seconds():
+    """Return the CPU time used by finished child processes, such as parsing workers, or None."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
 
-if __name__ == '__main__':
-    print("Starting Codebase Visualizer...")
+class AnalysisMetrics:
+    """Where the time of one analysis goes, and what it read and parsed.
+
+    Each phase gets the wall-clock time and the CPU time of the analyzing
+    thread spent in it. A phase started inside another, like the scan that
+    runs while files are extracted, is only counted for itself. Parsing in
+    worker processes shows as worker CPU time.
+    """
+
+    # Number of files listed in slowest_files
+    SLOWEST_FILES = 10
+
+    def __init__(self):
+        # Phase name -> [wall seconds, CPU seconds]
+        self.phases = {}
+        # [name, wall start, CPU start, wall of nested phases, CPU of nested phases] of running phases
+        self.stack = []
+        self.files_parsed = 0
+        self.bytes_read = 0
+        # Heap of the (seconds, rel_path) of the slowest parsed files
+        self.slowest = []
+        self.file_count = 0
+        self.cache_hits = self.cache_misses = 0
+        self.started = time.perf_counter()
+        self.started_cpu = time.thread_time()
+        self.started_children = children_cpu_seconds()
+
+    def start(self, name):
+        self.stack.append([name, time.perf_counter(), time.thread_time(), 0.0, 0.0])
+
+    def stop(self):
+        name, wall_start, cpu_start, nested_wall, nested_cpu = self.stack.pop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        totals = self.phases.setdefault(name, [0.0, 0.0])
+        totals[0] += wall - nested_wall
+        totals[1] += cpu - nested_cpu
+        if self.stack:
+            self.stack[-1][3] += wall
+            self.stack[-1][4] += cpu
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Count the time of the with block as phase name."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def timed(self, name, iterable):
+        """Iterate over iterable, counting the time taken to produce each item as phase name."""
+        iterator = iter(iterable)
+        while True:
+            self.start(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            yield item
+
+    def record_file(self, rel_path, seconds, size):
+        """Note that a file of size bytes was read and parsed in seconds."""
+        self.files_parsed += 1
+        self.bytes_read += size
+        entry = (seconds, rel_path)
+        if len(self.slowest) < self.SLOWEST_FILES:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def summary(self):
+        """Return the metrics as stored in the graph metadata."""
+        wall = time.perf_counter() - self.started
+        children = children_cpu_seconds()
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'phases': {name: {'wall_seconds': round(phase_wall, 4), 'cpu_seconds': round(phase_cpu, 4)}
+                       for name, (phase_wall, phase_cpu) in self.phases.items()},
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(time.thread_time() - self.started_cpu, 4),
+            'worker_cpu_seconds': round(children - self.started_children, 4) if children is not None else None,
+            'files_per_second': round(self.file_count / wall, 1) if wall else None,
+            'files_parsed': self.files_parsed,
+            'bytes_read': self.bytes_read,
+            'files': self.file_count,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': round(self.cache_hits / lookups, 4) if lookups else None,
+            'slowest_files': [{'path': rel_path, 'seconds': round(seconds, 4)} for seconds, rel_path in sorted(self.slowest, reverse=True)]
+        }
+
+    def describe(self):
+        """Return a one-line summary of the phases for the console."""
+        phases = ', '.join(f'{name} {wall:.2f}s' for name, (wall, _) in self.phases.items())
+        wall = time.perf_counter() - self.started
+        slowest = max(self.slowest, default=None)
+        return (f"phases: {phases}; {self.file_count / wall if wall else 0:.0f} files/s, {self.bytes_read / 1e6:.1f} MB parsed"
+                + (f", slowest {slowest[1]} ({slowest[0]:.3f}s)" if slowest else ''))
+
+class MetricsRegistry:
+    """Totals over all analyses of this process, exposed in the Prometheus text format on /metrics."""
+
+    PREFIX = 'codebase_visualizer'
+    # Upper bounds of the analysis duration histogram buckets, in seconds
+    DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.outcomes = {'complete': 0, 'failed': 0, 'cancelled': 0}
+        self.duration_counts = [0] * (len(self.DURATION_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.phase_wall = {}
+        self.phase_cpu = {}
+        self.totals = {'files': 0, 'files_parsed': 0, 'bytes_read': 0, 'cache_hits': 0, 'cache_misses': 0}
+        self.last = None
+        self.last_finished = None
+
+    @contextlib.contextmanager
+    def track(self, metrics):
+        """Count the with block as an analysis, adding metrics to the totals once it is complete."""
+        with self.lock:
+            self.running += 1
+        outcome = 'failed'
+        try:
+            yield
+            outcome = 'complete'
+        except AnalysisCancelled:
+            outcome = 'cancelled'
+            raise
+        finally:
+            summary = metrics.summary()
+            with self.lock:
+                self.running -= 1
+                self.outcomes[outcome] += 1
+                self.last_finished = time.time()
+                if outcome == 'complete':
+                    self.record(summary)
+
+    def record(self, summary):
+        self.duration_counts[bisect.bisect_left(self.DURATION_BUCKETS, summary['wall_seconds'])] += 1
+        self.duration_sum += summary['wall_seconds']
+        for name, phase in summary['phases'].items():
+            self.phase_wall[name] = self.phase_wall.get(name, 0.0) + phase['wall_seconds']
+            self.phase_cpu[name] = self.phase_cpu.get(name, 0.0) + phase['cpu_seconds']
+        for name in ('files', 'files_parsed', 'bytes_read', 'cache_hits', 'cache_misses'):
+            self.totals[name] += summary[name]
+        self.last = summary
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f'# HELP {self.PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {self.PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f'{self.PREFIX}_{name}{{{label_text}}} {value}' if label_text else f'{self.PREFIX}_{name} {value}')
+
+        with self.lock:
+            metric('analyses_total', 'counter', 'Analyses finished, by outcome.',
+                   [({'outcome': outcome}, count) for outcome, count in self.outcomes.items()])
+            metric('analyses_running', 'gauge', 'Analyses in progress.', [({}, self.running)])
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.DURATION_BUCKETS + ('+Inf',), self.duration_counts):
+                cumulative += count
+                buckets.append(({'le': bound}, cumulative))
+            lines.append(f'# HELP {self.PREFIX}_analysis_duration_seconds Wall-clock time of complete analyses.')
+            lines.append(f'# TYPE {self.PREFIX}_analysis_duration_seconds histogram')
+            for labels, value in buckets:
+                lines.append(f'{self.PREFIX}_analysis_duration_seconds_bucket{{le="{labels["le"]}"}} {value}')
+            lines.append(f'{self.PREFIX}_analysis_duration_seconds_sum {round(self.duration_sum, 4)}')
+            lines.append(f'{self.PREFIX}_analysis_duration_seconds_count {cumulative}')
+            metric('analysis_phase_seconds_total', 'counter', 'Wall-clock time of complete analyses spent in each phase.',
+                   [({'phase': name}, round(seconds, 4)) for name, seconds in sorted(self.phase_wall.items())])
+            metric('analysis_phase_cpu_seconds_total', 'counter', 'CPU time of the analyzing threads spent in each phase.',
+                   [({'phase': name}, round(seconds, 4)) for name, seconds in sorted(self.phase_cpu.items())])
+            metric('analysis_files_total', 'counter', 'Files in the graphs of complete analyses.', [({}, self.totals['files'])])
+            metric('analysis_files_parsed_total', 'counter', 'Files read and parsed, not taken from the cache.',
+                   [({}, self.totals['files_parsed'])])
+            metric('analysis_read_bytes_total', 'counter', 'Bytes of the files read and parsed.', [({}, self.totals['bytes_read'])])
+            metric('analysis_cache_hits_total', 'counter', 'Files whose references came from the analysis cache.',
+                   [({}, self.totals['cache_hits'])])
+            metric('analysis_cache_misses_total', 'counter', 'Files looked up in the analysis cache and parsed again.',
+                   [({}, self.totals['cache_misses'])])
+            if self.last is not None:
+                metric('last_analysis_duration_seconds', 'gauge', 'Wall-clock time of the last complete analysis.',
+                       [({}, self.last['wall_seconds'])])
+                metric('last_analysis_files_per_second', 'gauge', 'Files per second of the last complete analysis.',
+                       [({}, self.last['files_per_second'] or 0)])
+            if self.last_finished is not None:
+                metric('last_analysis_finished_timestamp_seconds', 'gauge', 'When the last analysis finished, in Unix time.',
+                       [({}, round(self.last_finished, 3))])
+
+        jobs = JOB_SCHEDULER.all_jobs()
+        metric('jobs', 'gauge', 'Analysis jobs known to the scheduler, by status.',
+               [({'status': status}, sum(1 for job in jobs if job.status == status))
+                for status in ('queued', 'running', 'complete', 'failed', 'cancelled')])
+        metric('progress_subscribers', 'gauge', 'Clients following /progress.', [({}, len(BROADCASTER.subscribers))])
+        stores = PROJECTS.all()
+        metric('projects', 'gauge', 'Projects known to the server, by where their graph is.',
+               [({'state': state}, sum(1 for store in stores if store.state() == state))
+                for state in ('memory', 'disk', 'live', 'building', 'none')])
+        metric('project_graph_memory_bytes', 'gauge', 'Estimated memory held by the graphs of all projects.',
+               [({}, sum(store.memory_bytes() for store in stores))])
+        if resource:
+            metric('resident_memory_bytes', 'gauge', 'Resident memory of the server process.', [({}, int(current_rss_mb() * 1024 * 1024))])
+            metric('peak_resident_memory_bytes', 'gauge', 'Peak resident memory of the server process.', [({}, int(peak_rss_mb() * 1024 * 1024))])
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+
+@contextlib.contextmanager
+def profiling(path):
+    """Profile the block with cProfile and write the stats to path, or do nothing without a path.
+
+    Only one profiler can be active at a time, so this is for single analyses
+    such as those asked for with --profile, not for every analysis of the server.
+    """
+    if not path:
+        yield
+        return
+    with cProfile.Profile() as profiler:
+        yield
+    profiler.dump_stats(path)
+    print(f"  profile written to {path}")
+
+def build_graph(files, root_path, mode='imports', cache_dir=None, hash_files=False, jobs=1, low_memory=False, memory_budget=None,
+                layout='clustered', on_file=None, on_edge=None):
+    """Build graph data from the dependencies between files.
+
+    In 'imports' mode each file is run through the parser for its language and
+    every import is resolved against the scanned files. The 'heuristic' mode
+    instead links any file whose content mentions another file's name or path.
+    With a cache_dir, extraction results of unchanged files are reused from the
+    on-disk cache (see ReferenceCache). Files are parsed by jobs worker processes.
+    files may be a generator such as scan_directory, which is consumed while
+    the files found so far are already being parsed.
+
+    With low_memory, or a memory_budget in MB, cache entries are read on demand
+    and 'heuristic' mode keeps only the matches of each file instead of its
+    tokens (see stream_match_references). Exceeding the budget raises
+    MemoryBudgetExceeded. The peak RSS is reported in the metadata either way.
 
-    # Set the initial path for graph generation
-    INITIAL_PATH = sys.argv[1] if len(sys.argv) > 1 else '.'
+    Nodes are placed by the layout algorithm (see layout_graph).
+
+    on_file(rel_path) is called for each file as it is found and
+    on_edge(source_rel, target_rel) for each connection as it is resolved,
+    long before the graph is returned (see analyze_command).
+
+    The time of each phase and what was read and parsed are recorded in the
+    metadata under 'metrics' (see AnalysisMetrics) and added to METRICS.
+    """
+    low_memory = low_memory or memory_budget is not None
+    nodes = []
+    edges = []
+    metrics = AnalysisMetrics()
+
+    with METRICS.track(metrics):
+        update_progress('scanning', 'Scanning directory for files...', 10)
+        files = metrics.timed('scan', files)
+
+        with metrics.phase('cache'):
+            cache = ReferenceCache(cache_dir, root_path, mode, preload=not low_memory) if cache_dir else None
+        try:
+            if low_memory and mode == 'heuristic':
+                with metrics.phase('extract'):
+                    files, rel_paths, matches, parse_timings = stream_match_references(
+                        files, root_path, cache, hash_files, memory_budget, on_file, on_edge, metrics)
+            else:
+                with metrics.phase('extract'):
+                    files, rel_paths, references, languages, parse_timings = extract_references(
+                        files, root_path, mode, cache, hash_files, jobs, memory_budget, on_file, metrics)
+                with metrics.phase('resolve'):
+                    if mode == 'heuristic':
+                        matches = match_references(files, rel_paths, references, on_edge)
+                    else:
+                        matches = resolve_imports(rel_paths, references, languages, parse_timings, cache, on_edge)
+                # Only the matches are needed from here on
+                references = None
+
+            with metrics.phase('cache'):
+                if cache:
+                    cache.save(rel_paths)
+        finally:
+            if cache:
+                cache.close()
+        cache_stats = cache.stats() if cache else None
+
+        with metrics.phase('graph'):
+            # Sort files by relative path for better layout grouping
+            for index, rel_path in enumerate(sorted(rel_paths)):
+                nodes.append(make_node(rel_path, index))
+
+            # Emit edges target-major, by relative path as IncrementalGraph.snapshot does
+            for target_index, source_index in sorted(matches, key=lambda match: (rel_paths[match[0]], rel_paths[match[1]])):
+                edges.append({
+                    'from': rel_paths[source_index],
+                    'to': rel_paths[target_index]
+                })
+
+        for language, stats in sorted(parse_timings.items()):
+            print(f"  {language}: {stats['files']} files ({stats['cached']} cached), {stats['references']} references, "
+                  f"parsed in {stats['parse_seconds']:.3f}s, resolved in {stats['resolve_seconds']:.3f}s")
+        if cache_stats:
+            print(f"  cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        memory = {'peak_rss_mb': round(peak_rss_mb(), 1) if resource else None,
+                  'worker_peak_rss_mb': round(peak_rss_mb(children=True), 1) if resource and jobs > 1 else None,
+                  'low_memory': low_memory, 'budget_mb': memory_budget}
+        if memory['peak_rss_mb'] is not None:
+            print(f"  peak memory: {memory['peak_rss_mb']:.0f} MB")
+
+        graph = {
+            'metadata': {
+                'project_path': root_path,
+                'project_name': os.path.basename(os.path.abspath(root_path)),
+                'generated_at': time.time(),
+                'file_count': len(nodes),
+                'connection_count': len(edges),
+                'mode': mode,
+                'parse_timings': parse_timings,
+                'cache': cache_stats,
+                'memory': memory
+            },
+            'nodes': nodes,
+            'edges': edges
+        }
+
+        update_progress('analyzing', 'Laying out graph...', 95)
+        with metrics.phase('layout'):
+            layout_graph(graph, layout)
+
+        metrics.file_count = len(nodes)
+        if cache_stats:
+            metrics.cache_hits, metrics.cache_misses = cache_stats['hits'], cache_stats['misses']
+        graph['metadata']['metrics'] = metrics.summary()
+        print(f"  {metrics.describe()}")
+
+    update_progress('complete', f'Analysis complete! Found {len(nodes)} files and {len(edges)} connections.', 100)
+    return graph
+
+def extract_file_references(file_path, mode, content=None):
+    """Extract the references of a single file.
+
+    In 'imports' mode these are the dependencies found by the file's parser, in
+    'heuristic' mode the distinct tokens of its content.
+    """
+    language, parser = dependency_parser(file_path)
+    if mode == 'heuristic':
+        try:
+            if content is None:
+                content = read_text(file_path)
+        except Exception:
+            # Skip binary files or encoding errors
+            content = ''
+        return sorted(set(REFERENCE_TOKEN_RE.findall(content)))
+    return parser(file_path, content) if parser else []
+
+def extract_chunk(tasks, mode, hash_files):
+    """Extract the references of a batch of (file_path, cached_hash) tasks.
+
+    Runs in worker processes. With hash_files, a file whose content hash equals
+    cached_hash is not parsed again and gets None references. Returns a
+    (references, file_hash, seconds, size) tuple per task, size being the
+    bytes parsed.
+    """
+    results = []
+    for file_path, cached_hash in tasks:
+        start = time.perf_counter()
+        content, file_hash = read_hashed(file_path) if hash_files else (None, None)
+        if file_hash is not None and file_hash == cached_hash:
+            refs = None
+            size = 0
+        else:
+            refs = extract_file_references(file_path, mode, content)
+            try:
+                size = len(content) if content is not None else os.path.getsize(file_path)
+            except OSError:
+                size = 0
+        results.append((refs, file_hash, time.perf_counter() - start, size))
+    return results
+
+# Files per batch handed to extract_chunk
+EXTRACT_BATCH_SIZE = 64
+
+def extract_references(files, root_path, mode='imports', cache=None, hash_files=False, jobs=1, memory_budget=None, on_file=None, metrics=None):
+    """Extract the references of every file, reusing cached results when possible.
+
+    files may be a generator such as scan_directory: files missing from the cache
+    are parsed in batches as soon as a batch is complete, by a pool of jobs worker
+    processes when jobs > 1, so parsing overlaps with scanning. Returns the list
+    of files, their relative paths, references and languages, and per-language
+    timings; the results do not depend on jobs. The memory budget (in MB, see
+    enforce_memory_budget) is checked after every batch. on_file is called with
+    the relative path of every file as soon as the scan finds it. Parsed files
+    are recorded in metrics, an AnalysisMetrics.
+    """
+    update_progress('reading', 'Reading file contents...', 30)
+
+    file_list = []
+    rel_paths = []
+    references = []
+    languages = []
+    parse_timings = {}
+    file_stats = []
+    prefix = os.path.join(root_path, '')
+    batch = []
+    in_flight = deque()
+    done = 0
+    total_files = None  # Unknown until the scan is complete
+
+    def merge(batch, results):
+        nonlocal done
+        for index, (refs, file_hash, seconds, size) in zip(batch, results):
+            stats = parse_timings[languages[index]]
+            if metrics and refs is not None:
+                metrics.record_file(rel_paths[index], seconds, size)
+            if cache:
+                mtime_ns, size, _ = file_stats[index]
+                if refs is None:
+                    refs = cache.lookup(rel_paths[index], mtime_ns, size, file_hash)
+                    stats['cached'] += 1
+                else:
+                    cache.record(rel_paths[index], mtime_ns, size, file_hash, refs)
+            references[index] = refs
+            stats['parse_seconds'] += seconds
+        done += len(batch)
+        enforce_memory_budget(memory_budget, cache)
+        name = os.path.basename(file_list[batch[-1]])
+        if total_files is None:
+            update_progress('analyzing', f'Processed {done}/{len(file_list)} files found so far: {name}', 30)
+        else:
+            progress_pct = 30 + int((done / total_files) * 40)  # 30-70% range
+            update_progress('analyzing', f'Processed {done}/{total_files} files: {name}', progress_pct)
 
-    print(f"Configured to analyze path: {INITIAL_PATH}")
-    print("Open http://localhost:5000 in your browser")
+    def submit(batch):
+        tasks = [(file_list[index], file_stats[index][2] if cache else None) for index in batch]
+        if pool is None:
+            merge(batch, extract_chunk(tasks, mode, hash_files))
+            return
+        in_flight.append((batch, pool.submit(extract_chunk, tasks, mode, hash_files)))
+        # Merge finished batches in submission order, waiting once enough are queued
+        while in_flight and (in_flight[0][1].done() or len(in_flight) > jobs * 4):
+            finished, future = in_flight.popleft()
+            merge(finished, future.result())
+
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for file_path in files:
+            index = len(file_list)
+            file_list.append(file_path)
+            rel_paths.append(file_path[len(prefix):] if file_path.startswith(prefix) else os.path.relpath(file_path, root_path))
+            if on_file:
+                on_file(rel_paths[index])
+            references.append(None)
+            language = dependency_parser(file_path)[0]
+            stats = parse_timings.setdefault(language, {'files': 0, 'cached': 0, 'references': 0, 'parse_seconds': 0.0, 'resolve_seconds': 0.0})
+            stats['files'] += 1
+            languages.append(language)
+
+            if cache:
+                try:
+                    stat = os.stat(file_path)
+                    mtime_ns, size = stat.st_mtime_ns, stat.st_size
+                except OSError:
+                    mtime_ns, size = 0, -1
+                # Hashing means reading the file, which is left to the workers
+                cached_hash = cache.cached_hash(rel_paths[index], size) if hash_files else None
+                file_stats.append((mtime_ns, size, cached_hash))
+                if not hash_files:
+                    references[index] = cache.lookup(rel_paths[index], mtime_ns, size)
+                    if references[index] is not None:
+                        stats['cached'] += 1
+                        done += 1
+                        continue
+
+            batch.append(index)
+            if len(batch) == EXTRACT_BATCH_SIZE:
+                submit(batch)
+                batch = []
+
+        total_files = len(file_list)
+        if batch:
+            submit(batch)
+        while in_flight:
+            finished, future = in_flight.popleft()
+            merge(finished, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    for stats in parse_timings.values():
+        stats['parse_seconds'] = round(stats['parse_seconds'], 4)
+
+    return file_list, rel_paths, references, languages, parse_timings
+
+def resolve_imports(rel_paths, references, languages, parse_timings, cache=None, on_edge=None, resolved=None):
+    """Resolve every file's extracted imports to scanned files.
+
+    Returns the set of (target_index, source_index) pairs and adds the resolve
+    time to parse_timings. on_edge is called with the relative paths of the
+    source and target of each pair as it is resolved. resolved may hold the
+    resolutions of an earlier call for the same set of files, and is updated.
+    """
+    update_progress('analyzing', 'Resolving imports...', 70)
+
+    file_map = {rel_path: index for index, rel_path in enumerate(rel_paths)}
+    matches = set()
+    # Files in one directory tend to share imports; resolve each pair once
+    if resolved is None:
+        resolved = {}
+    if cache:
+        cache.begin_resolution(rel_paths)
+
+    for source_index, source_rel in enumerate(rel_paths):
+        stats = parse_timings[languages[source_index]]
+        start = time.perf_counter()
+
+        targets = cache.cached_targets(source_rel) if cache else None
+        if targets is None:
+            targets = set()
+            source_dir = os.path.dirname(source_rel)
+            for dep in references[source_index]:
+                key = (source_dir, dep)
+                target_rel = resolved.get(key, False)
+                if target_rel is False:
+                    target_rel = resolved[key] = resolve_dependency(dep, source_rel, file_map)
+                if target_rel is not None and target_rel != source_rel:
+                    targets.add(target_rel)
+            targets = sorted(targets)
+            if cache:
+                cache.record_targets(source_rel, targets)
+
+        for target_rel in targets:
+            matches.add((file_map[target_rel], source_index))
+            if on_edge:
+                on_edge(source_rel, target_rel)
+        stats['references'] += len(targets)
+        stats['resolve_seconds'] += time.perf_counter() - start
+
+    for stats in parse_timings.values():
+        stats['resolve_seconds'] = round(stats['resolve_seconds'], 4)
+
+    return matches
+
+class ReferenceIndex:
+    """Reference terms of all targets, for matching sources in 'heuristic' mode.
+
+    Every reference term of a target contains its extension-less basename (the
+    "stem"), so one automaton over all stems finds the candidate targets of a
+    source in a single pass over its tokens.
+
+    As in the original search over all pairs, the relative import terms of a
+    target stay in use once seen: a source also matches the relative forms of
+    the target from the directories of all sources before it. Sources must
+    therefore be matched in order.
+    """
+
+    def __init__(self, files, rel_paths):
+        self.targets_by_stem = {}
+        self.irregular_targets = []
+        for target_index, target_path in enumerate(files):
+            target_rel = rel_paths[target_index]
+            stem = reference_stem(target_rel)
+            if stem is None:
+                self.irregular_targets.append((target_index, target_path, reference_terms(target_rel)))
+            else:
+                self.targets_by_stem.setdefault(stem, []).append((target_index, target_path, reference_terms(target_rel)))
+        self.automaton = build_automaton(self.targets_by_stem)
+        self.token_stems = {}
+
+        # The first two sources of every directory, as tuples of path parts
+        self.dir_sources = {}
+        self.file_dirs = []
+        for source_index, rel_path in enumerate(rel_paths):
+            parts = tuple(rel_path.split(os.sep)[:-1])
+            sources = self.dir_sources.setdefault(parts, [])
+            if len(sources) < 2:
+                sources.append(source_index)
+            self.file_dirs.append(parts)
+
+        # For a directory and a depth, the first sources of the two subdirectories
+        # whose directories at that depth below it come first
+        first_by_child = {}
+        for parts, sources in self.dir_sources.items():
+            for depth in range(len(parts)):
+                children = first_by_child.setdefault((parts[:depth], len(parts) - depth), {})
+                if sources[0] < children.get(parts[depth], len(files)):
+                    children[parts[depth]] = sources[0]
+        self.descendant_sources = {key: heapq.nsmallest(2, ((index, child) for child, index in children.items()))
+                                   for key, children in first_by_child.items()}
+
+        self.source_dirs = sorted((index, os.path.dirname(files[index]))
+                                  for sources in self.dir_sources.values() for index in sources)
+        self.irregular_terms = {}
+
+    def first_relative_source(self, target_index, target_dir, rel_dir):
+        """Return the index of the first source from whose directory target_dir is rel_dir.
+
+        rel_dir is the directory part of a relative import term, such as '.',
+        './lib' or '../lib'. Returns None when no source's directory gives it.
+        """
+        if rel_dir.startswith('./'):
+            if rel_dir[2:3] in ('', '.'):
+                return None
+            parts = tuple(rel_dir[2:].split('/'))
+        elif rel_dir == '.':
+            parts = ()
+        else:
+            parts = tuple(rel_dir.split('/'))
+        ups = 0
+        while ups < len(parts) and parts[ups] == '..':
+            ups += 1
+        down = parts[ups:]
+        if len(down) > len(target_dir) or target_dir[len(target_dir) - len(down):] != down:
+            return None
+        if any(part in ('', '.', '..') for part in down):
+            return None
+
+        common = target_dir[:len(target_dir) - len(down)]
+        if not ups:
+            return next((index for index in self.dir_sources.get(common, ()) if index != target_index), None)
+        # Directories below the common one, but not on the way down to the target
+        for index, child in self.descendant_sources.get((common, ups), ()):
+            if not down or child != down[0]:
+                return index
+        return None
+
+    def seen_relative_term(self, source_index, target_index, stem, tokens):
+        """Return whether the tokens contain a relative import term of the target from the directory of a source up to source_index."""
+        target_dir = self.file_dirs[target_index]
+        if stem.startswith('.'):
+            # From its own directory, such a target is written without './', as the stem itself
+            first = self.first_relative_source(target_index, target_dir, '.')
+            if first is not None and first <= source_index:
+                return True
+        needle = '/' + stem
+        for token in tokens:
+            end = token.find(needle)
+            while end != -1:
+                # Relative import terms start with a dot
+                start = token.find('.', 0, end)
+                while start != -1:
+                    first = self.first_relative_source(target_index, target_dir, token[start:end])
+                    if first is not None and first <= source_index:
+                        return True
+                    start = token.find('.', start + 1, end)
+                end = token.find(needle, end + 1)
+        return False
+
+    def match(self, source_index, source_path, tokens):
+        """Return the indices of the targets that the source with these distinct tokens references."""
+        source_dir = os.path.dirname(source_path)
+        matches = set()
+
+        # Group the file's distinct tokens by the stems they contain
+        stem_tokens = {}
+        for token in tokens:
+            stems = self.token_stems.get(token)
+            if stems is None:
+                stems = self.token_stems[token] = tuple(automaton_matches(self.automaton, token))
+            for stem in stems:
+                stem_tokens.setdefault(stem, []).append(token)
+
+        for stem, tokens in stem_tokens.items():
+            for target_index, target_path, terms in self.targets_by_stem[stem]:
+                if target_path == source_path:
+                    continue
+                if (any(term in token for token in tokens for term in terms) or
+                        any(term in token for token in tokens for term in relative_import_terms(target_path, source_dir)) or
+                        self.seen_relative_term(source_index, target_index, stem, tokens)):
+                    matches.add(target_index)
+
+        # Targets whose terms may span token boundaries are checked directly
+        if self.irregular_targets:
+            try:
+                content = read_text(source_path)
+            except Exception:
+                # Skip binary files or encoding errors
+                content = ''
+        for target_index, target_path, terms in self.irregular_targets:
+            if target_path == source_path:
+                continue
+            # Extend the target's terms with the directories seen since the last source
+            seen, search_terms = self.irregular_terms.get(target_index, (0, list(terms)))
+            while seen < len(self.source_dirs) and self.source_dirs[seen][0] <= source_index:
+                index, directory = self.source_dirs[seen]
+                if index != target_index:
+                    search_terms.extend(relative_import_terms(target_path, directory))
+                seen += 1
+            self.irregular_terms[target_index] = (seen, search_terms)
+            if any(term in content for term in search_terms):
+                matches.add(target_index)
+
+        return matches
+
+def match_references(files, rel_paths, references, on_edge=None):
+    """Link files by searching every file for references to the others.
+
+    A source references a target when its content contains one of the target's
+    reference terms (see reference_terms, and relative_import_terms from its
+    own directory or that of any file before it). references holds the
+    distinct tokens of each file. Returns the set of
+    (target_index, source_index) pairs, each also passed to on_edge as
+    relative paths (source, target) once found.
+    """
+    update_progress('analyzing', 'Indexing reference terms...', 70)
+    index = ReferenceIndex(files, rel_paths)
+
+    update_progress('analyzing', 'Matching file references...', 75)
+
+    # Resolve every source against the index in one pass
+    matches = set()
+    for source_index, source_path in enumerate(files):
+        targets = index.match(source_index, source_path, references[source_index])
+        matches.update((target_index, source_index) for target_index in targets)
+        if on_edge:
+            for target_index in sorted(targets):
+                on_edge(rel_paths[source_index], rel_paths[target_index])
+    return matches
+
+def stream_match_references(files, root_path, cache=None, hash_files=False, memory_budget=None, on_file=None, on_edge=None, metrics=None):
+    """Low-memory combination of extract_references and match_references.
+
+    The scan is collected first so that the reference index is complete; then
+    each file's tokens are extracted (or read from the cache), matched and
+    dropped before the next file is read, so only the matches are kept.
+    Returns the files, their relative paths, the matches and parse timings.
+    on_file, on_edge and metrics are used as in extract_references and match_references.
+    """
+    files = list(files)
+    rel_paths = relative_paths(files, root_path)
+    if on_file:
+        for rel_path in rel_paths:
+            on_file(rel_path)
+
+    update_progress('analyzing', 'Indexing reference terms...', 30)
+    index = ReferenceIndex(files, rel_paths)
+
+    matches = set()
+    parse_timings = {}
+    total_files = len(files)
+    for source_index, source_path in enumerate(files):
+        stats = parse_timings.setdefault(dependency_parser(source_path)[0], {'files': 0, 'cached': 0, 'references': 0, 'parse_seconds': 0.0, 'resolve_seconds': 0.0})
+        stats['files'] += 1
+
+        start = time.perf_counter()
+        tokens = None
+        if cache:
+            try:
+                stat = os.stat(source_path)
+                mtime_ns, size = stat.st_mtime_ns, stat.st_size
+            except OSError:
+                mtime_ns, size = 0, -1
+            content, file_hash = read_hashed(source_path) if hash_files else (None, None)
+            tokens = cache.lookup(rel_paths[source_index], mtime_ns, size, file_hash)
+            if tokens is None:
+                tokens = extract_file_references(source_path, 'heuristic', content)
+                cache.record(rel_paths[source_index], mtime_ns, size, file_hash, tokens)
+                parsed_size = size
+            else:
+                stats['cached'] += 1
+                parsed_size = None
+            content = None
+        else:
+            tokens = extract_file_references(source_path, 'heuristic')
+            try:
+                parsed_size = os.path.getsize(source_path)
+            except OSError:
+                parsed_size = 0
+        parse_end = time.perf_counter()
+        if metrics and parsed_size is not None:
+            metrics.record_file(rel_paths[source_index], parse_end - start, max(parsed_size, 0))
+
+        targets = index.match(source_index, source_path, tokens)
+        matches.update((target_index, source_index) for target_index in targets)
+        if on_edge:
+            for target_index in sorted(targets):
+                on_edge(rel_paths[source_index], rel_paths[target_index])
+        stats['references'] += len(targets)
+        stats['parse_seconds'] += parse_end - start
+        stats['resolve_seconds'] += time.perf_counter() - parse_end
+
+        if source_index % 100 == 99 or source_index == total_files - 1:
+            progress_pct = 30 + int(((source_index + 1) / total_files) * 45)  # 30-75% range
+            update_progress('analyzing', f'Matched {source_index + 1}/{total_files} files: {os.path.basename(source_path)}', progress_pct)
+            enforce_memory_budget(memory_budget, cache, index.token_stems)
+
+    for stats in parse_timings.values():
+        stats['parse_seconds'] = round(stats['parse_seconds'], 4)
+        stats['resolve_seconds'] = round(stats['resolve_seconds'], 4)
+
+    return files, rel_paths, matches, parse_timings
+
+# Extensions and index files tried for imports that omit them
+RESOLVE_EXTENSIONS = ['.js', '.ts', '.jsx', '.tsx', '.py', '.html', '.css', '.json']
+RESOLVE_INDEX_FILES = ['index.js', 'index.ts', 'index.jsx', 'index.tsx', '__init__.py']
+
+def lookup_file(full_path, file_map):
+    """Find full_path in file_map, trying implicit extensions and index files."""
+    if full_path in file_map:
+        return full_path
+    for ext in RESOLVE_EXTENSIONS:
+        test_path = full_path + ext
+        if test_path in file_map:
+            return test_path
+    # Directory imports resolve to their index file (Python packages to __init__.py)
+    package_path = full_path[:-3] if full_path.endswith('.py') else full_path
+    for index_file in RESOLVE_INDEX_FILES:
+        test_path = package_path + os.sep + index_file
+        if test_path in file_map:
+            return test_path
+    return None
+
+def dependency_bases(dep, current_file):
+    """Return the paths, in resolution order, that lookup_file tries for a dependency."""
+    current_dir = os.path.dirname(current_file)
+
+    if dep.startswith('./') or dep.startswith('../'):
+        # Relative import
+        return [os.path.normpath(os.path.join(current_dir, dep))]
+    elif dep.startswith('@/'):
+        # @ alias (commonly points to src directory)
+        rel_dep = dep[2:]  # Remove @/
+        # Assume @ points to src directory
+        return [os.path.normpath(os.path.join('src', rel_dep))]
+    elif dep.startswith('/'):
+        # Absolute path (from HTML base)
+        rel_dep = dep[1:]
+        return [os.path.normpath(os.path.join(current_dir, rel_dep))]
+    elif dep:
+        # Bare path (Python modules, HTML/CSS assets): next to the file, then from the root
+        return [os.path.normpath(os.path.join(current_dir, dep)), os.path.normpath(dep)]
+
+    return []
+
+def reference_keys(rel_path):
+    """Return the dependency bases that lookup_file may resolve to rel_path."""
+    keys = {rel_path}
+    for ext in RESOLVE_EXTENSIONS:
+        if rel_path.endswith(ext):
+            keys.add(rel_path[:-len(ext)])
+    dir_path, file_name = os.path.split(rel_path)
+    if file_name in RESOLVE_INDEX_FILES:
+        keys.update([dir_path, dir_path + '.py'])
+    return keys
+
+def resolve_dependency(dep, current_file, file_map):
+    """Resolve a dependency path to an actual file in the map."""
+    for base in dependency_bases(dep, current_file):
+        resolved = lookup_file(base, file_map)
+        if resolved is not None:
+            return resolved
+    return None
+
+# Binary graph format, see encode_graph
+GRAPH_MAGIC = b'CVG1'
+GRAPH_HEADER = struct.Struct('<4sIIII')
+
+def encode_graph(graph):
+    """Serialize a graph into the compact binary format served as /graph.bin.
+
+    Layout (little-endian, every section padded to 4 bytes so that the arrays
+    can be viewed as typed arrays in place):
+      header     magic 'CVG1', metadata length, node count, edge count, string table length
+      metadata   UTF-8 JSON
+      strings    node ids, UTF-8, separated by NUL bytes
+      positions  float32 x, y per node
+      edges      uint32 source index, target index per edge
+    Node labels and types are derived from the ids when decoding.
+    """
+    def padded(data):
+        return data + b'\0' * (-len(data) % 4)
+
+    nodes = graph['nodes']
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    metadata = json.dumps(graph['metadata'], separators=(',', ':')).encode('utf-8')
+    strings = '\0'.join(node['id'] for node in nodes).encode('utf-8')
+
+    positions = array('f')
+    for node in nodes:
+        positions.append(node['position']['x'])
+        positions.append(node['position']['y'])
+    edges = array('I')
+    for edge in graph['edges']:
+        edges.append(index[edge['from']])
+        edges.append(index[edge['to']])
+    if sys.byteorder != 'little':
+        positions.byteswap()
+        edges.byteswap()
+
+    header = GRAPH_HEADER.pack(GRAPH_MAGIC, len(metadata), len(nodes), len(graph['edges']), len(strings))
+    return b''.join([header, padded(metadata), padded(strings), positions.tobytes(), edges.tobytes()])
+
+def decode_graph(data):
+    """Inverse of encode_graph."""
+    magic, metadata_length, node_count, edge_count, strings_length = GRAPH_HEADER.unpack_from(data)
+    if magic != GRAPH_MAGIC:
+        raise ValueError('Not a binary graph file')
+    offset = GRAPH_HEADER.size
+    metadata = json.loads(data[offset:offset + metadata_length].decode('utf-8'))
+    offset += metadata_length + (-metadata_length % 4)
+    ids = data[offset:offset + strings_length].decode('utf-8').split('\0') if node_count else []
+    offset += strings_length + (-strings_length % 4)
+
+    positions = array('f')
+    positions.frombytes(data[offset:offset + node_count * 8])
+    offset += node_count * 8
+    edges = array('I')
+    edges.frombytes(data[offset:offset + edge_count * 8])
+    if sys.byteorder != 'little':
+        positions.byteswap()
+        edges.byteswap()
+
+    nodes = []
+    for i, node_id in enumerate(ids):
+        node = make_node(node_id, 0)
+        node['position'] = {'x': positions[2 * i], 'y': positions[2 * i + 1]}
+        nodes.append(node)
+    return {
+        'metadata': metadata,
+        'nodes': nodes,
+        'edges': [{'from': ids[edges[i]], 'to': ids[edges[i + 1]]} for i in range(0, len(edges), 2)]
+    }
+
+def load_graph_file(path):
+    """Load a graph saved as graph.json, graph.bin or the output of the analyze command."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(GRAPH_MAGIC):
+        return decode_graph(data)
+    text = data.decode('utf-8')
+    try:
+        graph = json.loads(text)
+        if isinstance(graph, dict) and 'nodes' in graph:
+            return graph
+    except json.JSONDecodeError:
+        pass
+
+    graph = {'metadata': {}, 'nodes': [], 'edges': []}
+    for line in text.splitlines():
+        if line.strip():
+            record = json.loads(line)
+            kind = record.pop('record', None)
+            if kind == 'node':
+                graph['nodes'].append(record)
+            elif kind == 'edge':
+                graph['edges'].append(record)
+            elif kind == 'summary':
+                graph['metadata'] = record
+    return graph
+
+def git_tree(repo_path, revision):
+    """Return (rel_path, blob, size) for the files of a git revision.
+
+    Only the files under repo_path are listed, relative to it, which may be a
+    subdirectory of the working tree. Raises ValueError for unknown revisions.
+    """
+    try:
+        output = subprocess.run(['git', 'ls-tree', '-r', '-z', '-l', revision], cwd=repo_path,
+                                capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise ValueError(e.stderr.decode('utf-8', 'replace').strip() or f'cannot list {revision}')
+    entries = []
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        info, _, path = entry.partition(b'\t')
+        mode, kind, blob, size = info.split()
+        # Symbolic links and submodules are not scanned either
+        if kind == b'blob' and mode != b'120000':
+            entries.append((path.decode('utf-8', 'surrogateescape'), blob.decode('ascii'), int(size)))
+    return entries
+
+def read_blobs(repo_path, blobs):
+    """Yield (blob, content) for each blob SHA in the list blobs, None for missing ones.
+
+    All blobs are read through one git cat-file --batch process, which is fed
+    by a thread while its output is read.
+    """
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def feed():
+        try:
+            for blob in blobs:
+                process.stdin.write(blob.encode('ascii') + b'\n')
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass  # Stopped reading early
+
+    threading.Thread(target=feed, daemon=True).start()
+    finished = False
+    try:
+        for blob in blobs:
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                yield blob, None
+                continue
+            content = process.stdout.read(int(header[2]))
+            process.stdout.read(1)  # Trailing newline
+            yield blob, content
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+class RevisionIgnoreMatcher(IgnoreMatcher):
+    """IgnoreMatcher for the files of a git revision, given the .gitignore patterns of its directories."""
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        super().__init__(os.curdir)
+
+    def load_patterns(self, rel_dir):
+        return self.patterns.get(rel_dir, [])
+
+def revision_graph(repo_path, revision, cache):
+    """Build the 'imports' mode graph of a git revision of repo_path without checking it out.
+
+    The files are those scan_directory would find in a checkout, following the
+    revision's own .gitignore files. They are read with git cat-file, and only
+    blobs missing from cache (a BlobCache) are read and parsed.
+    """
+    update_progress('scanning', f'Listing files of {revision}...', 10)
+    entries = git_tree(repo_path, revision)
+    ignore_files = [(os.path.dirname(path), blob) for path, blob, _ in entries if os.path.basename(path) == '.gitignore']
+    ignore_contents = dict(read_blobs(repo_path, sorted({blob for _, blob in ignore_files})))
+    matcher = RevisionIgnoreMatcher({rel_dir: gitignore_patterns((ignore_contents[blob] or b'').decode('utf-8', 'replace').splitlines())
+                                     for rel_dir, blob in ignore_files})
+    files = [(path, blob) for path, blob, size in entries
+             if is_scanned_name(os.path.basename(path)) and within_size_budget(path, size) and not matcher.excluded(path)]
+
+    rel_paths = [path for path, _ in files]
+    languages = []
+    references = []
+    parse_timings = {}
+    missing = {}
+    for index, (rel_path, blob) in enumerate(files):
+        language, parser = dependency_parser(rel_path)
+        stats = parse_timings.setdefault(language, {'files': 0, 'cached': 0, 'references': 0, 'parse_seconds': 0.0, 'resolve_seconds': 0.0})
+        stats['files'] += 1
+        refs = cache.lookup(blob, language) if parser else []
+        if refs is None:
+            missing.setdefault(blob, []).append(index)
+        elif parser:
+            stats['cached'] += 1
+        languages.append(language)
+        references.append(refs)
+
+    update_progress('analyzing', f'Parsing {len(missing)} files of {revision} not in the cache...', 30)
+    for blob, data in read_blobs(repo_path, list(missing)):
+        try:
+            content = data.decode('utf-8') if data is not None else ''
+        except UnicodeDecodeError:
+            content = ''
+        for index in missing[blob]:
+            start = time.perf_counter()
+            # The same content may be at several paths
+            refs = cache.lookup(blob, languages[index])
+            if refs is None:
+                refs = extract_file_references(rel_paths[index], 'imports', content)
+                cache.record(blob, languages[index], refs)
+            references[index] = refs
+            parse_timings[languages[index]]['parse_seconds'] += time.perf_counter() - start
+    cache.save()
+    for stats in parse_timings.values():
+        stats['parse_seconds'] = round(stats['parse_seconds'], 4)
+
+    # Revisions that only change the content of files resolve imports the same way
+    resolved = cache.resolutions.setdefault('\0'.join(sorted(rel_paths)), {})
+    matches = resolve_imports(rel_paths, references, languages, parse_timings, resolved=resolved)
+    print(f"  {revision}: {len(files)} files, {len(missing)} parsed, {len(files) - len(missing)} from the blob cache, "
+          f"{len(matches)} connections")
+    update_progress('complete', f'Analyzed {revision}: {len(files)} files and {len(matches)} connections.', 100)
+    return {
+        'metadata': {
+            'project_path': repo_path,
+            'project_name': os.path.basename(os.path.abspath(repo_path)),
+            'revision': revision,
+            'generated_at': time.time(),
+            'file_count': len(files),
+            'connection_count': len(matches),
+            'mode': 'imports',
+            'parse_timings': parse_timings
+        },
+        'nodes': [make_node(rel_path, index) for index, rel_path in enumerate(sorted(rel_paths))],
+        'edges': [{'from': rel_paths[source_index], 'to': rel_paths[target_index]} for target_index, source_index in
+                  sorted(matches, key=lambda match: (rel_paths[match[0]], rel_paths[match[1]]))]
+    }
+
+def diff_graphs(old, new):
+    """Return the nodes and edges that graph new adds to and removes from graph old."""
+    old_nodes = {node['id'] for node in old['nodes']}
+    new_nodes = {node['id'] for node in new['nodes']}
+    old_edges = {(edge['from'], edge['to']) for edge in old['edges']}
+    new_edges = {(edge['from'], edge['to']) for edge in new['edges']}
+    return {
+        'nodes': {'added': sorted(new_nodes - old_nodes), 'removed': sorted(old_nodes - new_nodes)},
+        'edges': {'added': [{'from': source, 'to': target} for source, target in sorted(new_edges - old_edges)],
+                  'removed': [{'from': source, 'to': target} for source, target in sorted(old_edges - new_edges)]}
+    }
+
+class IncrementalGraph:
+    """Dependency graph of a project that is kept up to date file by file.
+
+    Besides the graph, it remembers every file's extracted imports and which
+    dependency bases (see dependency_bases) each file probed while resolving
+    them. A changed file only has its own imports re-extracted; adding or
+    removing a file re-resolves just the files that probed one of its
+    reference_keys. The 'heuristic' mode is rebuilt from scratch instead.
+    The SearchIndex of the files is updated along.
+    """
+
+    def __init__(self, root_path, options):
+        self.root_path = os.path.abspath(root_path)
+        self.options = dict(options)
+        self.lock = threading.Lock()
+        self.matcher = IgnoreMatcher(self.root_path)
+        self.version = 0
+        self.rebuild()
+
+    def rebuild(self):
+        """Rescan and re-analyze the whole project."""
+        with self.lock:
+            self.matcher.reload()
+            files = scan_directory(self.root_path, self.matcher)
+            self.version += 1
+
+            if self.options.get('mode') == 'heuristic':
+                self.full_graph = build_graph(files, self.root_path, **self.options)
+                self.search = SearchIndex(node['id'] for node in self.full_graph['nodes'])
+                return
+            self.full_graph = None
+
+            update_progress('scanning', 'Scanning directory for files...', 10)
+            cache_dir = self.options.get('cache_dir')
+            low_memory = self.options.get('low_memory') or self.options.get('memory_budget') is not None
+            cache = ReferenceCache(cache_dir, self.root_path, 'imports', preload=not low_memory) if cache_dir else None
+            try:
+                files, rel_paths, references, _, parse_timings = extract_references(
+                    files, self.root_path, 'imports', cache, self.options.get('hash_files'),
+                    self.options.get('jobs', 1), self.options.get('memory_budget'))
+                if cache:
+                    cache.save(rel_paths)
+            finally:
+                if cache:
+                    cache.close()
+
+            self.files = dict(zip(rel_paths, files))
+            self.references = dict(zip(rel_paths, references))
+            self.nodes = {rel_path: make_node(rel_path, index) for index, rel_path in enumerate(sorted(rel_paths))}
+            self.targets = {}
+            self.probed_bases = {}
+            self.probes = {}
+
+            update_progress('analyzing', 'Resolving imports...', 70)
+            for rel_path in rel_paths:
+                self.resolve_source(rel_path)
+            self.edge_count = sum(len(targets) for targets in self.targets.values())
+
+            update_progress('analyzing', 'Laying out graph...', 95)
+            edges = [{'from': source, 'to': target} for source, targets in self.targets.items() for target in targets]
+            graph = layout_graph({'metadata': {}, 'nodes': list(self.nodes.values()), 'edges': edges}, self.options.get('layout', 'clustered'))
+            self.layout = graph['metadata']['layout']
+            self.search = SearchIndex(self.nodes)
+            self.parse_timings = parse_timings
+            self.generated_at = time.time()
+
+        update_progress('complete', f'Analysis complete! Found {len(self.nodes)} files and {self.edge_count} connections.', 100)
+
+    def resolve_source(self, rel_path):
+        """Resolve the imports of one file, recording the bases it probes."""
+        self.unindex(rel_path)
+        bases = []
+        targets = set()
+        for dep in self.references[rel_path]:
+            for base in dependency_bases(dep, rel_path):
+                bases.append(base)
+                target = lookup_file(base, self.nodes)
+                if target is not None:
+                    if target != rel_path:
+                        targets.add(target)
+                    break
+        for base in bases:
+            self.probes.setdefault(base, set()).add(rel_path)
+        self.probed_bases[rel_path] = bases
+        self.targets[rel_path] = targets
+
+    def unindex(self, rel_path):
+        """Forget the bases a file probed."""
+        for base in self.probed_bases.pop(rel_path, ()):
+            sources = self.probes.get(base)
+            if sources is not None:
+                sources.discard(rel_path)
+                if not sources:
+                    del self.probes[base]
+
+    def apply_changes(self, paths):
+        """Update the graph for changed paths and return the resulting patch.
+
+        paths are absolute file or directory paths; None means unknown changes.
+        The patch lists added/removed nodes and edges, or is {'reset': True}
+        when the graph had to be rebuilt from scratch.
+        """
+        if paths is None or self.full_graph is not None or any(os.path.basename(path) == '.gitignore' for path in paths):
+            self.rebuild()
+            return {'reset': True}
+
+        with self.lock:
+            added, removed, modified = set(), set(), set()
+            prefix = os.path.join(self.root_path, '')
+            for path in paths:
+                rel_path = os.path.relpath(path, self.root_path)
+                candidates = {rel_path}
+                # Directories: files known below it and files now found in it
+                dir_prefix = rel_path + os.sep
+                candidates.update(known for known in self.files if known.startswith(dir_prefix))
+                if os.path.isdir(path):
+                    candidates.update(relative_paths(scan_directory(path, self.matcher), self.root_path))
+
+                for candidate in candidates:
+                    present = is_scanned_path(prefix + candidate, self.matcher)
+                    if candidate in self.files:
+                        (modified if present else removed).add(candidate)
+                    elif present:
+                        added.add(candidate)
+
+            # Files whose imports may now resolve differently
+            affected = added | modified
+            for rel_path in added | removed:
+                for key in reference_keys(rel_path):
+                    affected.update(self.probes.get(key, ()))
+            old_edges = {(source, target) for source in affected | removed for target in self.targets.get(source, ())}
+
+            for rel_path in removed:
+                self.unindex(rel_path)
+                self.search.remove(rel_path)
+                del self.files[rel_path], self.references[rel_path], self.nodes[rel_path], self.targets[rel_path]
+            for rel_path in sorted(added):
+                self.files[rel_path] = prefix + rel_path
+                node = make_node(rel_path, 0)
+                node['position'] = self.free_position(rel_path)
+                self.nodes[rel_path] = node
+                self.search.add(rel_path)
+            for rel_path in added | modified:
+                self.references[rel_path] = extract_file_references(self.files[rel_path], 'imports')
+
+            affected -= removed
+            for rel_path in affected:
+                self.resolve_source(rel_path)
+            new_edges = {(source, target) for source in affected for target in self.targets[source]}
+
+            patch = {
+                'added_nodes': [self.nodes[rel_path] for rel_path in sorted(added)],
+                'removed_nodes': sorted(removed),
+                'added_edges': [{'from': source, 'to': target} for source, target in sorted(new_edges - old_edges)],
+                'removed_edges': [{'from': source, 'to': target} for source, target in sorted(old_edges - new_edges)]
+            }
+            self.edge_count += len(patch['added_edges']) - len(patch['removed_edges'])
+            if any(patch.values()):
+                self.version += 1
+                self.generated_at = time.time()
+            return patch
+
+    def free_position(self, rel_path):
+        """Position for a file added since the layout, which leaves all other nodes in place.
+
+        That is next to the last file of its directory, or below all nodes if
+        the directory has no other files.
+        """
+        directory = os.path.dirname(rel_path)
+        siblings = [node['position'] for other, node in self.nodes.items() if os.path.dirname(other) == directory]
+        if siblings:
+            last = max(siblings, key=lambda position: (position['y'], position['x']))
+            return {'x': last['x'] + NODE_SPACING_X, 'y': last['y']}
+        bottom = max((node['position']['y'] for node in self.nodes.values()), default=-NODE_SPACING_Y - CLUSTER_GAP)
+        return {'x': 0, 'y': bottom + NODE_SPACING_Y + CLUSTER_GAP}
+
+    @property
+    def graph(self):
+        """Return the current graph in the format of build_graph."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """Return the current version and graph, consistent with each other."""
+        with self.lock:
+            if self.full_graph is not None:
+                return self.version, self.full_graph
+            edges = [{'from': source, 'to': target}
+                     for source, targets in self.targets.items() for target in targets]
+            # Target-major by relative path, in the order of build_graph
+            edges.sort(key=lambda edge: (edge['to'], edge['from']))
+            return self.version, {
+                'metadata': {
+                    'project_path': self.root_path,
+                    'project_name': os.path.basename(self.root_path),
+                    'generated_at': self.generated_at,
+                    'file_count': len(self.nodes),
+                    'connection_count': len(edges),
+                    'mode': 'imports',
+                    'parse_timings': self.parse_timings,
+                    'layout': self.layout,
+                    'version': self.version
+                },
+                'nodes': list(self.nodes.values()),
+                'edges': edges
+            }
+
+# inotify event flags (see inotify(7))
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+def watch_directory(root_path, on_change, matcher=None, stop_event=None, poll_interval=2.0, debounce=0.2):
+    """Call on_change with batches of changed paths under root_path until stop_event is set.
+
+    Uses inotify where available and falls back to polling modification times.
+    on_change receives None when changes were lost and everything must be rescanned.
+    """
+    if matcher is None:
+        matcher = IgnoreMatcher(root_path)
+    if stop_event is None:
+        stop_event = threading.Event()
+    try:
+        watch_inotify(root_path, on_change, matcher, stop_event, debounce)
+    except (OSError, AttributeError) as e:
+        print(f"inotify unavailable ({e}), polling every {poll_interval}s")
+        watch_polling(root_path, on_change, matcher, stop_event, poll_interval)
+
+def watch_inotify(root_path, on_change, matcher, stop_event, debounce):
+    """inotify-based implementation of watch_directory (Linux only)."""
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    watches = {}
+
+    def add_tree(dir_path):
+        for root, dirs, _ in os.walk(dir_path):
+            dirs[:] = [d for d in dirs if not matcher.ignored(matcher.relative(os.path.join(root, d)), True)]
+            wd = libc.inotify_add_watch(fd, os.fsencode(root), INOTIFY_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {root}')
+            watches[wd] = root
+
+    try:
+        add_tree(root_path)
+        pending = set()
+        overflow = False
+        deadline = None
+        while not stop_event.is_set():
+            timeout = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([fd], [], [], timeout)
+            if readable:
+                data = os.read(fd, 65536)
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+                    name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b'\0'))
+                    offset += 16 + length
+
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                        continue
+                    dir_path = watches.get(wd)
+                    if dir_path is None:
+                        continue
+                    if mask & IN_IGNORED:
+                        del watches[wd]
+                        continue
+                    path = os.path.join(dir_path, name) if name else dir_path
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not matcher.excluded(matcher.relative(path), True):
+                        try:
+                            add_tree(path)
+                        except OSError:
+                            overflow = True
+                    pending.add(path)
+                # Wait for a quiet period so that bursts are applied as one batch
+                deadline = time.monotonic() + debounce
+            elif deadline is not None:
+                on_change(None if overflow else pending)
+                pending = set()
+                overflow = False
+                deadline = None
+    finally:
+        os.close(fd)
+
+def watch_polling(root_path, on_change, matcher, stop_event, interval):
+    """Polling implementation of watch_directory."""
+    gitignore_path = os.path.join(root_path, '.gitignore')
+
+    def snapshot():
+        state = {}
+        for file_path in [*scan_directory(root_path, matcher), gitignore_path, *matcher.gitignore_files]:
+            try:
+                stat = os.stat(file_path)
+                state[file_path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return state
+
+    previous = snapshot()
+    while not stop_event.wait(interval):
+        current = snapshot()
+        changed = {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+        if changed:
+            on_change(changed)
+        previous = current
+
+def watch_project(path, options, poll_interval=2.0, profile=None):
+    """Keep LIVE_GRAPH up to date with the files under path and push patches to SSE clients.
+
+    With profile, a cProfile dump of the initial analysis is written to that path.
+    """
+    global LIVE_GRAPH
+    with profiling(profile):
+        live_graph = IncrementalGraph(path, options)
+    LIVE_GRAPH = live_graph
+    print(f"Watching {live_graph.root_path} for changes")
+
+    def on_change(paths):
+        try:
+            patch = live_graph.apply_changes(paths)
+        except Exception as e:
+            print(f"Error updating graph: {e}")
+            return
+        metadata = {'file_count': len(live_graph.nodes), 'connection_count': live_graph.edge_count} if live_graph.full_graph is None else {}
+        if patch.get('reset'):
+            broadcast_event({'status': 'graph_reset', 'version': live_graph.version})
+        elif any(patch.values()):
+            print(f"Graph updated: +{len(patch['added_nodes'])}/-{len(patch['removed_nodes'])} files, "
+                  f"+{len(patch['added_edges'])}/-{len(patch['removed_edges'])} connections")
+            broadcast_event({'status': 'graph_patch', 'version': live_graph.version, 'patch': patch, 'metadata': metadata})
+
+    watch_directory(live_graph.root_path, on_change, live_graph.matcher, poll_interval=poll_interval)
+
+class DirectoryTree:
+    """The directories of a graph's files, with the edges between them counted.
+
+    view() returns the graph with directories below a depth collapsed into
+    single nodes. Edges are counted per pair of parent directories once, so a
+    view only goes through the edges of the files it shows individually.
+    """
+
+    def __init__(self, graph):
+        self.metadata = graph['metadata']
+        self.files = {}
+        self.subdirs = {'': set()}
+        self.file_counts = {'': 0}
+        position_sums = {'': [0, 0]}
+        for node in graph['nodes']:
+            directory = os.path.dirname(node['id'])
+            self.files.setdefault(directory, []).append(node)
+            # Register the file with every ancestor directory
+            while True:
+                if directory not in self.file_counts:
+                    self.file_counts[directory] = 0
+                    position_sums[directory] = [0, 0]
+                    self.subdirs.setdefault(directory, set())
+                    self.subdirs.setdefault(os.path.dirname(directory), set()).add(directory)
+                self.file_counts[directory] += 1
+                position_sums[directory][0] += node['position']['x']
+                position_sums[directory][1] += node['position']['y']
+                if not directory:
+                    break
+                directory = os.path.dirname(directory)
+        self.positions = {directory: {'x': round(x / self.file_counts[directory]), 'y': round(y / self.file_counts[directory])}
+                          for directory, (x, y) in position_sums.items() if self.file_counts[directory]}
+
+        self.dir_edges = {}
+        self.file_edges = {}
+        for edge in graph['edges']:
+            key = (os.path.dirname(edge['from']), os.path.dirname(edge['to']))
+            self.dir_edges[key] = self.dir_edges.get(key, 0) + 1
+            for directory in set(key):
+                self.file_edges.setdefault(directory, []).append(edge)
+
+    def view(self, depth=1, expand=(), max_edges=None):
+        """Return the graph showing the directories up to depth levels deep.
+
+        Files are shown in the top-level directory and, recursively, in the
+        directories less than depth levels deep, those in expand (with their
+        ancestors) and those that are the only entry of a shown directory.
+        Every other directory is a single node of type 'directory' placed at
+        the centre of its files, and edges carry the number of file-level
+        connections they stand for as 'count'. With max_edges, only that many
+        of the edges with the highest counts are returned.
+        """
+        expanded = {''}
+        for directory in expand:
+            directory = os.path.normpath(directory).strip(os.sep)
+            while directory and directory != '.' and directory not in expanded:
+                expanded.add(directory)
+                directory = os.path.dirname(directory)
+
+        nodes = []
+        visible = []
+        pending = ['']
+        while pending:
+            directory = pending.pop()
+            visible.append(directory)
+            files = self.files.get(directory, ())
+            nodes.extend(files)
+            only_entry = not files and len(self.subdirs[directory]) == 1
+            for subdir in sorted(self.subdirs[directory]):
+                if subdir in expanded or subdir.count(os.sep) + 1 < depth or only_entry:
+                    expanded.add(subdir)
+                    pending.append(subdir)
+                else:
+                    nodes.append({'id': subdir, 'label': os.path.basename(subdir) + '/', 'type': 'directory', 'path': subdir,
+                                  'position': self.positions[subdir], 'file_count': self.file_counts[subdir]})
+
+        # The collapsed directory standing for a directory, None if its files are shown
+        collapsed = {}
+
+        def representative(directory):
+            if directory not in collapsed:
+                if directory in expanded:
+                    collapsed[directory] = None
+                else:
+                    parent = os.path.dirname(directory)
+                    collapsed[directory] = directory if parent in expanded else representative(parent)
+            return collapsed[directory]
+
+        counts = {}
+        for (source_dir, target_dir), count in self.dir_edges.items():
+            source, target = representative(source_dir), representative(target_dir)
+            if source is not None and target is not None and source != target:
+                counts[(source, target)] = counts.get((source, target), 0) + count
+        for directory in visible:
+            for edge in self.file_edges.get(directory, ()):
+                source_dir = os.path.dirname(edge['from'])
+                source = representative(source_dir)
+                # Edges between two shown directories are counted with their source
+                if source_dir != directory and source is None:
+                    continue
+                target = representative(os.path.dirname(edge['to']))
+                key = (source or edge['from'], target or edge['to'])
+                if key[0] != key[1]:
+                    counts[key] = counts.get(key, 0) + 1
+
+        edges = sorted(counts.items())
+        if max_edges is not None and len(edges) > max_edges:
+            edges = sorted(sorted(edges, key=lambda item: item[1], reverse=True)[:max_edges])
+        edges = [{'from': source, 'to': target, 'count': count} for (source, target), count in edges]
+        return {
+            'metadata': dict(self.metadata, view={'depth': depth, 'expanded': sorted(expanded - {''}),
+                                                  'node_count': len(nodes), 'edge_count': len(counts),
+                                                  'edges_shown': len(edges)}),
+            'nodes': nodes,
+            'edges': edges
+        }
+
+class GraphIndex:
+    """Adjacency of a graph in CSR form, in both directions, for queries.
+
+    The files a file imports are targets[offsets[i]:offsets[i + 1]] of
+    DEPENDENCIES, the files importing it the same slice of DEPENDENTS.
+    Transitive results are cached, as are the strongly connected components.
+    """
+
+    DEPENDENCIES = 'dependencies'
+    DEPENDENTS = 'dependents'
+    MAX_CACHED_CLOSURES = 256
+
+    def __init__(self, graph):
+        self.ids = [node['id'] for node in graph['nodes']]
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        pairs = [(self.index[edge['from']], self.index[edge['to']]) for edge in graph['edges']
+                 if edge['from'] in self.index and edge['to'] in self.index]
+        self.adjacency = {self.DEPENDENCIES: self.csr(pairs), self.DEPENDENTS: self.csr([(target, source) for source, target in pairs])}
+        self.lock = threading.Lock()
+        self.closures = {}
+        self.components = None
+
+    def csr(self, pairs):
+        """Return the (offsets, targets) arrays of (source, target) pairs, by counting sort."""
+        offsets = array('I', bytes(4 * (len(self.ids) + 1)))
+        for source, _ in pairs:
+            offsets[source + 1] += 1
+        for i in range(len(self.ids)):
+            offsets[i + 1] += offsets[i]
+        targets = array('I', bytes(4 * len(pairs)))
+        position = offsets[:-1]
+        for source, target in pairs:
+            targets[position[source]] = target
+            position[source] += 1
+        return offsets, targets
+
+    def neighbours(self, node, direction):
+        offsets, targets = self.adjacency[direction]
+        return targets[offsets[node]:offsets[node + 1]]
+
+    def closure(self, node, direction):
+        """Return the (node, distance) pairs reachable from node, nearest first."""
+        key = (node, direction)
+        with self.lock:
+            result = self.closures.pop(key, None)
+            if result is not None:
+                # Most recently used last
+                self.closures[key] = result
+                return result
+
+        offsets, targets = self.adjacency[direction]
+        seen = bytearray(len(self.ids))
+        seen[node] = 1
+        result = []
+        frontier = [node]
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for current in frontier:
+                for target in targets[offsets[current]:offsets[current + 1]]:
+                    if not seen[target]:
+                        seen[target] = 1
+                        next_frontier.append(target)
+            result.extend((target, distance) for target in next_frontier)
+            frontier = next_frontier
+
+        with self.lock:
+            self.closures[key] = result
+            while len(self.closures) > self.MAX_CACHED_CLOSURES:
+                del self.closures[next(iter(self.closures))]
+        return result
+
+    def shortest_path(self, source, target):
+        """Return the shortest chain of imports from source to target, or None.
+
+        Searches breadth-first from both ends, always extending the smaller
+        frontier.
+        """
+        if source == target:
+            return [source]
+        # Predecessor towards source, and successor towards target, per reached node
+        parents = [{source: None}, {target: None}]
+        frontiers = [[source], [target]]
+        directions = [self.DEPENDENCIES, self.DEPENDENTS]
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            offsets, targets = self.adjacency[directions[side]]
+            reached, other = parents[side], parents[1 - side]
+            next_frontier = []
+            for current in frontiers[side]:
+                for neighbour in targets[offsets[current]:offsets[current + 1]]:
+                    if neighbour in reached:
+                        continue
+                    reached[neighbour] = current
+                    if neighbour in other:
+                        path = [neighbour]
+                        while parents[0][path[0]] is not None:
+                            path.insert(0, parents[0][path[0]])
+                        while parents[1][path[-1]] is not None:
+                            path.append(parents[1][path[-1]])
+                        return path
+                    next_frontier.append(neighbour)
+            frontiers[side] = next_frontier
+        return None
+
+    def cycles(self):
+        """Return the strongly connected components with more than one file, largest first.
+
+        Iterative Tarjan's algorithm, run once.
+        """
+        with self.lock:
+            if self.components is not None:
+                return self.components
+
+        offsets, targets = self.adjacency[self.DEPENDENCIES]
+        count = len(self.ids)
+        order = [0] * count
+        lowlink = [0] * count
+        on_stack = bytearray(count)
+        visited = bytearray(count)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(count):
+            if visited[root]:
+                continue
+            # (node, position of the next edge to follow)
+            work = [(root, offsets[root])]
+            visited[root] = 1
+            order[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            while work:
+                node, edge = work[-1]
+                if edge < offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = targets[edge]
+                    if not visited[target]:
+                        visited[target] = 1
+                        order[target] = lowlink[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, offsets[target]))
+                    elif on_stack[target] and order[target] < lowlink[node]:
+                        lowlink[node] = order[target]
+                    continue
+                work.pop()
+                if work and lowlink[node] < lowlink[work[-1][0]]:
+                    lowlink[work[-1][0]] = lowlink[node]
+                if lowlink[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        components.append(sorted(component))
+        components.sort(key=lambda component: (-len(component), component))
+
+        with self.lock:
+            self.components = components
+        return components
+
+def path_trigrams(text):
+    """Return the distinct three-character substrings of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """Fuzzy search over file paths.
+
+    Matches are ranked by kind (see search), then shorter paths first. Paths
+    are indexed by their lowercase trigrams, with document ids given out in
+    order of path length so that posting lists list shorter paths first, and
+    by their lowercase file names in sorted order. Files can be added and
+    removed one at a time. Added files get the next ids, so scans that stop
+    early still look at all of them; removed files stay in the posting lists.
+    Once either outnumber the files indexed in order, the index is rebuilt.
+    """
+
+    # Posting list entries counted at most when matching trigrams, rarest first
+    POSTING_BUDGET = 50000
+    # Best trigram matches that are ranked
+    CANDIDATES = 200
+
+    def __init__(self, paths=()):
+        self.lock = threading.Lock()
+        self.reset(paths)
+
+    def reset(self, paths):
+        # Document id -> path and lowercase path (None once removed), and back
+        self.paths = sorted(paths, key=lambda path: (len(path), path))
+        self.lowered = [path.lower() for path in self.paths]
+        self.docs = {path: doc for doc, path in enumerate(self.paths)}
+        self.names = sorted((os.path.basename(lowered), doc) for doc, lowered in enumerate(self.lowered))
+        self.name_text = None
+        self.removed = 0
+        # Documents before this one are in length order
+        self.ordered = len(self.paths)
+        self.postings = postings = {}
+        for doc, lowered in enumerate(self.lowered):
+            for trigram in {lowered[i:i + 3] for i in range(len(lowered) - 2)}:
+                entries = postings.get(trigram)
+                if entries is None:
+                    postings[trigram] = array('I', (doc,))
+                else:
+                    entries.append(doc)
+
+    def add(self, path):
+        with self.lock:
+            if path in self.docs:
+                return
+            doc = len(self.paths)
+            lowered = path.lower()
+            self.paths.append(path)
+            self.lowered.append(lowered)
+            self.docs[path] = doc
+            for trigram in path_trigrams(lowered):
+                self.postings.setdefault(trigram, array('I')).append(doc)
+            bisect.insort(self.names, (os.path.basename(lowered), doc))
+            self.name_text = None
+            if len(self.paths) - self.ordered > self.ordered:
+                self.reset(path for path in self.paths if path is not None)
+
+    def remove(self, path):
+        with self.lock:
+            doc = self.docs.pop(path, None)
+            if doc is None:
+                return
+            entry = (os.path.basename(self.lowered[doc]), doc)
+            del self.names[bisect.bisect_left(self.names, entry)]
+            self.paths[doc] = self.lowered[doc] = None
+            self.name_text = None
+            self.removed += 1
+            if self.removed > len(self.docs):
+                self.reset(path for path in self.paths if path is not None)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def name_matches(self, pattern, max_matches):
+        """Return up to max_matches documents whose file name matches the compiled regular expression pattern."""
+        if self.name_text is None:
+            self.name_text = '\n'.join(name for name, _ in self.names)
+            self.name_starts = array('I', [0])
+            for name, _ in self.names[:-1]:
+                self.name_starts.append(self.name_starts[-1] + len(name) + 1)
+        matches = []
+        for match in pattern.finditer(self.name_text):
+            if len(matches) == max_matches:
+                break
+            matches.append(self.names[bisect.bisect_right(self.name_starts, match.start()) - 1][1])
+        return matches
+
+    def search(self, query, limit=10):
+        """Return up to limit (path, score) pairs matching query, best first.
+
+        The integer part of the score is the kind of match: the file name is the
+        query (6), starts with it (5) or contains it (4), the path contains it
+        (3), the file name contains its characters in order (2), or the path
+        shares at least a third of its trigrams (0). The fraction of shared
+        trigrams is added as a tenth. The later kinds are only looked for while
+        there are fewer than limit matches, and among many matches of one of
+        the last three kinds only some are ranked.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        query_trigrams = path_trigrams(query)
+        scores = {}
+        with self.lock:
+            # Names equal to the query come first and in document order, then those starting with it
+            start = bisect.bisect_left(self.names, (query,))
+            exact_end = bisect.bisect_left(self.names, (query, len(self.paths)))
+            end = bisect.bisect_left(self.names, (query + '\uffff',))
+            for _, doc in self.names[start:min(exact_end, start + limit)]:
+                scores[doc] = 6.1
+            if end - exact_end <= self.CANDIDATES:
+                for _, doc in self.names[exact_end:end]:
+                    scores[doc] = 5.1
+            else:
+                # Too many to rank, take the shortest ones and those added since
+                found = 0
+                for docs in (range(self.ordered), range(self.ordered, len(self.paths))):
+                    for doc in docs:
+                        if found >= limit and doc < self.ordered:
+                            break
+                        lowered = self.lowered[doc]
+                        if lowered is not None:
+                            name = lowered[lowered.rfind(os.sep) + 1:]
+                            if name != query and name.startswith(query):
+                                scores[doc] = 5.1
+                                found += 1
+
+            postings = sorted((self.postings.get(trigram, array('I')) for trigram in query_trigrams), key=len)
+            if postings:
+                # Paths containing the query are all listed for its rarest trigram, shortest first
+                # up to the added ones, so the scan can skip to those at limit file names containing it
+                in_names = len(scores)
+                in_paths = 0
+                entries = postings[0][:self.POSTING_BUDGET]
+                added = bisect.bisect_left(entries, self.ordered)
+                for docs in (entries[:added], entries[added:]):
+                    for doc in docs:
+                        if in_names >= limit and doc < self.ordered:
+                            break
+                        lowered = self.lowered[doc]
+                        if lowered is None or doc in scores or query not in lowered:
+                            continue
+                        if query in lowered[lowered.rfind(os.sep) + 1:]:
+                            scores[doc] = 4.1
+                            in_names += 1
+                        elif in_paths < limit or doc >= self.ordered:
+                            scores[doc] = 3.1
+                            in_paths += 1
+
+            if len(scores) < limit and len(query) > 1 and os.sep not in query:
+                # Each character is matched at its first occurrence after the previous one, no backtracking
+                pattern = re.compile(re.escape(query[0]) + ''.join(f'[^{re.escape(char)}\n]*+{re.escape(char)}' for char in query[1:]))
+                for doc in self.name_matches(pattern, self.CANDIDATES):
+                    if doc not in scores:
+                        shared = len(query_trigrams & path_trigrams(self.lowered[doc])) / len(query_trigrams) if query_trigrams else 0
+                        scores[doc] = 2 + shared / 10
+
+            if len(scores) < limit and postings:
+                counts = Counter()
+                counted = 0
+                for entries in postings:
+                    if counted and counted + len(entries) > self.POSTING_BUDGET:
+                        break
+                    counts.update(entries)
+                    counted += len(entries)
+                for doc, _ in counts.most_common(self.CANDIDATES):
+                    lowered = self.lowered[doc]
+                    if lowered is not None and doc not in scores:
+                        shared = len(query_trigrams & path_trigrams(lowered)) / len(query_trigrams)
+                        if shared >= 1 / 3:
+                            scores[doc] = shared / 10
+
+            ranked = heapq.nsmallest(limit, ((-score, len(self.paths[doc]), self.paths[doc]) for doc, score in scores.items()))
+        return [(path, -score) for score, _, path in ranked]
+
+def estimate_graph_bytes(graph, sample_size=1000):
+    """Estimate the memory held by a graph from the sizes of a sample of its nodes and edges."""
+    def size(value):
+        total = sys.getsizeof(value)
+        if isinstance(value, dict):
+            # Keys are interned and shared by all nodes
+            total += sum(size(item) for item in value.values())
+        elif isinstance(value, list):
+            total += sum(size(item) for item in value)
+        return total
+
+    total = size(graph['metadata'])
+    nodes, edges = graph['nodes'], graph['edges']
+    if nodes:
+        sample = nodes[::max(len(nodes) // sample_size, 1)]
+        total += sys.getsizeof(nodes) + sum(size(node) for node in sample) * len(nodes) // len(sample)
+    # Edges refer to the strings of the node ids
+    total += sys.getsizeof(edges) + sum(sys.getsizeof(edge) for edge in edges[:1]) * len(edges)
+    return total
+
+class GraphStore:
+    """The last built graph of a project directory, served from memory.
+
+    The graph is built on first use and then only rebuilt by rebuild(), for
+    example on /api/reindex, or replaced by replace() when an analysis job
+    finishes; if the directory is watched, LIVE_GRAPH is served instead. Only
+    one build runs at a time: requests arriving meanwhile wait for its result.
+    Serialized and compressed bodies, the graph laid out by algorithms other
+    than the one it was built with, its DirectoryTree, GraphIndex and
+    SearchIndex are kept per graph version, which also makes up the ETag.
+
+    spill() writes the graph to spill_path and drops it and everything derived
+    from it from memory; the next use reads it back instead of analyzing the
+    directory again, keeping the version (see ProjectRegistry).
+    """
+
+    def __init__(self, path, graph=None, project_id=None, spill_path=None):
+        self.path = os.path.abspath(path)
+        self.project_id = project_id
+        self.spill_path = spill_path
+        self.lock = threading.Lock()
+        self.graph = graph
+        self.version = 0 if graph is None else 1
+        self.graph_bytes = estimate_graph_bytes(graph) if graph is not None else 0
+        # Version written to spill_path, if any
+        self.spilled_version = None
+        self.building = None
+        self.build_error = None
+        self.last_used = time.time()
+        # Per-version caches by name, see cached()
+        self.caches = {}
+        self.cache_version = None
+        # Layouts and indexes can take seconds, compute each only once
+        self.compute_lock = threading.Lock()
+        # Distinguishes versions of this process from those of earlier runs
+        self.instance = os.urandom(4).hex()
+
+    def live(self):
+        """Return LIVE_GRAPH if it keeps this directory up to date, else None."""
+        live_graph = LIVE_GRAPH
+        return live_graph if live_graph is not None and live_graph.root_path == self.path else None
+
+    def current(self):
+        """Return the (version, graph) being served, building or loading the graph if it is not in memory."""
+        self.last_used = time.time()
+        live_graph = self.live()
+        if live_graph is not None:
+            version, graph = live_graph.snapshot()
+            return f'live{version}', graph
+        with self.lock:
+            if self.graph is not None:
+                return self.version, self.graph
+        return self.rebuild(force=False)
+
+    def state(self):
+        """Return where the graph is: 'building', 'live', 'memory', 'disk' or 'none'."""
+        with self.lock:
+            if self.building is not None:
+                return 'building'
+            if self.live() is not None:
+                return 'live'
+            if self.graph is not None:
+                return 'memory'
+            return 'disk' if self.spilled_version is not None else 'none'
+
+    def rebuild(self, force=True):
+        """Build the graph again and return the new (version, graph).
+
+        Joins the build in progress if there is one. With force=False an
+        existing graph is returned as is, and a spilled one is read back.
+        """
+        with self.lock:
+            in_flight = self.building
+            if in_flight is None:
+                if not force and self.graph is not None:
+                    return self.version, self.graph
+                self.building = threading.Event()
+                spilled = not force and self.spilled_version == self.version
+
+        if in_flight is not None:
+            in_flight.wait()
+            with self.lock:
+                if self.build_error is not None:
+                    raise self.build_error
+                return self.version, self.graph
+
+        graph = error = None
+        try:
+            graph = self.load_spilled() if spilled else None
+            if graph is None:
+                spilled = False
+                graph = self.build()
+        except Exception as e:
+            error = e
+        with self.lock:
+            if error is None:
+                self.graph = graph
+                self.graph_bytes = estimate_graph_bytes(graph)
+                if not spilled:
+                    self.version += 1
+            self.build_error = error
+            done, self.building = self.building, None
+            version = self.version
+        done.set()
+        if error is not None:
+            raise error
+        return version, graph
+
+    def build(self):
+        live_graph = self.live()
+        if live_graph is not None:
+            live_graph.rebuild()
+            broadcast_event({'status': 'graph_reset', 'version': live_graph.version})
+            return live_graph.graph
+
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(self.path)
+
+        graph = build_graph(scan_directory(self.path), self.path, **ANALYSIS_OPTIONS)
+        print(f"Generated graph with {len(graph['nodes'])} nodes and {len(graph['edges'])} edges")
+        return graph
+
+    def replace(self, graph):
+        """Serve graph, from a finished analysis of the directory, as the next version."""
+        graph_bytes = estimate_graph_bytes(graph)
+        with self.lock:
+            self.graph = graph
+            self.graph_bytes = graph_bytes
+            self.version += 1
+            self.last_used = time.time()
+
+    def load_spilled(self):
+        """Read the graph written by spill(), or return None if the file is gone."""
+        try:
+            with open(self.spill_path, 'rb') as f:
+                graph = decode_graph(f.read())
+        except (OSError, ValueError):
+            return None
+        print(f"Loaded graph of {self.path} from {self.spill_path}")
+        return graph
+
+    def memory_bytes(self):
+        """Estimate the memory held by the graph, its cached bodies and what else was derived from it."""
+        with self.lock:
+            if self.graph is None:
+                return 0
+            bodies = self.caches.get('bodies', {}) if self.cache_version == self.version else {}
+            derived = sum(len(values) for name, values in self.caches.items() if name != 'bodies')
+            # Layouts, trees and indexes are each counted as half a graph
+            return self.graph_bytes + sum(len(body) for body in bodies.values()) + derived * self.graph_bytes // 2
+
+    def spill(self):
+        """Move the graph from memory to spill_path, returning the bytes freed (see memory_bytes).
+
+        Graphs being built or kept up to date by watch mode stay. Without a
+        spill_path the graph is only dropped, to be built again on its next use.
+        """
+        freed = self.memory_bytes()
+        with self.lock:
+            if self.graph is None or self.building is not None or self.live() is not None:
+                return 0
+            graph, version = self.graph, self.version
+            write = self.spill_path is not None and self.spilled_version != version
+        if write:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                temp_path = f'{self.spill_path}.{os.getpid()}.tmp'
+                with open(temp_path, 'wb') as f:
+                    f.write(encode_graph(graph))
+                os.replace(temp_path, self.spill_path)
+            except OSError as e:
+                print(f"Could not spill the graph of {self.path}: {e}")
+                return 0
+        with self.lock:
+            if self.graph is not graph or self.building is not None:
+                # Replaced or rebuilt meanwhile
+                return 0
+            if self.spill_path is not None:
+                self.spilled_version = version
+            self.graph = None
+            self.caches = {}
+            self.cache_version = None
+        print(f"Moved the graph of {self.path} out of memory ({freed / (1024 * 1024):.0f} MB)")
+        return freed
+
+    def to_dict(self):
+        with self.lock:
+            graph = self.graph
+            version = self.version
+        return {
+            'id': self.project_id,
+            'path': self.path,
+            'state': self.state(),
+            'version': version,
+            'file_count': graph['metadata'].get('file_count') if graph else None,
+            'memory_mb': round(self.memory_bytes() / (1024 * 1024), 1),
+            'last_used': self.last_used
+        }
+
+    def cached(self, version, cache):
+        """Return the dict cache of version named cache, emptying all caches on a new version.
+
+        Must be called with self.lock held.
+        """
+        if self.cache_version != version:
+            self.caches = {}
+            self.cache_version = version
+        return self.caches.setdefault(cache, {})
+
+    def derived(self, version, cache, key, build):
+        """Return the value of key in the cache of version, computing it with build() only once."""
+        with self.compute_lock:
+            with self.lock:
+                value = self.cached(version, cache).get(key)
+            if value is None:
+                value = build()
+                with self.lock:
+                    if self.cache_version == version:
+                        self.caches[cache][key] = value
+        return value
+
+    def laid_out(self, version, graph, layout):
+        """Return graph with its nodes placed by layout instead of the algorithm it was built with."""
+        if layout is None or layout == graph['metadata'].get('layout'):
+            return graph
+        return self.derived(version, 'layouts', layout, lambda: layout_graph(
+            {'metadata': dict(graph['metadata']), 'nodes': [dict(node) for node in graph['nodes']], 'edges': graph['edges']},
+            layout))
+
+    def tree(self, version, graph, layout=None):
+        """Return the DirectoryTree of graph as laid out by layout."""
+        graph = self.laid_out(version, graph, layout)
+        return self.derived(version, 'trees', layout, lambda: DirectoryTree(graph))
+
+    def tree_view(self, version, graph, layout, depth, expand, max_edges):
+        """Return the JSON body of a DirectoryTree view of graph.
+
+        Views without expanded directories, which every viewer starts with, are
+        kept with the bodies; the others differ from viewer to viewer.
+        """
+        key = ('tree', layout, depth, max_edges)
+        if not expand:
+            with self.lock:
+                body = self.cached(version, 'bodies').get(key)
+            if body is not None:
+                return body
+        body = json.dumps(self.tree(version, graph, layout).view(depth, expand, max_edges), separators=(',', ':')).encode('utf-8')
+        if not expand:
+            with self.lock:
+                if self.cache_version == version:
+                    self.caches['bodies'][key] = body
+        return body
+
+    def index(self, version, graph):
+        """Return the GraphIndex of graph."""
+        return self.derived(version, 'indexes', None, lambda: GraphIndex(graph))
+
+    def search_index(self, version, graph):
+        """Return the SearchIndex of graph; LIVE_GRAPH keeps its own up to date."""
+        live_graph = self.live()
+        if live_graph is not None:
+            return live_graph.search
+        return self.derived(version, 'search', None, lambda: SearchIndex(node['id'] for node in graph['nodes']))
+
+    def body(self, version, graph, kind, encoding, layout=None):
+        """Return the graph serialized as kind ('json' or 'bin') and compressed with encoding."""
+        with self.lock:
+            body = self.cached(version, 'bodies').get((kind, encoding, layout))
+        if body is None:
+            graph = self.laid_out(version, graph, layout)
+            body = json.dumps(graph, separators=(',', ':')).encode('utf-8') if kind == 'json' else encode_graph(graph)
+            if encoding == 'br':
+                body = brotli.compress(body, quality=5)
+            elif encoding == 'gzip':
+                body = gzip.compress(body, compresslevel=6)
+            with self.lock:
+                if self.cache_version == version:
+                    self.caches['bodies'][(kind, encoding, layout)] = body
+        return body
+
+    def etag(self, version, kind, encoding, layout=None):
+        return f'"{self.instance}-{version}-{layout or "default"}-{kind}-{encoding or "identity"}"'
+
+class ProjectRegistry:
+    """The GraphStores of all projects the server has analyzed, by project id.
+
+    Graphs are kept in memory up to memory_budget MB (see GraphStore.memory_bytes).
+    Beyond that, the least recently used ones are spilled to spill_dir in the
+    binary format of encode_graph and read back on their next use, which takes
+    a fraction of the time of analyzing the project again. The default project
+    is the directory given on the command line.
+    """
+
+    def __init__(self, memory_budget=1024, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.lock = threading.Lock()
+        # Least recently used first
+        self.stores = OrderedDict()
+        self.default_id = None
+
+    @staticmethod
+    def project_id(path):
+        """Return the id of the project in directory path, stable across restarts."""
+        return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+
+    def add(self, path, graph=None):
+        """Return the GraphStore of path, registering it if it is new. A graph given becomes its current one."""
+        project_id = self.project_id(path)
+        with self.lock:
+            store = self.stores.get(project_id)
+            if store is None:
+                spill_path = os.path.join(self.spill_dir, f'{project_id}.bin') if self.spill_dir else None
+                store = GraphStore(path, project_id=project_id, spill_path=spill_path)
+                self.stores[project_id] = store
+            self.stores.move_to_end(project_id)
+        if graph is not None:
+            store.replace(graph)
+            self.enforce_budget(store)
+        return store
+
+    def get(self, project_id):
+        """Return the GraphStore of project_id, marking it as recently used, or None."""
+        with self.lock:
+            store = self.stores.get(project_id)
+            if store is not None:
+                self.stores.move_to_end(project_id)
+        return store
+
+    def default(self):
+        return self.get(self.default_id) if self.default_id else None
+
+    def all(self):
+        """Return the GraphStores, most recently used first."""
+        with self.lock:
+            return list(reversed(self.stores.values()))
+
+    def remove(self, project_id):
+        """Forget a project and delete its spilled graph; returns its store, or None if unknown."""
+        with self.lock:
+            if project_id == self.default_id:
+                raise ValueError('The default project cannot be removed')
+            store = self.stores.pop(project_id, None)
+        if store is not None and store.spill_path:
+            with contextlib.suppress(OSError):
+                os.remove(store.spill_path)
+        return store
+
+    def enforce_budget(self, keep=None):
+        """Spill the least recently used graphs until the rest fit the memory budget, never keep's."""
+        with self.lock:
+            stores = list(self.stores.values())
+        total = sum(store.memory_bytes() for store in stores)
+        budget = self.memory_budget * 1024 * 1024
+        for store in stores:
+            if total <= budget:
+                break
+            if store is not keep:
+                total -= store.spill()
+
+PROJECTS = ProjectRegistry()
+
+class JobQueueFull(Exception):
+    """Raised when too many analyses are waiting already."""
+
+class AnalysisJob:
+    """One requested analysis of a directory, run by a JobScheduler."""
+
+    def __init__(self, job_id, path):
+        self.id = job_id
+        self.path = path
+        self.status = 'queued'
+        self.progress = {'status': 'queued', 'message': f'Waiting to analyze {path}', 'percentage': 0,
+                         'job_id': job_id, 'job_status': 'queued'}
+        self.error = None
+        self.project_id = ProjectRegistry.project_id(path)
+        self.store = None
+        self.future = None
+        self.cancel_requested = threading.Event()
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'path': self.path,
+            'project_id': self.project_id,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+class JobScheduler:
+    """Runs analyses in the background, at most max_running at a time.
+
+    Submitting a path that already has a queued or running job returns that
+    job instead of starting another. At most max_queued jobs wait for a slot,
+    and the last keep_finished finished jobs are listed. Finished graphs go to
+    PROJECTS, which keeps them for as long as its memory budget allows.
+    """
+
+    def __init__(self, max_running=2, max_queued=16, keep_finished=8):
+        self.executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='analysis')
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.active_by_path = {}
+
+    def submit(self, path):
+        """Queue an analysis of path and return (job, created)."""
+        abs_path = os.path.abspath(path)
+        with self.lock:
+            job = self.active_by_path.get(abs_path)
+            if job is not None:
+                return job, False
+            if sum(1 for job in self.jobs.values() if job.status == 'queued') >= self.max_queued:
+                raise JobQueueFull(f'{self.max_queued} analyses are already waiting')
+
+            job = AnalysisJob(os.urandom(8).hex(), abs_path)
+            self.jobs[job.id] = job
+            self.active_by_path[abs_path] = job
+            job.future = self.executor.submit(self.run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def all_jobs(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_requested.set()
+        with self.lock:
+            # Let the path be analyzed again right away
+            if self.active_by_path.get(job.path) is job:
+                del self.active_by_path[job.path]
+        # A queued job is dropped right away, a running one stops at its next progress update
+        if job.future.cancel():
+            self.finish(job, 'cancelled')
+        return job
+
+    def run(self, job):
+        if job.cancel_requested.is_set():
+            self.finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        progress_context.job = job
+        try:
+            store = PROJECTS.add(job.path)
+            if store.live() is not None:
+                # Watch mode keeps its own graph, which is rebuilt in place
+                _, graph = store.rebuild()
+            else:
+                graph = build_graph(scan_directory(job.path), job.path, **ANALYSIS_OPTIONS)
+                PROJECTS.add(job.path, graph)
+                if store.project_id == PROJECTS.default_id:
+                    broadcast_event({'status': 'graph_reset', 'version': store.version})
+            job.store = store
+            self.finish(job, 'complete', message=f"Analysis complete! Found {graph['metadata']['file_count']} files and "
+                                                 f"{graph['metadata']['connection_count']} connections.")
+        except AnalysisCancelled:
+            self.finish(job, 'cancelled')
+        except Exception as e:
+            print(f"Analysis of {job.path} failed: {e}")
+            self.finish(job, 'failed', str(e))
+        finally:
+            progress_context.job = None
+
+    def finish(self, job, status, error=None, message=None):
+        with self.lock:
+            if not job.active:
+                return
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            if self.active_by_path.get(job.path) is job:
+                del self.active_by_path[job.path]
+
+            # Forget the oldest finished jobs
+            finished = sorted((other for other in self.jobs.values() if not other.active), key=lambda other: other.finished_at)
+            for other in finished[:-self.keep_finished]:
+                del self.jobs[other.id]
+                BROADCASTER.close_channel(other.id)
+
+        if status == 'complete':
+            job.progress = {'status': 'complete', 'message': message, 'percentage': 100, 'job_id': job.id, 'job_status': status}
+        else:
+            job.progress = {'status': status, 'message': error or f'Analysis {status}', 'percentage': job.progress['percentage'],
+                            'job_id': job.id, 'job_status': status}
+        BROADCASTER.publish_progress(job.progress, job.id)
+
+JOB_SCHEDULER = JobScheduler()
+
+def route(rule, **options):
+    """Register the decorated function as the view of rule, like Flask's app.route."""
+    def register(view):
+        ROUTES.append((rule, options, view))
+        return view
+    return register
+
+def create_app():
+    """Create the Flask app serving the frontend and ROUTES, importing Flask only now."""
+    global app, jsonify, send_from_directory, Response, request
+    from flask import Flask, jsonify, send_from_directory, Response, request
+    from flask_cors import CORS
+
+    # The frontend is served by send_asset, with cache headers and precompressed variants
+    app = Flask(__name__, static_folder=None)
+    CORS(app)
+    for rule, options, view in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    return app
+
+# Open /progress streams allowed at once, None for no limit. Set by
+# serve_production so that streams cannot take up all of its threads
+MAX_PROGRESS_STREAMS = None
+
+def serve_production(host, port, threads=256):
+    """Serve the app with waitress, a production WSGI server, from a fixed pool of threads.
+
+    An open /progress stream holds one of the threads while it waits in
+    ProgressBroadcaster.wait, so only threads minus an eighth of them are
+    given to streams (see MAX_PROGRESS_STREAMS) and the rest keep answering
+    other requests. Connections beyond what the threads can serve queue up.
+    A single process serves all requests because jobs, projects and progress
+    live in its memory. Without waitress, werkzeug's development server is
+    used with a warning.
+    """
+    global MAX_PROGRESS_STREAMS
+    try:
+        from waitress.server import create_server
+    except ImportError:
+        create_server = None
+
+    if create_server is None:
+        print("WARNING: waitress is not installed, serving with werkzeug's development server instead.\n"
+              "WARNING: It starts a thread per connection without limit and is not meant for production.\n"
+              "WARNING: Install waitress (pip install -r requirements.txt) to serve many viewers.", file=sys.stderr)
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                # A line per request of hundreds of viewers costs more than serving them
+                pass
+
+        server = make_server(host, port, create_app(), threaded=True, request_handler=QuietRequestHandler)
+        server.daemon_threads = True
+        print(f"Serving on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    MAX_PROGRESS_STREAMS = max(threads - max(threads // 8, 4), 1)
+    server = create_server(create_app(), host=host, port=port, threads=threads, connection_limit=2 * threads,
+                           ident='codebase-visualizer')
+    print(f"Serving on http://{host}:{port} with {threads} threads, up to {MAX_PROGRESS_STREAMS} of them for progress streams")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def build_in_background(store, profile=None):
+    """Build the graph of store, its tree view and compressed binary body in a thread, so no request has to.
+
+    With profile, a cProfile dump of the analysis is written to that path.
+    """
+    def build():
+        try:
+            with profiling(profile):
+                version, graph = store.current()
+            store.tree(version, graph)
+            store.body(version, graph, 'bin', 'br' if brotli is not None else 'gzip')
+        except Exception as e:
+            print(f"Analysis of {store.path} failed: {e}")
+    threading.Thread(target=build, name='initial-analysis', daemon=True).start()
+
+# The frontend build, served as static files
+FRONTEND_DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
+
+# Frontend files worth compressing ahead of time, and their variants in order of preference
+COMPRESSIBLE_ASSETS = ('.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt')
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def precompress_assets(directory):
+    """Write .br (with brotli installed) and .gz variants of the compressible files under directory.
+
+    Variants older than their file are written again. Returns how many were written.
+    """
+    written = 0
+    for dir_path, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if not file_name.endswith(COMPRESSIBLE_ASSETS):
+                continue
+            file_path = os.path.join(dir_path, file_name)
+            data = None
+            for encoding, suffix in ASSET_ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                variant_path = file_path + suffix
+                if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(file_path):
+                    continue
+                if data is None:
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                compressed = brotli.compress(data, quality=11) if encoding == 'br' else gzip.compress(data, compresslevel=9)
+                with open(variant_path, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+def accepted_encodings():
+    """Return the content codings the client accepts."""
+    return {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+
+def accepted_encoding():
+    """Return the best compression the client accepts: 'br', 'gzip' or None."""
+    accepted = accepted_encodings()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def requested_store():
+    """Return the GraphStore a request is for, or an error response.
+
+    That is the project with the id ?project=, the project of the finished
+    analysis job ?job=, or else the default project.
+    """
+    project_id = request.args.get('project')
+    job_id = request.args.get('job')
+    if project_id:
+        store = PROJECTS.get(project_id)
+        if store is None:
+            return None, (jsonify({'error': 'Unknown project'}), 404)
+    elif job_id:
+        job = JOB_SCHEDULER.get(job_id)
+        if job is None or job.store is None:
+            return None, (jsonify({'error': 'No graph for this job'}), 404)
+        store = PROJECTS.get(job.project_id) or job.store
+    else:
+        store = PROJECTS.default()
+        if store is None:
+            return None, (jsonify({'error': 'No project'}), 404)
+    return store, None
+
+def requested_graph():
+    """Return the store, version and graph a request is for (see requested_store), or an error response."""
+    store, error = requested_store()
+    if error:
+        return None, None, None, error
+
+    try:
+        version, graph = store.current()
+    except FileNotFoundError:
+        return None, None, None, (jsonify({'error': 'Directory not found'}), 404)
+    # Loading or building a graph may have taken the projects over budget
+    PROJECTS.enforce_budget(store)
+    return store, version, graph, None
+
+def requested_layout():
+    """Return the ?layout= argument (None if absent) or an error response if it is unknown."""
+    layout = request.args.get('layout')
+    if layout is not None and layout not in LAYOUT_ALGORITHMS:
+        return None, (jsonify({'error': f"Unknown layout, expected one of {', '.join(LAYOUT_ALGORITHMS)}"}), 400)
+    return layout, None
+
+def serve_graph(kind, mimetype):
+    """Serve the current graph as kind, answering 304 if the client's copy is current.
+
+    See requested_store for the ?project= and ?job= arguments. With ?layout= the nodes are
+    placed by that algorithm (see LAYOUT_ALGORITHMS) rather than the
+    configured one. A graph of more than ?max_files= files is not sent: the
+    response is a 413 with its file_count, for clients that show large
+    projects as a tree (see /api/tree) instead.
+    """
+    layout, error = requested_layout()
+    if error:
+        return error
+    try:
+        max_files = int(request.args['max_files']) if 'max_files' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'max_files must be a number'}), 400
+    store, version, graph, error = requested_graph()
+    if error:
+        return error
+    file_count = graph['metadata'].get('file_count', len(graph['nodes']))
+    if max_files is not None and file_count > max_files:
+        return jsonify({'error': f'The graph has more than {max_files} files', 'file_count': file_count}), 413
+
+    encoding = accepted_encoding()
+    etag = store.etag(version, kind, encoding, layout)
+    if etag in {tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')}:
+        response = Response(status=304)
+    else:
+        response = Response(store.body(version, graph, kind, encoding, layout), mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Cached copies must be revalidated, which is cheap thanks to the ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@route('/api/graph')
+def get_graph():
+    return serve_graph('json', 'application/json')
+
+def send_asset(path):
+    """Send a file of the frontend build, as its precompressed variant if the client accepts one.
+
+    Vite names the files under assets/ after their content hash, so these may
+    be cached for good; the others, like index.html, must be revalidated.
+    """
+    accepted = accepted_encodings()
+    for encoding, suffix in ASSET_ENCODINGS:
+        if encoding in accepted and os.path.isfile(os.path.join(FRONTEND_DIST, path + suffix)):
+            response = send_from_directory(FRONTEND_DIST, path + suffix,
+                                           mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(FRONTEND_DIST, path)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if path.startswith('assets/') else 'no-cache'
+    return response
+
+@route('/')
+def index():
+    return send_asset('index.html')
+
+@route('/<path:path>')
+def static_files(path):
+    return send_asset(path)
+
+@route('/graph.json')
+def serve_graph_json():
+    """Serve the graph as JSON."""
+    return serve_graph('json', 'application/json')
+
+@route('/graph.bin')
+def serve_graph_binary():
+    """Serve the graph in the binary format of encode_graph."""
+    return serve_graph('bin', 'application/octet-stream')
+
+@route('/api/tree')
+def get_tree():
+    """Serve the graph with directories collapsed (see DirectoryTree.view).
+
+    ?depth= is the number of directory levels shown (default 1) and every
+    ?expand= names a directory whose files and subdirectories are shown too.
+    ?max_edges= limits the edges to those with the highest counts. ?project=,
+    ?job= and ?layout= are as for /graph.json.
+    """
+    try:
+        depth = int(request.args.get('depth', 1))
+        max_edges = int(request.args['max_edges']) if 'max_edges' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'depth and max_edges must be numbers'}), 400
+    if depth < 1 or (max_edges is not None and max_edges < 0):
+        return jsonify({'error': 'depth must be positive and max_edges not negative'}), 400
+    layout, error = requested_layout()
+    if error:
+        return error
+    store, version, graph, error = requested_graph()
+    if error:
+        return error
+
+    expand = [directory for value in request.args.getlist('expand') for directory in value.split(',') if directory]
+    return Response(store.tree_view(version, graph, layout, depth, expand, max_edges), mimetype='application/json')
+
+def requested_index():
+    """Return the GraphIndex of the graph a request is for (see requested_graph) and an error response."""
+    store, version, graph, error = requested_graph()
+    if error:
+        return None, error
+    return store.index(version, graph), None
+
+def requested_limit(default):
+    """Return the ?limit= argument, or None if it is not a positive number."""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        return None
+    return limit if limit > 0 else None
+
+@route('/api/dependencies')
+@route('/api/dependents')
+def get_related_files():
+    """List the files the ?file= imports (/api/dependencies) or that import it (/api/dependents).
+
+    With ?transitive=true, files reached through other files are included
+    with their distance. At most ?limit= files (default 1000) are listed,
+    nearest first; count is always the total.
+    """
+    direction = GraphIndex.DEPENDENCIES if request.path.endswith('/dependencies') else GraphIndex.DEPENDENTS
+    transitive = request.args.get('transitive', '').lower() in ('1', 'true', 'yes')
+    limit = requested_limit(1000)
+    if limit is None:
+        return jsonify({'error': 'limit must be a positive number'}), 400
+    index, error = requested_index()
+    if error:
+        return error
+    node = index.index.get(request.args.get('file'))
+    if node is None:
+        return jsonify({'error': 'File not in graph'}), 404
+
+    if transitive:
+        related = index.closure(node, direction)
+    else:
+        related = [(target, 1) for target in index.neighbours(node, direction)]
+    return jsonify({
+        'file': index.ids[node],
+        'direction': direction,
+        'transitive': transitive,
+        'count': len(related),
+        'files': [{'id': index.ids[target], 'distance': distance} for target, distance in related[:limit]]
+    })
+
+@route('/api/path')
+def get_import_path():
+    """Return the shortest chain of imports leading from ?from= to ?to=, or null if there is none."""
+    index, error = requested_index()
+    if error:
+        return error
+    source, target = index.index.get(request.args.get('from')), index.index.get(request.args.get('to'))
+    if source is None or target is None:
+        return jsonify({'error': 'File not in graph'}), 404
+
+    path = index.shortest_path(source, target)
+    return jsonify({
+        'from': index.ids[source],
+        'to': index.ids[target],
+        'path': [index.ids[node] for node in path] if path is not None else None
+    })
+
+@route('/api/cycles')
+def get_import_cycles():
+    """List the import cycles: groups of files that all (transitively) import each other, largest first.
+
+    At most ?limit= groups (default 100) are listed; count is always the total.
+    """
+    limit = requested_limit(100)
+    if limit is None:
+        return jsonify({'error': 'limit must be a positive number'}), 400
+    index, error = requested_index()
+    if error:
+        return error
+
+    components = index.cycles()
+    return jsonify({
+        'count': len(components),
+        'files_in_cycles': sum(len(component) for component in components),
+        'cycles': [[index.ids[node] for node in component] for component in components[:limit]]
+    })
+
+@route('/api/search')
+def search_files():
+    """Fuzzy search the files of the graph for ?q=, returning the best ?limit= (default 10, at most 100) matches."""
+    limit = requested_limit(10)
+    if limit is None:
+        return jsonify({'error': 'limit must be a positive number'}), 400
+    store, version, graph, error = requested_graph()
+    if error:
+        return error
+
+    results = store.search_index(version, graph).search(request.args.get('q', ''), min(limit, 100))
+    return jsonify({
+        'query': request.args.get('q', ''),
+        'results': [{'id': path, 'label': os.path.basename(path), 'path': path, 'type': os.path.splitext(path)[1].lower(),
+                     'score': round(score, 3)} for path, score in results]
+    })
+
+@route('/api/reindex', methods=['GET', 'POST'])
+def reindex_codebase():
+    """Queue a new analysis of the project (see requested_store) and return its job id.
+
+    The graph is replaced once the job is complete; until then the old one is served.
+    """
+    store, error = requested_store()
+    if error:
+        return error
+    if not os.path.isdir(store.path):
+        return jsonify({'error': 'Project directory no longer exists'}), 404
+
+    try:
+        job, created = JOB_SCHEDULER.submit(store.path)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify({'status': 'reindexing', 'job_id': job.id, 'project_id': store.project_id, 'deduplicated': not created}), 202
+
+@route('/api/analyze', methods=['GET', 'POST'])
+def analyze_path():
+    """Start a background analysis of ?path= and return its job and project id.
+
+    A project whose graph is still in memory or spilled to disk is not analyzed
+    again unless ?force=true; its project id is returned right away.
+    """
+    body = request.get_json(silent=True) or {}
+    path = request.args.get('path') or body.get('path')
+    force = str(request.args.get('force', body.get('force', ''))).lower() in ('1', 'true', 'yes')
+    if not path:
+        return jsonify({'error': 'No path given'}), 400
+    if not os.path.isdir(path):
+        return jsonify({'error': f'Directory not found: {path}'}), 404
+
+    store = PROJECTS.get(ProjectRegistry.project_id(path))
+    if not force and store is not None and store.state() in ('live', 'memory', 'disk'):
+        return jsonify({'job_id': None, 'project_id': store.project_id, 'status': 'complete', 'cached': True})
+
+    try:
+        job, created = JOB_SCHEDULER.submit(path)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+
+    # An analysis of the same path that is already queued or running is shared
+    return jsonify({'job_id': job.id, 'project_id': job.project_id, 'status': job.status, 'deduplicated': not created}), 202
+
+@route('/api/jobs')
+def list_jobs():
+    """List the queued, running and recently finished analysis jobs."""
+    return jsonify({'jobs': [job.to_dict() for job in JOB_SCHEDULER.all_jobs()]})
+
+@route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    """Return the status of a job, or cancel it with DELETE."""
+    if request.method == 'DELETE':
+        job = JOB_SCHEDULER.cancel(job_id)
+    else:
+        job = JOB_SCHEDULER.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@route('/api/projects')
+def list_projects():
+    """List the projects the server has graphs of, most recently used first."""
+    return jsonify({
+        'default': PROJECTS.default_id,
+        'memory_budget_mb': PROJECTS.memory_budget,
+        'projects': [store.to_dict() for store in PROJECTS.all()]
+    })
+
+@route('/api/projects/<project_id>', methods=['GET', 'DELETE'])
+def project_status(project_id):
+    """Return where the graph of a project is, or forget the project with DELETE."""
+    if request.method == 'DELETE':
+        try:
+            store = PROJECTS.remove(project_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 409
+    else:
+        store = PROJECTS.get(project_id)
+    if store is None:
+        return jsonify({'error': 'Unknown project'}), 404
+    return jsonify(store.to_dict())
+
+@route('/api/open-in-vscode/<path:file_path>')
+def open_in_vscode(file_path):
+    """Open a file of the project (see requested_store) in VS Code editor."""
+    try:
+        store, error = requested_store()
+        if error:
+            return error
+        project_path = store.path
+
+        # Resolve symlinks and '..' before checking where the file is
+        abs_project_path = os.path.realpath(project_path)
+        abs_file_path = os.path.realpath(os.path.join(abs_project_path, file_path))
+
+        # Ensure the file is within the project directory for security; a
+        # prefix check would also let /project-other through for /project
+        if os.path.commonpath([abs_project_path, abs_file_path]) != abs_project_path:
+            return jsonify({'error': 'Access denied'}), 403
+
+        # Verify the file exists
+        if not os.path.exists(abs_file_path):
+            return jsonify({'error': f'File not found: {abs_file_path}'}), 404
+
+        # Open the file in VS Code
+        result = subprocess.run(['code', abs_file_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"VS Code command failed: {result.stderr}")
+            return jsonify({'error': f'Failed to open in VS Code: {result.stderr}'}), 500
+
+        return jsonify({'status': 'opened', 'file': file_path, 'project_path': project_path})
+
+    except Exception as e:
+        print(f"Error opening file in VS Code: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@route('/progress')
+def progress():
+    """Server-Sent Events endpoint for progress updates.
+
+    With ?job= only the progress of that analysis job is sent, otherwise the
+    global progress and graph patches. Beyond MAX_PROGRESS_STREAMS open
+    streams, new ones are refused with a 503.
+    """
+    job_id = request.args.get('job') or None
+    job = JOB_SCHEDULER.get(job_id) if job_id else None
+    if job_id and job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if MAX_PROGRESS_STREAMS is not None and len(BROADCASTER.subscribers) >= MAX_PROGRESS_STREAMS:
+        # Every stream holds a server thread; clients poll /api/jobs or retry later
+        return jsonify({'error': 'Too many open progress streams'}), 503, {'Retry-After': '5'}
+
+    def generate():
+        subscription = BROADCASTER.subscribe(job_id)
+
+        try:
+            # Send current progress immediately
+            state = BROADCASTER.channels.get(job_id)
+            subscription.progress_seq = state[0] if state else 0
+            yield BROADCASTER.format(job.progress if job else current_progress)
+
+            # Keep connection alive and send updates
+            while True:
+                messages = BROADCASTER.wait(subscription, timeout=15)
+                if messages is None:
+                    # Dropped for falling behind; the client reconnects and reloads
+                    break
+                if not messages:
+                    # Send keepalive
+                    yield BROADCASTER.format({'status': 'keepalive'})
+                for message in messages:
+                    yield message
+        finally:
+            # Client disconnected
+            BROADCASTER.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream')
+
+@route('/metrics')
+def metrics():
+    """Analysis and server metrics in the Prometheus text format (see MetricsRegistry)."""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+def open_browser(port=5000):
+    time.sleep(1)  # Wait for server to start
+    webbrowser.open(f'http://localhost:{port}')
+
+def add_analysis_arguments(parser):
+    """Add the options that control how a codebase is analyzed to parser."""
+    parser.add_argument('path', nargs='?', default='.', help='directory to analyze (default: current directory)')
+    parser.add_argument('--mode', choices=['imports', 'heuristic'], default='imports',
+                        help='resolve parsed imports (default) or match file names in file contents')
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help='directory for the persistent analysis cache (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='re-read and re-parse every file on each analysis')
+    parser.add_argument('--hash-files', action='store_true',
+                        help='validate cache entries by content hash instead of trusting mtime and size')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes for parsing files, 0 for one per CPU (default: %(default)s)')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='keep only compact per-file results in memory, at some cost in speed')
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help='abort an analysis that needs more memory than this (implies --low-memory)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write a cProfile dump of the analysis (the server\'s first one) to FILE, for pstats or snakeviz')
+    parser.add_argument('--max-file-size', action='append', type=parse_size_budget, metavar='[.EXT=]SIZE',
+                        help='skip files of at least SIZE, such as 2MB, or only those with extension EXT, such as '
+                             '.json=512KB; repeatable (default: 1MB)')
+
+def analysis_options(args):
+    """Return the build_graph keyword arguments given by the options of add_analysis_arguments."""
+    return {
+        'mode': args.mode,
+        'cache_dir': None if args.no_cache else args.cache_dir,
+        'hash_files': args.hash_files,
+        'jobs': args.jobs or os.cpu_count() or 1,
+        'low_memory': args.low_memory,
+        'memory_budget': args.memory_budget
+    }
+
+def analyze_command(argv):
+    """Run 'visualizer.py analyze': analyze a codebase without the server and return the exit status.
+
+    Every file and connection is written as one JSON line as soon as it is
+    found, so output begins while the analysis is still running:
+    {"record": "node", ...} with the fields of a graph node except its
+    position, then {"record": "edge", "from": ..., "to": ...}, and last a
+    {"record": "summary"} with the totals and timings. Nothing else is written
+    to the output; messages go to stderr.
+    """
+    parser = argparse.ArgumentParser(prog='visualizer.py analyze',
+                                     description='Analyze a codebase without starting the server, '
+                                                 'streaming its files and dependencies as NDJSON.')
+    add_analysis_arguments(parser)
+    parser.add_argument('-o', '--output', help='file to write to (default: standard output)')
+    args = parser.parse_args(argv)
+    FILE_SIZE_BUDGETS.update(args.max_file_size or [])
+
+    if not os.path.isdir(args.path):
+        print(f"Not a directory: {args.path}", file=sys.stderr)
+        return 2
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    timings = {'first_record_seconds': None, 'first_edge_seconds': None, 'total_seconds': None}
+    last_flush = start
+
+    def write(record):
+        nonlocal last_flush
+        out.write(json.dumps(record, separators=(',', ':')) + '\n')
+        now = time.perf_counter()
+        first = timings['first_record_seconds'] is None
+        if first:
+            timings['first_record_seconds'] = now - start
+        # Readers see records within a tenth of a second, without a flush per line
+        if first or now - last_flush >= 0.1:
+            out.flush()
+            last_flush = now
+
+    def on_file(rel_path):
+        node = make_node(rel_path, 0)
+        del node['position']
+        write({'record': 'node', **node})
+
+    def on_edge(source_rel, target_rel):
+        if timings['first_edge_seconds'] is None:
+            timings['first_edge_seconds'] = time.perf_counter() - start
+        write({'record': 'edge', 'from': source_rel, 'to': target_rel})
+
+    try:
+        # Positions are not part of the output, so the graph is not laid out
+        with contextlib.redirect_stdout(sys.stderr), profiling(args.profile):
+            graph = build_graph(scan_directory(args.path), args.path, layout='grid', on_file=on_file, on_edge=on_edge,
+                                **analysis_options(args))
+        metadata = graph['metadata']
+        timings['total_seconds'] = time.perf_counter() - start
+        write({'record': 'summary', 'project_path': metadata['project_path'], 'file_count': metadata['file_count'],
+               'connection_count': metadata['connection_count'], 'mode': metadata['mode'],
+               'timings': {name: seconds if seconds is None else round(seconds, 4) for name, seconds in timings.items()},
+               'parse_timings': metadata['parse_timings'], 'cache': metadata['cache'], 'memory': metadata['memory'],
+               'metrics': metadata['metrics']})
+        out.flush()
+    except MemoryBudgetExceeded as e:
+        print(f"Analysis aborted: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader went away, e.g. head; do not fail again flushing stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"Analyzed {metadata['file_count']} files and {metadata['connection_count']} connections in "
+          f"{timings['total_seconds']:.2f}s, first record after {timings['first_record_seconds'] or 0:.3f}s", file=sys.stderr)
+    return 0
+
+def diff_command(argv):
+    """Run 'visualizer.py diff': print how the dependency graph changed, returning the exit status.
+
+    Both sides are a saved graph file (see load_graph_file) or else a git
+    revision of --repo (see revision_graph). As with diff, the exit status is
+    0 without differences, 1 with differences and 2 on errors.
+    """
+    parser = argparse.ArgumentParser(prog='visualizer.py diff',
+                                     description='Compare the dependency graphs of two saved analyses or two git revisions.')
+    parser.add_argument('old', help='graph file (graph.json, graph.bin or analyze output) or git revision')
+    parser.add_argument('new', help='graph file or git revision to compare with old')
+    parser.add_argument('--repo', default='.', help='git working tree, or a directory in it, whose revisions are compared '
+                                                    '(default: current directory)')
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help='directory for the cache of parsed blobs (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='parse every blob of both revisions')
+    parser.add_argument('--json', action='store_true', help='print the differences as one JSON object')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    # Blobs both revisions share are parsed once even without the on-disk cache
+    cache = BlobCache(None if args.no_cache else args.cache_dir)
+    graphs = []
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            for source in (args.old, args.new):
+                graphs.append(load_graph_file(source) if os.path.isfile(source) else revision_graph(args.repo, source, cache))
+    except (ValueError, OSError) as e:
+        print(f"Cannot load {source}: {e}", file=sys.stderr)
+        return 2
+    finally:
+        cache.close()
+
+    differences = diff_graphs(*graphs)
+    if args.json:
+        print(json.dumps(differences, indent=2))
+    else:
+        for sign, change in (('-', 'removed'), ('+', 'added')):
+            for node_id in differences['nodes'][change]:
+                print(f"{sign} file {node_id}")
+        for sign, change in (('-', 'removed'), ('+', 'added')):
+            for edge in differences['edges'][change]:
+                print(f"{sign} import {edge['from']} -> {edge['to']}")
+
+    nodes, edges = differences['nodes'], differences['edges']
+    print(f"{len(nodes['added'])} files added, {len(nodes['removed'])} removed; {len(edges['added'])} imports added, "
+          f"{len(edges['removed'])} removed ({time.perf_counter() - start:.2f}s)", file=sys.stderr)
+    return 1 if nodes['added'] or nodes['removed'] or edges['added'] or edges['removed'] else 0
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['analyze']:
+        sys.exit(analyze_command(sys.argv[2:]))
+    if sys.argv[1:2] == ['diff']:
+        sys.exit(diff_command(sys.argv[2:]))
+
+    print("Starting Codebase Visualizer...")
+
+    parser = argparse.ArgumentParser(description='Visualize the file dependencies of a codebase.',
+                                     epilog="Run 'visualizer.py analyze --help' for the headless analysis without the server, "
+                                            "and 'visualizer.py diff --help' to compare two analyses or git revisions.")
+    add_analysis_arguments(parser)
+    parser.add_argument('--layout', choices=LAYOUT_ALGORITHMS, default='clustered',
+                        help="node placement: 'clustered' groups files by directory, 'force' refines that "
+                             "with a force-directed layout (needs NumPy), 'grid' is a plain grid (default: clustered)")
+    parser.add_argument('--watch', action='store_true',
+                        help='watch the directory and push incremental graph updates to the browser')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='seconds between scans when inotify is unavailable (default: %(default)s)')
+    parser.add_argument('--project-memory', type=int, default=1024, metavar='MB',
+                        help='memory for the graphs of all projects; beyond it the least recently used are '
+                             'moved to disk (default: %(default)s)')
+    parser.add_argument('--spill-dir', default=os.path.join(default_cache_dir(), 'projects'),
+                        help='directory for graphs moved out of memory (default: %(default)s)')
+    parser.add_argument('--host', default='0.0.0.0', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=5000, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--production', action='store_true',
+                        help='serve many concurrent viewers with waitress, without the debugger, '
+                             'reloader and browser; static files are precompressed')
+    parser.add_argument('--threads', type=int, default=256,
+                        help='worker threads of --production; each open progress stream holds one (default: %(default)s)')
+    args = parser.parse_args()
+
+    FILE_SIZE_BUDGETS.update(args.max_file_size or [])
+    ANALYSIS_OPTIONS.update(analysis_options(args))
+    ANALYSIS_OPTIONS['layout'] = args.layout
+    PROJECTS.memory_budget = args.project_memory
+    PROJECTS.spill_dir = args.spill_dir
+    PROJECTS.default_id = PROJECTS.add(args.path).project_id
+
+    print(f"Configured to analyze path: {args.path}")
+    print(f"Open http://localhost:{args.port} in your browser")
+
+    # The debug reloader re-runs this module in a child process, which is the one serving requests
+    if args.production or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if args.watch:
+            threading.Thread(target=watch_project, args=(args.path, ANALYSIS_OPTIONS, args.poll_interval, args.profile), daemon=True).start()
+        else:
+            build_in_background(PROJECTS.default(), args.profile)
 
-    # Open browser in a separate thread
-    threading.Thread(target=open_browser).start()
+    if args.production:
+        if os.path.isdir(FRONTEND_DIST):
+            print(f"Precompressed {precompress_assets(FRONTEND_DIST)} frontend files")
+        serve_production(args.host, args.port, args.threads)
+    else:
+        # Open browser in a separate thread
+        threading.Thread(target=open_browser, args=(args.port,)).start()
 
-    app.run(debug=True, host='0.0.0.0', port=5000)
+        create_app().run(debug=True, host=args.host, port=args.port)